@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Run the llm-fuse benchmark scenarios (all of them unless --scenario is given) and check
+the results against a stored baseline.
+
+The report is written to benchmarks/latest.json. If benchmarks/baseline.json exists, any
+stage more than 10% slower than in the baseline makes the script exit with status 1.
+Record a new baseline by copying latest.json to baseline.json on a quiet machine.
+
+Usage:
+    python benchmarks/run.py [extra llm-fuse-bench arguments]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_fuse.bench import SCENARIOS, main
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    argv = []
+    if not any(arg in ("--scenario", "--files") for arg in sys.argv[1:]):
+        for name in sorted(SCENARIOS):
+            argv += ["--scenario", name]
+    argv += ["--output", os.path.join(here, "latest.json")]
+    baseline = os.path.join(here, "baseline.json")
+    if os.path.exists(baseline):
+        argv += ["--compare", baseline]
+    main(argv + sys.argv[1:])
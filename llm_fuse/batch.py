@@ -0,0 +1,289 @@
+"""
+Batch mode for llm-fuse: aggregate many repositories in one run.
+
+Repositories, branches and filters are listed in a JSON manifest:
+
+    {
+      "args": ["--max-tokens", "4000"],
+      "exclude": "node_modules",
+      "repos": [
+        {"url": "https://github.com/org/api", "branch": "main", "include": "\\\\.py$"},
+        {"url": "https://gitlab.com/org/web", "name": "web-app", "args": ["--minify"]}
+      ]
+    }
+
+Top-level "include", "exclude" and "args" apply to every repository; a repository's own
+"include" and "exclude" replace them and its "args" are appended. "args" are any llm-fuse
+options other than those the batch sets itself (see RESERVED_FLAGS). A repository's "name"
+(by default taken from its URL) names its output directory, and "output" the output file
+in it (output.txt by default).
+
+Clones run as concurrent `git clone` subprocesses (at most clone_jobs at a time), and each
+finished clone is processed by the regular llm-fuse pipeline in a pool of jobs worker
+processes, so later repositories are cloned while earlier ones are being processed. At most
+clone_jobs + jobs checkouts exist on disk at once.
+
+Each repository gets a directory under the output directory holding its output files, the
+log of everything llm-fuse printed for it (log.txt) and its run statistics (stats.json, see
+--stats-json). A repository that fails to clone or process is reported as failed without
+stopping the others. batch.json in the output directory summarises every repository.
+
+Usage:
+    llm-fuse-batch manifest.json [--output-dir DIR] [--jobs N] [--clone-jobs N]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from llm_fuse.main import extract_repo_name, main as llm_fuse_main
+
+SUMMARY_VERSION = 1
+SUMMARY_FILE_NAME = "batch.json"
+LOG_FILE_NAME = "log.txt"
+STATS_FILE_NAME = "stats.json"
+DEFAULT_OUTPUT_NAME = "output.txt"
+DEFAULT_CLONE_JOBS = 4
+# Options the batch sets for every repository, or that cannot work inside a batch.
+RESERVED_FLAGS = ("--repo", "--branch", "--include", "--exclude", "--output", "--stats-json",
+                  "--watch", "--mirror", "--mirror-dir")
+
+def _check_args(args, where: str) -> List[str]:
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        raise RuntimeError(f"Error: 'args' of {where} must be a list of strings.")
+    for arg in args:
+        flag = arg.split("=", 1)[0]
+        if flag in RESERVED_FLAGS:
+            raise RuntimeError(f"Error: {flag} cannot be used in the 'args' of {where}.")
+    return args
+
+def load_manifest(manifest_path: str) -> List[dict]:
+    """
+    Read a batch manifest and return one job per repository, with its "name", "url",
+    "branch", "include", "exclude", "output" and "args" resolved against the defaults.
+    Raises RuntimeError if the manifest cannot be read or is invalid.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Error: Could not read batch manifest '{manifest_path}': {e}")
+    if isinstance(manifest, list):
+        manifest = {"repos": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("repos"), list) or not manifest["repos"]:
+        raise RuntimeError(f"Error: Batch manifest '{manifest_path}' must list at least one repository under 'repos'.")
+    default_args = _check_args(manifest.get("args", []), "the manifest")
+
+    jobs = []
+    names = set()
+    for position, repo in enumerate(manifest["repos"], 1):
+        if isinstance(repo, str):
+            repo = {"url": repo}
+        if not isinstance(repo, dict) or not isinstance(repo.get("url"), str):
+            raise RuntimeError(f"Error: Repository {position} in the batch manifest has no 'url'.")
+        name = repo.get("name") or extract_repo_name(repo["url"])
+        if name in names or name in (".", "..") or "/" in name or os.sep in name:
+            raise RuntimeError(f"Error: Repository {position} in the batch manifest needs a unique 'name' "
+                               f"(got '{name}').")
+        names.add(name)
+        jobs.append({
+            "name": name,
+            "url": repo["url"],
+            "branch": repo.get("branch"),
+            "include": repo.get("include", manifest.get("include")),
+            "exclude": repo.get("exclude", manifest.get("exclude")),
+            "output": repo.get("output", DEFAULT_OUTPUT_NAME),
+            "args": default_args + _check_args(repo.get("args", []), f"repository '{name}'"),
+        })
+    return jobs
+
+def repo_argv(job: dict, repo_dir: str) -> List[str]:
+    """
+    Return the llm-fuse command-line arguments that process one batch job into repo_dir.
+    """
+    argv = ["--repo", job["url"], "--output", os.path.join(repo_dir, job["output"]),
+            "--stats-json", os.path.join(repo_dir, STATS_FILE_NAME)]
+    for option in ("branch", "include", "exclude"):
+        if job[option] is not None:
+            argv += [f"--{option}", job[option]]
+    return argv + job["args"]
+
+def process_checkout(argv: List[str], checkout: str, log_path: str) -> int:
+    """
+    Run llm-fuse on an existing clone in a worker process, writing everything it prints to
+    log_path. Returns the exit status: 0 on success.
+    """
+    with open(log_path, 'a', encoding='utf-8') as log, contextlib.redirect_stdout(log), \
+            contextlib.redirect_stderr(log):
+        try:
+            llm_fuse_main(argv, checkout=checkout)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+    return 0
+
+def _last_line(log_path: str) -> Optional[str]:
+    try:
+        with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except OSError:
+        return None
+    return lines[-1] if lines else None
+
+async def clone(url: str, destination: str, branch: Optional[str] = None) -> None:
+    """
+    Shallow-clone a repository into destination with a `git clone` subprocess.
+    Raises RuntimeError with git's message if the clone fails.
+    """
+    clone_cmd = ["git", "clone", "--depth", "1", "--quiet"]
+    if branch:
+        clone_cmd.extend(["--branch", branch])
+    clone_cmd.extend([url, destination])
+    # Never wait for credentials: a repository that needs them fails instead.
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    process = await asyncio.create_subprocess_exec(*clone_cmd, stdin=subprocess.DEVNULL,
+                                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        message = stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"Error cloning repository: {message or f'git exited with status {process.returncode}'}")
+
+async def _run_job(job: dict, output_dir: str, work_dir: str, pool: ProcessPoolExecutor,
+                   checkouts: asyncio.Semaphore, clones: asyncio.Semaphore) -> dict:
+    """
+    Clone and process one repository, returning its entry in the batch summary.
+    """
+    repo_dir = os.path.join(output_dir, job["name"])
+    log_path = os.path.join(repo_dir, LOG_FILE_NAME)
+    result = {"name": job["name"], "url": job["url"], "branch": job["branch"], "status": "ok",
+              "output_dir": repo_dir, "clone_seconds": None, "process_seconds": None, "error": None}
+    async with checkouts:
+        checkout = os.path.join(work_dir, job["name"])
+        try:
+            os.makedirs(repo_dir, exist_ok=True)
+            with open(log_path, 'w', encoding='utf-8'):
+                pass
+            async with clones:
+                start_time = time.perf_counter()
+                await clone(job["url"], checkout, job["branch"])
+                result["clone_seconds"] = round(time.perf_counter() - start_time, 6)
+            start_time = time.perf_counter()
+            status = await asyncio.get_running_loop().run_in_executor(
+                pool, process_checkout, repo_argv(job, repo_dir), checkout, log_path)
+            result["process_seconds"] = round(time.perf_counter() - start_time, 6)
+            if status != 0:
+                raise RuntimeError(_last_line(log_path) or f"llm-fuse exited with status {status}")
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+            with open(log_path, 'a', encoding='utf-8') as log:
+                log.write(f"{e}\n")
+        finally:
+            shutil.rmtree(checkout, ignore_errors=True)
+    stats_path = os.path.join(repo_dir, STATS_FILE_NAME)
+    if result["status"] == "ok" and os.path.exists(stats_path):
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            result["stats"] = json.load(f)
+    print(f"[{job['name']}] {result['status']}" + (f": {result['error']}" if result["error"] else ""))
+    return result
+
+async def _run_jobs(jobs: List[dict], output_dir: str, work_dir: str, max_workers: int,
+                    clone_jobs: int) -> List[dict]:
+    checkouts = asyncio.Semaphore(max_workers + clone_jobs)
+    clones = asyncio.Semaphore(clone_jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return await asyncio.gather(*(_run_job(job, output_dir, work_dir, pool, checkouts, clones)
+                                      for job in jobs))
+
+def run_batch(jobs: List[dict], output_dir: str, max_workers: int = 1,
+              clone_jobs: int = DEFAULT_CLONE_JOBS) -> List[dict]:
+    """
+    Clone and process every job from load_manifest, writing each repository's output set
+    under output_dir and the summary to output_dir/batch.json. Returns the summary entries,
+    in manifest order; failed repositories have status "failed" and an "error".
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="llm_fuse_batch_")
+    try:
+        results = asyncio.run(_run_jobs(jobs, output_dir, work_dir, max_workers, clone_jobs))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    summary = {"version": SUMMARY_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "repos": results}
+    with open(os.path.join(output_dir, SUMMARY_FILE_NAME), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+    return results
+
+def format_summary(results: List[dict]) -> str:
+    """
+    Render the batch results as a plain-text table.
+    """
+    lines = ["Batch summary:"]
+    for result in results:
+        clone_seconds = f"{result['clone_seconds']:.3f}" if result["clone_seconds"] is not None else "-"
+        process_seconds = f"{result['process_seconds']:.3f}" if result["process_seconds"] is not None else "-"
+        line = f"  {result['name']:<24}{result['status']:<8}clone {clone_seconds:>8} s  process {process_seconds:>8} s"
+        if result["error"]:
+            line += f"  {result['error']}"
+        lines.append(line)
+    failed = sum(1 for result in results if result["status"] != "ok")
+    lines.append(f"  {len(results) - failed} of {len(results)} repositories succeeded.")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Aggregate many repositories listed in a JSON manifest, one output set per repository."
+    )
+    parser.add_argument("manifest", help="JSON manifest listing the repositories (see the README).")
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="llm-fuse-batch",
+        help="Directory receiving one subdirectory per repository and batch.json. Defaults to 'llm-fuse-batch'."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of repositories processed at once, each in its own worker process. "
+             "Use 0 for one per CPU (the default)."
+    )
+    parser.add_argument(
+        "--clone-jobs",
+        type=int,
+        default=DEFAULT_CLONE_JOBS,
+        help=f"Number of repositories cloned at once. Defaults to {DEFAULT_CLONE_JOBS}."
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive integer")
+    if args.clone_jobs < 1:
+        parser.error("--clone-jobs must be a positive integer")
+    try:
+        jobs = load_manifest(args.manifest)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Processing {len(jobs)} repositories...")
+    results = run_batch(jobs, args.output_dir, args.jobs or os.cpu_count() or 1, args.clone_jobs)
+    print(format_summary(results))
+    print(f"Batch summary written to: {os.path.join(os.path.abspath(args.output_dir), SUMMARY_FILE_NAME)}")
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Benchmarks for llm-fuse.
+
+Generates synthetic repositories (configurable file count, size distribution, share of
+binary files and directory depth) and times each pipeline stage separately:
+
+- collect   collect_files
+- process   process_files (text detection, reading, token counting and chunking)
+- tree      iter_tree_lines (the file system diagram)
+- write     write_output_files
+
+Every stage reports seconds, files/s and MB/s (the best of --repeat runs). The stages of
+each scenario run in a new child process, so the peak resident set size reported for a
+scenario is that of a process which ran only its stages (including the interpreter and
+imports), not of the whole benchmark run. Results are written as a JSON report; pass a
+previous report with --compare to flag stages that got slower.
+
+Usage:
+    llm-fuse-bench [--scenario NAME ...] [--output report.json] [--compare baseline.json]
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional, Tuple
+
+from llm_fuse.main import collect_files, iter_tree_lines, process_files, write_output_files
+from llm_fuse.stats import peak_rss_kb
+
+REPORT_VERSION = 1
+STAGES = ("collect", "process", "tree", "write")
+
+# Named scenarios: parameters for generate_repo.
+SCENARIOS = {
+    "small": {"files": 200, "mean_size": 2048, "size_sigma": 1.0, "binary_ratio": 0.05, "depth": 3},
+    "medium": {"files": 2000, "mean_size": 4096, "size_sigma": 1.2, "binary_ratio": 0.05, "depth": 5},
+    "large-files": {"files": 50, "mean_size": 1024 * 1024, "size_sigma": 0.5, "binary_ratio": 0.0, "depth": 2},
+    "deep": {"files": 2000, "mean_size": 1024, "size_sigma": 0.8, "binary_ratio": 0.1, "depth": 12,
+             "fanout": 2},
+}
+DEFAULT_SCENARIOS = ("small", "medium")
+
+TEXT_EXTENSIONS = (".py", ".js", ".md", ".txt", ".json", ".c")
+BINARY_EXTENSIONS = (".dat", ".bin")
+WORDS = ("value", "result", "index", "count", "buffer", "items", "config", "token", "path", "node")
+
+def _text_content(rng: random.Random, size: int) -> str:
+    """
+    Build roughly size characters of code-like text.
+    """
+    lines = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.1:
+            line = f"def {rng.choice(WORDS)}_{rng.randrange(1000)}({rng.choice(WORDS)}):\n"
+        elif rng.random() < 0.05:
+            line = "\n"
+        else:
+            line = "    " + " = ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) + f" + {rng.randrange(100)}\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)[:size]
+
+def generate_repo(root: str, files: int = 1000, mean_size: int = 4096, size_sigma: float = 1.0,
+                  binary_ratio: float = 0.05, depth: int = 4, fanout: int = 4, seed: int = 0) -> dict:
+    """
+    Create a synthetic repository under root. File sizes follow a log-normal distribution
+    with the given mean (in bytes) and sigma; binary_ratio of the files get random binary
+    content; files are spread over a tree of directories up to depth levels deep with
+    fanout subdirectories each. The same arguments always produce the same tree.
+    Returns a summary with the number of files, text files and total bytes written.
+    """
+    rng = random.Random(seed)
+    directories = [""]
+    frontier = [""]
+    for _ in range(depth):
+        frontier = [os.path.join(parent, f"dir{i}") for parent in frontier for i in range(fanout)]
+        directories.extend(frontier)
+        if len(directories) >= files:
+            break
+    # Choose mu so the log-normal distribution has the requested mean.
+    mu = math.log(max(mean_size, 1)) - size_sigma ** 2 / 2
+    total_bytes = 0
+    text_files = 0
+    for i in range(files):
+        directory = os.path.join(root, rng.choice(directories))
+        os.makedirs(directory, exist_ok=True)
+        size = max(1, int(rng.lognormvariate(mu, size_sigma)))
+        if rng.random() < binary_ratio:
+            path = os.path.join(directory, f"blob{i}{rng.choice(BINARY_EXTENSIONS)}")
+            length = min(size, 65536)
+            data = rng.getrandbits(8 * length).to_bytes(length, "little") + b"\x00"
+        else:
+            path = os.path.join(directory, f"file{i}{rng.choice(TEXT_EXTENSIONS)}")
+            data = _text_content(rng, size).encode("utf-8")
+            text_files += 1
+        with open(path, "wb") as f:
+            f.write(data)
+        total_bytes += len(data)
+    return {"files": files, "text_files": text_files, "bytes": total_bytes}
+
+def _best_time(fn: Callable[[], object], repeat: int) -> Tuple[object, float]:
+    """
+    Run fn repeat times, returning its last result and the fastest wall time.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def _rates(seconds: float, files: int, num_bytes: Optional[int] = None) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "files_per_second": round(files / seconds, 1) if seconds else None,
+        "mb_per_second": round(num_bytes / (1024 * 1024) / seconds, 3) if seconds and num_bytes is not None else None
+    }
+
+def run_scenario(params: dict, work_dir: str, repeat: int = 3, max_tokens: Optional[int] = None,
+                 jobs: int = 1) -> dict:
+    """
+    Generate the repository described by params inside work_dir and time every stage in a
+    new child process, which also reports its own peak memory.
+    """
+    repo_dir = os.path.join(work_dir, "repo")
+    summary = generate_repo(repo_dir, **params)
+    # A child forked from this process, or started from a fork of it, would report this
+    # process's peak as its own. The fork server is a small process that children are
+    # forked from instead (Windows, which has only "spawn", does not report peak RSS).
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        result = executor.submit(_time_stages, repo_dir, work_dir, repeat, max_tokens, jobs).result()
+    return {"params": params, "files": result.pop("files"), "text_files": summary["text_files"], **result}
+
+def _time_stages(repo_dir: str, work_dir: str, repeat: int, max_tokens: Optional[int], jobs: int) -> dict:
+    """
+    Time every stage on repo_dir; runs in the child process started by run_scenario.
+    """
+    output_path = os.path.join(work_dir, "output.txt")
+    # The stages print progress messages; keep them out of the benchmark output.
+    with contextlib.redirect_stdout(io.StringIO()):
+        file_paths, collect_seconds = _best_time(
+            lambda: collect_files(repo_dir, None, None, git_only=False), repeat)
+        input_bytes = sum(os.path.getsize(path) for path in file_paths)
+        (files_data, total_tokens), process_seconds = _best_time(
+            lambda: process_files(file_paths, max_tokens=max_tokens, jobs=jobs), repeat)
+        relative_paths = [os.path.relpath(path, repo_dir) for path in file_paths]
+        tree_lines, tree_seconds = _best_time(
+            lambda: list(iter_tree_lines(relative_paths)), repeat)
+        _, write_seconds = _best_time(
+            lambda: write_output_files(files_data, total_tokens, output_path, repo_dir, repo_dir), repeat)
+    output_bytes = sum(os.path.getsize(os.path.join(work_dir, name))
+                       for name in os.listdir(work_dir) if name.startswith("output"))
+    return {
+        "files": len(file_paths),
+        "bytes": input_bytes,
+        "sections": len(files_data),
+        "tokens": total_tokens,
+        "tree_lines": len(tree_lines),
+        "stages": {
+            "collect": _rates(collect_seconds, len(file_paths)),
+            "process": _rates(process_seconds, len(file_paths), input_bytes),
+            "tree": _rates(tree_seconds, len(file_paths)),
+            "write": _rates(write_seconds, len(files_data), output_bytes)
+        },
+        "peak_rss_kb": peak_rss_kb()
+    }
+
+def compare_reports(baseline: dict, current: dict, tolerance: float = 0.1) -> List[str]:
+    """
+    Compare the stage timings of two reports. Returns one line per stage that is more than
+    tolerance (a fraction) slower than in the baseline, for scenarios present in both.
+    """
+    regressions = []
+    for name, scenario in current.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None or previous.get("params") != scenario.get("params"):
+            continue
+        for stage in STAGES:
+            before = previous["stages"].get(stage, {}).get("seconds")
+            after = scenario["stages"].get(stage, {}).get("seconds")
+            if not before or after is None:
+                continue
+            if after > before * (1 + tolerance):
+                regressions.append(f"{name}/{stage}: {before:.4f}s -> {after:.4f}s "
+                                   f"(+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+def format_report(report: dict) -> str:
+    """
+    Render a report as a plain-text table.
+    """
+    lines = [f"{'scenario':<14}{'stage':<9}{'seconds':>10}{'files/s':>12}{'MB/s':>10}"]
+    for name, scenario in report["scenarios"].items():
+        for stage in STAGES:
+            result = scenario["stages"][stage]
+            files_per_second = result["files_per_second"] if result["files_per_second"] is not None else "-"
+            mb_per_second = result["mb_per_second"] if result["mb_per_second"] is not None else "-"
+            lines.append(f"{name:<14}{stage:<9}{result['seconds']:>10.4f}{files_per_second:>12}{mb_per_second:>10}")
+        lines.append(f"{name:<14}{scenario['files']} files, {scenario['bytes']} bytes, "
+                     f"peak RSS {scenario['peak_rss_kb']} KiB")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the llm-fuse pipeline on synthetic repositories."
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help=f"Scenario to run; may be repeated. Defaults to {', '.join(DEFAULT_SCENARIOS)}. "
+             "Ignored when --files is given."
+    )
+    parser.add_argument("--files", type=int, default=None, help="Run a custom scenario with this many files.")
+    parser.add_argument("--mean-size", type=int, default=4096, help="Mean file size in bytes (custom scenario).")
+    parser.add_argument("--size-sigma", type=float, default=1.0,
+                        help="Sigma of the log-normal file size distribution (custom scenario).")
+    parser.add_argument("--binary-ratio", type=float, default=0.05,
+                        help="Fraction of binary files (custom scenario).")
+    parser.add_argument("--depth", type=int, default=4, help="Maximum directory depth (custom scenario).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is reported. Defaults to 3.")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Chunk size passed to process_files.")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker threads passed to process_files.")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Baseline JSON report; exit with status 1 if any stage is slower by more than --tolerance.")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed slowdown against the baseline, as a fraction. Defaults to 0.1.")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be a positive integer")
+
+    if args.files is not None:
+        scenarios = {"custom": {"files": args.files, "mean_size": args.mean_size, "size_sigma": args.size_sigma,
+                                "binary_ratio": args.binary_ratio, "depth": args.depth}}
+    else:
+        scenarios = {name: SCENARIOS[name] for name in (args.scenario or DEFAULT_SCENARIOS)}
+
+    report = {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"repeat": args.repeat, "max_tokens": args.max_tokens, "jobs": args.jobs},
+        "scenarios": {}
+    }
+    for name, params in scenarios.items():
+        print(f"Running scenario '{name}'...")
+        with tempfile.TemporaryDirectory(prefix="llm_fuse_bench_") as work_dir:
+            report["scenarios"][name] = run_scenario(params, work_dir, args.repeat, args.max_tokens, args.jobs)
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Report written to: {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("Warning: the baseline was recorded with different settings.")
+        regressions = compare_reports(baseline, report, args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
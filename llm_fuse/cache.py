@@ -0,0 +1,257 @@
+"""
+Persistent per-file cache for llm-fuse.
+
+Stores, for every file seen in a run, its text/binary verdict, a content digest and the
+chunk layout (character offsets and token counts) computed for each chunking profile.
+Entries are keyed by the file path relative to the scanned root and are reused while the
+file's size and mtime_ns are unchanged; when only the mtime differs (e.g. after a fresh
+clone or a `touch`) the content digest is used as a fallback.
+
+The cache lives in a single JSON index inside the cache directory. By default that is a
+directory per scanned root under the user's cache directory (see default_cache_dir), so
+nothing is written into the scanned tree. Transformed texts (e.g. the output of --minify) are stored beside it, one file
+per content digest and transform under "texts/", and are removed once no entry has that
+digest. The cache is bounded by entry count, age and total size on disk (an entry's share
+of the index plus the texts of its digest), evicting least recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR_NAME = ".llm-fuse-cache"
+CACHE_VERSION = 2
+INDEX_FILE_NAME = "index.json"
+TEXTS_DIR_NAME = "texts"
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def default_cache_dir(root: str) -> str:
+    """
+    Return the cache directory used for root when none is given: a directory named by a
+    hash of root's absolute path, under llm-fuse's directory in the user's cache directory
+    ($XDG_CACHE_HOME or ~/.cache, or %LOCALAPPDATA% on Windows).
+    """
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(base, "llm-fuse", digest)
+
+def content_digest(data: bytes) -> str:
+    """
+    Return the hex digest used to recognise unchanged file contents.
+    """
+    return hashlib.sha1(data).hexdigest()
+
+class FileCache:
+    """
+    On-disk cache of per-file detection results and chunk layouts.
+    All methods are safe to call from the --jobs worker threads.
+    """
+
+    def __init__(self, cache_dir: str, root: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES,
+                 rebuild: bool = False):
+        self.cache_dir = cache_dir
+        self.root = root
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, INDEX_FILE_NAME)
+        self.texts_dir = os.path.join(cache_dir, TEXTS_DIR_NAME)
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._entries = {} if rebuild else self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable cache index '{self.index_path}': {e}")
+            return {}
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return {}
+        return data.get("entries", {})
+
+    def key_for(self, file_path: str) -> str:
+        """
+        Return the cache key for a file: its path relative to the scanned root.
+        """
+        return os.path.relpath(file_path, self.root)
+
+    def lookup(self, key: str, st: os.stat_result) -> Optional[dict]:
+        """
+        Return the entry for key if the file's size and mtime_ns are unchanged.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                entry["used"] = time.time()
+                self.hits += 1
+                return entry
+            return None
+
+    def lookup_digest(self, key: str, size: int, digest: str) -> Optional[dict]:
+        """
+        Content-hash fallback: return the entry for key if its recorded contents match digest.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["size"] == size and entry.get("digest") == digest:
+                entry["used"] = time.time()
+                self.hits += 1
+                return entry
+            return None
+
+    def get_layout(self, entry: Optional[dict], profile: str) -> Optional[List[Tuple[int, int, int]]]:
+        """
+        Return the cached chunk layout for a chunking profile, if one was recorded.
+        """
+        if entry is None:
+            return None
+        with self._lock:
+            layout = entry.get("profiles", {}).get(profile)
+        return [tuple(chunk) for chunk in layout] if layout is not None else None
+
+    def record(self, key: str, st: os.stat_result, is_text: bool, digest: Optional[str] = None,
+               profile: Optional[str] = None, layout: Optional[List[Tuple[int, int, int]]] = None,
+               reason: Optional[str] = None) -> None:
+        """
+        Record the verdict (and, for text files, the digest and chunk layout, or for binary
+        files the reason they were skipped) for a file.
+        Layouts recorded for other profiles are kept as long as the contents are unchanged.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["size"] != st.st_size or entry.get("digest") != digest:
+                entry = {"profiles": {}}
+                self._entries[key] = entry
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns, is_text=is_text,
+                         digest=digest, used=time.time())
+            if reason is not None:
+                entry["reason"] = reason
+            if profile is not None and layout is not None:
+                entry["profiles"][profile] = [list(chunk) for chunk in layout]
+
+    def _text_path(self, digest: str, name: str) -> str:
+        return os.path.join(self.texts_dir, f"{digest}.{name}.txt")
+
+    def load_text(self, digest: str, name: str) -> Optional[str]:
+        """
+        Return the text stored for a content digest by the transform called name, if any.
+        """
+        try:
+            with open(self._text_path(digest, name), 'r', encoding='utf-8', newline='') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store_text(self, digest: str, name: str, text: str) -> None:
+        """
+        Store the text produced by the transform called name from the contents with digest.
+        """
+        path = self._text_path(digest, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.texts_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Unable to write cached text '{path}': {e}")
+
+    def _text_sizes(self) -> Dict[str, int]:
+        """
+        Return the total size of the texts stored for each content digest.
+        """
+        sizes = {}
+        try:
+            with os.scandir(self.texts_dir) as it:
+                for item in it:
+                    digest = item.name.split(".", 1)[0]
+                    try:
+                        sizes[digest] = sizes.get(digest, 0) + item.stat().st_size
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        return sizes
+
+    def _evict_texts(self) -> None:
+        """
+        Remove stored texts whose content digest no longer belongs to any entry.
+        """
+        try:
+            names = os.listdir(self.texts_dir)
+        except OSError:
+            return
+        with self._lock:
+            digests = {entry.get("digest") for entry in self._entries.values()}
+        for name in names:
+            if name.split(".", 1)[0] not in digests:
+                try:
+                    os.remove(os.path.join(self.texts_dir, name))
+                except OSError:
+                    pass
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Drop entries unused for longer than max_age_seconds, then the least recently used
+        entries beyond max_entries or max_bytes. An entry's size is its serialized index
+        record plus the stored texts of its digest, which count once for all entries sharing
+        them. Returns the number of entries removed.
+        """
+        now = time.time() if now is None else now
+        text_sizes = self._text_sizes()
+        with self._lock:
+            before = len(self._entries)
+            entries = [(k, v) for k, v in self._entries.items() if now - v["used"] <= self.max_age_seconds]
+            entries.sort(key=lambda item: item[1]["used"], reverse=True)
+            kept = {}
+            total_bytes = 0
+            counted = set()
+            for key, entry in entries[:self.max_entries]:
+                size = len(json.dumps({key: entry}, separators=(",", ":")))
+                digest = entry.get("digest")
+                if digest not in counted:
+                    size += text_sizes.get(digest, 0)
+                if total_bytes + size > self.max_bytes:
+                    break
+                total_bytes += size
+                counted.add(digest)
+                kept[key] = entry
+            self._entries = kept
+            return before - len(kept)
+
+    def save(self) -> None:
+        """
+        Evict stale entries (and the texts stored for them) and atomically write the index
+        back to disk.
+        """
+        self.evict()
+        self._evict_texts()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            gitignore = os.path.join(self.cache_dir, ".gitignore")
+            if not os.path.exists(gitignore):
+                with open(gitignore, 'w', encoding='utf-8') as f:
+                    f.write("# Created by llm-fuse\n*\n")
+            tmp_path = self.index_path + ".tmp"
+            with self._lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": CACHE_VERSION, "entries": self._entries}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"Warning: Unable to write cache index '{self.index_path}': {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,322 @@
+"""
+Token-budget-aware chunking for llm-fuse.
+
+A Chunker turns a file's content into a chunk layout: a list of (start, end, tokens) triples
+of character offsets. Three strategies are available:
+
+- fixed    slice at a fixed number of characters (the historical behaviour)
+- lines    split only at line boundaries, preferring blank lines
+- syntax   like "lines", but prefer top-level definitions: Python def/class/decorators at
+           column 0, or brace depth 0 for C-like languages
+
+The line strategies make one linear pass over the file. Every line is costed once (in a
+single cost_batch call, whose costs add up without per-line rounding) and running totals
+decide how far a chunk can grow; the best split point of each priority seen so far is
+remembered, so no text is ever re-counted while searching. Each chunk chosen is then
+counted once; if summed costs underestimated it, the cut moves back a line at a time until
+it fits. Lines that alone exceed the budget are split inside the line. Optionally, the
+last few lines of a chunk are repeated at the start of the next one (overlap).
+
+Large memory-mapped files are laid out with layout_bytes, which decodes a segment of whole
+lines at a time and runs the same layout on it. Only the chunks of a segment that the rest
+of the file cannot change are kept, and the next segment starts where the first dropped
+chunk starts, so the result is the layout of the whole decoded file, in byte offsets.
+"""
+
+import math
+import os
+from typing import List, Optional, Tuple
+
+from llm_fuse.tokenizers import Tokenizer
+
+CHUNK_STRATEGIES = ("fixed", "lines", "syntax")
+
+# Split point priorities: any line start, a line after a blank line, a top-level definition.
+LINE, BLANK, TOP_LEVEL = 1, 2, 3
+
+PYTHON_EXTENSIONS = {".py", ".pyi", ".pyw"}
+BRACE_EXTENSIONS = {
+    ".c", ".h", ".cc", ".cpp", ".cxx", ".hpp", ".hh", ".cs", ".java", ".js", ".jsx", ".mjs",
+    ".cjs", ".ts", ".tsx", ".go", ".rs", ".swift", ".kt", ".kts", ".scala", ".php", ".dart",
+    ".m", ".mm", ".groovy", ".css", ".scss", ".less",
+}
+PYTHON_DEFINITIONS = ("def ", "class ", "async def ", "@")
+
+# A chunk is cut at the best-priority split point only if that keeps it at least this full.
+MIN_FILL = 0.5
+
+# Mapped files are decoded this many bytes (extended to a line end) at a time.
+MAPPED_SEGMENT_BYTES = 4 * 1024 * 1024
+
+Layout = List[Tuple[int, int, int]]
+
+def _line_starts(content: str) -> List[int]:
+    """
+    Return the offset of every line start, plus len(content) as a final sentinel.
+    """
+    starts = [0]
+    find = content.find
+    pos = find("\n")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = find("\n", pos + 1)
+    if starts[-1] != len(content):
+        starts.append(len(content))
+    return starts
+
+def _split_priorities(content: str, starts: List[int], language: Optional[str], depth: int = 0) -> List[int]:
+    """
+    Compute the split priority of each line start (index i means splitting before line i).
+    depth is the brace depth at the start of content, for C-like languages.
+    """
+    priorities = [LINE] * (len(starts) - 1)
+    previous_blank = False
+    previous_decorator = False
+    for i in range(len(starts) - 1):
+        line = content[starts[i]:starts[i + 1]]
+        stripped = line.strip()
+        priority = BLANK if previous_blank and stripped else LINE
+        if language == "python":
+            top_level = bool(stripped) and not line[0].isspace()
+            if top_level and not previous_decorator and (previous_blank or line.startswith(PYTHON_DEFINITIONS)):
+                priority = TOP_LEVEL
+            previous_decorator = top_level and line.startswith("@")
+        elif language == "brace":
+            if depth <= 0 and stripped and previous_blank and not stripped.startswith("}"):
+                priority = TOP_LEVEL
+            depth += line.count("{") - line.count("}")
+        priorities[i] = priority
+        previous_blank = not stripped
+    return priorities
+
+def _language_for(file_path: Optional[str], strategy: str) -> Optional[str]:
+    if strategy != "syntax" or not file_path:
+        return None
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in PYTHON_EXTENSIONS:
+        return "python"
+    if ext in BRACE_EXTENSIONS:
+        return "brace"
+    return None
+
+class Chunker:
+    """
+    Computes chunk layouts for a strategy and number of overlap lines.
+    """
+
+    def __init__(self, strategy: str = "syntax", overlap: int = 0):
+        if strategy not in CHUNK_STRATEGIES:
+            raise ValueError(f"Unknown chunk strategy '{strategy}'. Available: {', '.join(CHUNK_STRATEGIES)}")
+        if overlap < 0:
+            raise ValueError("Chunk overlap must be 0 or a positive number of lines")
+        self.strategy = strategy
+        self.overlap = overlap if strategy != "fixed" else 0
+        self.name = f"{strategy}+{self.overlap}"
+
+    def layout(self, content: str, max_tokens: Optional[int], tokenizer: Tokenizer,
+               file_path: Optional[str] = None, tokens: Optional[int] = None) -> Layout:
+        """
+        Split content into (start, end, tokens) triples whose token counts fit max_tokens.
+        A single triple means the file is emitted unchunked. tokens may be passed in when
+        the whole-file count is already known from a batch.
+        """
+        return self._layout(content, max_tokens, tokenizer, file_path, tokens)
+
+    def layout_bytes(self, data, max_tokens: Optional[int], tokenizer: Tokenizer,
+                     file_path: Optional[str] = None) -> Layout:
+        """
+        Lay out UTF-8 data (bytes or a memory map) as layout() lays out its decoded text,
+        without decoding it all at once, returning (start, end, tokens) triples of byte
+        offsets. Without max_tokens, the token count of the whole file is the sum of the
+        counts of its segments (exact for fixed-ratio tokenizers). Raises
+        UnicodeDecodeError if data is not valid UTF-8.
+        """
+        size = len(data)
+        fixed_ratio = tokenizer.chars_per_token
+        if max_tokens is None:
+            cost = 0
+            start = 0
+            while start < size:
+                end = _segment_end(data, start, start + MAPPED_SEGMENT_BYTES)
+                text = data[start:end].decode('utf-8')
+                cost += len(text) if fixed_ratio is not None else tokenizer.count(text, file_path)
+                start = end
+            return [(0, size, math.ceil(cost / fixed_ratio) if fixed_ratio is not None else cost)]
+        language = _language_for(file_path, self.strategy)
+        segment_bytes = max(MAPPED_SEGMENT_BYTES, max_tokens * 64)
+        layout = []
+        start = 0
+        depth = 0
+        while start < size:
+            end = _segment_end(data, start, start + segment_bytes)
+            text = data[start:end].decode('utf-8')
+            chunks = self._layout(text, max_tokens, tokenizer, file_path, None, depth)
+            if end == size:
+                keep = len(chunks)
+            else:
+                # The last chunk ends at the segment's end, not where it would end in the
+                # file. Restart at the latest chunk that the file's layout also starts the
+                # same way: any chunk for "fixed", one starting a line for the others.
+                keep = next((i for i in range(len(chunks) - 1, 0, -1)
+                             if self.strategy == "fixed" or text[chunks[i][0] - 1] == "\n"), 0)
+                if keep == 0:
+                    segment_bytes *= 2
+                    continue
+            offsets = _byte_offsets(text, [offset for chunk in chunks[:keep + 1] for offset in chunk[:2]])
+            layout.extend((start + offsets[chunk_start], start + offsets[chunk_end], tokens)
+                          for chunk_start, chunk_end, tokens in chunks[:keep])
+            if end == size:
+                break
+            restart = chunks[keep][0]
+            if language == "brace":
+                depth += text.count("{", 0, restart) - text.count("}", 0, restart)
+            start += offsets[restart]
+        return layout
+
+    def _layout(self, content: str, max_tokens: Optional[int], tokenizer: Tokenizer, file_path: Optional[str],
+                tokens: Optional[int], depth: int = 0) -> Layout:
+        if tokens is None:
+            tokens = tokenizer.count(content, file_path)
+        if max_tokens is None or tokens <= max_tokens:
+            return [(0, len(content), tokens)]
+        if self.strategy == "fixed":
+            return _fixed_layout(content, max_tokens, tokenizer, file_path, tokens)
+        return self._line_layout(content, max_tokens, tokenizer, file_path, depth)
+
+    def _line_layout(self, content: str, max_tokens: int, tokenizer: Tokenizer,
+                     file_path: Optional[str], depth: int = 0) -> Layout:
+        starts = _line_starts(content)
+        line_count = len(starts) - 1
+        priorities = _split_priorities(content, starts, _language_for(file_path, self.strategy), depth)
+        fixed_ratio = tokenizer.chars_per_token
+        if fixed_ratio is not None:
+            # Work in characters: the token count of any range is ceil(chars / ratio).
+            budget = max_tokens * fixed_ratio
+            costs = [starts[i + 1] - starts[i] for i in range(line_count)]
+        else:
+            budget = max_tokens
+            costs = tokenizer.cost_batch([content[starts[i]:starts[i + 1]] for i in range(line_count)],
+                                         [file_path] * line_count)
+
+        def chunk_tokens(start: int, end: int, cost: int) -> int:
+            if fixed_ratio is not None:
+                return math.ceil(cost / fixed_ratio)
+            return tokenizer.count(content[start:end], file_path)
+
+        layout = []
+        pos = 0
+        line = 0
+        # Tokens already emitted from the current line when it had to be split inside.
+        line_consumed = 0
+        while pos < len(content):
+            # Cost of the (possibly partial) first line of this chunk.
+            if pos == starts[line]:
+                head = costs[line]
+            elif fixed_ratio is not None:
+                head = starts[line + 1] - pos
+            else:
+                head = max(costs[line] - line_consumed, 1)
+            used = 0
+            best = {}
+            j = line
+            while j < line_count:
+                cost = head if j == line else costs[j]
+                if used + cost > budget:
+                    break
+                used += cost
+                j += 1
+                if j < line_count:
+                    best[priorities[j]] = (j, used)
+            if j > line:
+                cut, cut_cost = j, used
+                if j < line_count:
+                    for priority in (TOP_LEVEL, BLANK):
+                        candidate = best.get(priority)
+                        if candidate is not None and candidate[1] >= budget * MIN_FILL:
+                            cut, cut_cost = candidate
+                            break
+                count = chunk_tokens(pos, starts[cut], cut_cost)
+                # Summed line costs only estimate the count of a chunk for tokenizers that
+                # are not fixed-ratio: move the cut back a line at a time while it is over.
+                while count > max_tokens and cut > line + 1:
+                    cut -= 1
+                    count = tokenizer.count(content[pos:starts[cut]], file_path)
+                if count <= max_tokens:
+                    layout.append((pos, starts[cut], count))
+                    if cut == line_count:
+                        break
+                    line = max(cut - self.overlap, line + 1)
+                    pos = starts[line]
+                    line_consumed = 0
+                    continue
+            # The (rest of the) line alone exceeds the budget: split inside it.
+            line_chars_per_token = max((starts[line + 1] - starts[line]) / max(costs[line], 1), 1.0)
+            end, count = _split_inside(content, pos, starts[line + 1], max_tokens, tokenizer, file_path,
+                                       line_chars_per_token)
+            layout.append((pos, end, count))
+            pos = end
+            line_consumed += count
+            if pos == starts[line + 1]:
+                line += 1
+                line_consumed = 0
+        return layout
+
+def _segment_end(data, start: int, limit: int) -> int:
+    """
+    Pick the end of a segment of data starting at start: just after the last newline
+    before limit or, if a line is longer than that, just after its end.
+    """
+    if limit >= len(data):
+        return len(data)
+    newline = data.rfind(b"\n", start, limit)
+    if newline == -1:
+        newline = data.find(b"\n", limit)
+        if newline == -1:
+            return len(data)
+    return newline + 1
+
+def _byte_offsets(text: str, offsets: List[int]) -> dict:
+    """
+    Map character offsets into text to the byte offsets of its UTF-8 encoding.
+    """
+    result = {}
+    pos = 0
+    byte_pos = 0
+    for offset in sorted(set(offsets)):
+        byte_pos += len(text[pos:offset].encode('utf-8'))
+        pos = offset
+        result[offset] = byte_pos
+    return result
+
+def _split_inside(content: str, start: int, limit: int, max_tokens: int, tokenizer: Tokenizer,
+                  file_path: Optional[str], chars_per_token: float) -> Tuple[int, int]:
+    """
+    Find a large end <= limit such that content[start:end] fits max_tokens, returning the
+    end offset and its token count. The first window is sized from chars_per_token and
+    shrunk until it fits. Always consumes at least one character.
+    """
+    if tokenizer.chars_per_token is not None:
+        end = min(start + max_tokens * tokenizer.chars_per_token, limit)
+        return end, math.ceil((end - start) / tokenizer.chars_per_token)
+    size = max(1, int(max_tokens * chars_per_token))
+    while True:
+        end = min(start + size, limit)
+        count = tokenizer.count(content[start:end], file_path)
+        if count <= max_tokens or size == 1:
+            return end, count
+        size = max(1, int(size * max_tokens / count * 0.95))
+
+def _fixed_layout(content: str, max_tokens: int, tokenizer: Tokenizer, file_path: Optional[str],
+                  tokens: int) -> Layout:
+    """
+    Slice content at fixed character offsets, shrinking each window until it fits.
+    """
+    layout = []
+    start = 0
+    chars_per_token = max(len(content) / max(tokens, 1), 1.0)
+    while start < len(content):
+        end, count = _split_inside(content, start, len(content), max_tokens, tokenizer, file_path,
+                                   chars_per_token)
+        layout.append((start, end, count))
+        start = end
+    return layout
@@ -0,0 +1,205 @@
+"""
+Content de-duplication for llm-fuse.
+
+Deduplicator sits between the section generator and write_output_files. It hashes the
+content of every file as its sections stream past, and when a file's content is identical
+to a file already written, the copy's sections are replaced by one short section that
+refers to the first file. Files too small to be worth a reference are left alone.
+
+Near-duplicate detection is optional. It uses MinHash in its bottom-k form: each file is
+sketched by the NEAR_SKETCH_SIZE smallest hashes of its shingles (runs of
+NEAR_SHINGLE_LINES consecutive non-blank lines, with whitespace stripped). Candidates are
+found through an index from sketch values to the files that contain them, and the
+Jaccard similarity of a candidate is estimated from the two sketches. Files at least as
+similar as the threshold to an earlier file are collapsed into a reference as well.
+
+Only hashes and sketches are kept; file contents are never held beyond their own sections.
+"""
+
+import hashlib
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from llm_fuse.sections import FileRecord, FileSection
+from llm_fuse.tokenizers import HeuristicTokenizer, Tokenizer
+
+# Files with fewer tokens are always written out: a reference would save next to nothing.
+DEDUP_MIN_TOKENS = 32
+DEFAULT_NEAR_THRESHOLD = 0.9
+NEAR_SKETCH_SIZE = 64
+NEAR_SHINGLE_LINES = 3
+# Sketch values shared by more files than this (boilerplate) are not used to find candidates.
+NEAR_MAX_POSTINGS = 64
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def file_digest(record: FileRecord) -> bytes:
+    """
+    Return a digest of a file's content: of the decoded text, or of the file's bytes for
+    memory-mapped files, which are read in blocks.
+    """
+    digest = hashlib.sha1()
+    if record.content is not None:
+        digest.update(record.content.encode("utf-8", "surrogatepass"))
+    else:
+        with open(record.path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.digest()
+
+def minhash_sketch(text: str, size: int = NEAR_SKETCH_SIZE) -> List[int]:
+    """
+    Return the bottom-k MinHash sketch of text: the size smallest distinct hashes of its
+    shingles, in ascending order. Shingles are hashed with 64-bit BLAKE2b rather than
+    Python's per-process randomized hash, so sketches (and the files collapsed) are the
+    same in every run.
+    """
+    lines = [line for line in map(str.strip, text.splitlines()) if line]
+    width = min(NEAR_SHINGLE_LINES, len(lines))
+    hashes = {_shingle_hash("\n".join(shingle)) for shingle in zip(*[lines[i:] for i in range(width)])}
+    return heapq.nsmallest(size, hashes)
+
+def _shingle_hash(shingle: str) -> int:
+    digest = hashlib.blake2b(shingle.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def estimate_similarity(first: List[int], second: List[int], size: int = NEAR_SKETCH_SIZE) -> float:
+    """
+    Estimate the Jaccard similarity of two texts from their bottom-k sketches: the share
+    of the size smallest hashes of the union that appear in both sketches.
+    """
+    first_set = set(first)
+    second_set = set(second)
+    union = heapq.nsmallest(size, first_set | second_set)
+    if not union:
+        return 0.0
+    return sum(1 for value in union if value in first_set and value in second_set) / len(union)
+
+def format_dedup_summary(duplicates: int, saved_tokens: int, near_duplicates: Optional[int] = None) -> str:
+    """
+    Format the header line reporting collapsed duplicates; near_duplicates is left out
+    when near-duplicate detection is off.
+    """
+    details = f"{duplicates} identical"
+    if near_duplicates is not None:
+        details += f", {near_duplicates} near-identical"
+    return f"Duplicate files collapsed: {details} (approx. {saved_tokens} tokens saved)"
+
+def format_reference(description: str, tokens: int) -> str:
+    """
+    Format the text of the section that replaces a collapsed file of the given size.
+    """
+    return f"[{description}; {tokens} tokens of content omitted.]\n"
+
+class Deduplicator:
+    """
+    Replaces the sections of duplicate files by a reference to the first copy, counting the
+    files collapsed and the tokens saved. Relative paths in references are relative to
+    base_dir; reference sections are counted with tokenizer. near_threshold enables
+    near-duplicate detection at that estimated similarity.
+    """
+
+    def __init__(self, base_dir: str, tokenizer: Optional[Tokenizer] = None,
+                 near_threshold: Optional[float] = None):
+        self.base_dir = base_dir
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+        self.near_threshold = near_threshold
+        self.duplicates = 0
+        self.near_duplicates = 0
+        self.saved_tokens = 0
+        # Path of every collapsed file -> path of the file its reference points to.
+        self.originals: Dict[str, str] = {}
+        # Content digest -> description and path of the file referred to by later copies:
+        # the first file with that content or, if that file was itself collapsed, its original.
+        self._seen: Dict[bytes, Tuple[str, bool, str]] = {}
+        # Near-duplicate index: sketches of written files and sketch value -> file numbers.
+        self._sketches: List[Tuple[str, str, List[int]]] = []
+        self._postings: Dict[int, List[int]] = {}
+
+    def filter(self, sections: Iterable[FileSection]) -> Iterator[FileSection]:
+        """
+        Yield sections unchanged, except that each duplicate file's sections are replaced
+        by a single reference section. A file's sections must be consecutive.
+        """
+        pending: List[FileSection] = []
+        for section in sections:
+            if pending and section.file is not pending[0].file:
+                yield from self._resolve(pending)
+                pending = []
+            pending.append(section)
+        if pending:
+            yield from self._resolve(pending)
+
+    def summary(self) -> Optional[str]:
+        """
+        Describe the duplicates collapsed so far for the output header, or return None.
+        """
+        if not self.duplicates and not self.near_duplicates:
+            return None
+        return format_dedup_summary(self.duplicates, self.saved_tokens,
+                                    self.near_duplicates if self.near_threshold is not None else None)
+
+    def _resolve(self, sections: List[FileSection]) -> List[FileSection]:
+        record = sections[0].file
+        tokens = sum(section.tokens for section in sections)
+        if tokens < DEDUP_MIN_TOKENS:
+            return sections
+        relative_path = "./" + record.relpath(self.base_dir).replace("\\", "/")
+        digest = file_digest(record)
+        seen = self._seen.get(digest)
+        if seen is not None:
+            description, near, original = seen
+            self.originals[record.path] = original
+            if near:
+                self.near_duplicates += 1
+            else:
+                self.duplicates += 1
+            return [self._reference(record, tokens, description)]
+        self._seen[digest] = (f"Identical to {relative_path}", False, record.path)
+        if self.near_threshold is None or record.content is None:
+            return sections
+        sketch = minhash_sketch(record.content)
+        if not sketch:
+            return sections
+        match = self._find_similar(sketch)
+        if match is not None:
+            original, original_path, similarity = match
+            description = f"Nearly identical to {original} (about {similarity:.0%} similar)"
+            self._seen[digest] = (description, True, original_path)
+            self.originals[record.path] = original_path
+            self.near_duplicates += 1
+            return [self._reference(record, tokens, description)]
+        self._add_sketch(relative_path, record.path, sketch)
+        return sections
+
+    def _reference(self, record: FileRecord, tokens: int, description: str) -> FileSection:
+        text = format_reference(description, tokens)
+        reference_tokens = self.tokenizer.count(text, record.path)
+        self.saved_tokens += tokens - reference_tokens
+        return FileSection(FileRecord(record.path, text), 0, len(text), reference_tokens)
+
+    def _find_similar(self, sketch: List[int]) -> Optional[Tuple[str, str, float]]:
+        shared = Counter()
+        for value in sketch:
+            postings = self._postings.get(value)
+            if postings is not None and len(postings) <= NEAR_MAX_POSTINGS:
+                shared.update(postings)
+        # Sketches of files this similar share at least about that share of their values.
+        needed = self.near_threshold * len(sketch) / 2
+        best = None
+        for number, count in shared.most_common():
+            if count < needed:
+                break
+            relative_path, path, other = self._sketches[number]
+            similarity = estimate_similarity(sketch, other)
+            if similarity >= self.near_threshold and (best is None or similarity > best[2]):
+                best = (relative_path, path, similarity)
+        return best
+
+    def _add_sketch(self, relative_path: str, path: str, sketch: List[int]) -> None:
+        number = len(self._sketches)
+        self._sketches.append((relative_path, path, sketch))
+        for value in sketch:
+            postings = self._postings.setdefault(value, [])
+            if len(postings) <= NEAR_MAX_POSTINGS:
+                postings.append(number)
@@ -0,0 +1,183 @@
+"""
+Structured, compressed and indexed output for llm-fuse (--format, --compress, --index).
+
+Besides the plain-text aggregate, llm-fuse can write JSONL: one JSON record per section,
+followed by a summary record. Either format can be compressed with gzip or zstd. Each
+section is compressed as its own frame (a gzip member or a zstd frame), and standard tools
+decompress concatenated frames as one stream.
+
+The sidecar index (<output>.index.json) records, for every section, the output file it
+is in and the byte offset and length of its frame, or of its bytes when uncompressed. A
+consumer can then seek to one file's content in a multi-gigabyte aggregate and decode only
+that frame (see read_indexed_section).
+
+The index also allows JSONL output to be updated in place. New sections are appended,
+and the index is pointed at them; the sections they replace become dead bytes. The file is
+compacted once dead bytes outweigh live ones. New sections are appended before the index
+is replaced, so an update interrupted while appending leaves the previous index valid.
+"""
+
+import json
+import os
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for --compress zstd.
+    zstandard = None
+
+OUTPUT_FORMATS = ("text", "jsonl")
+COMPRESSIONS = ("gzip", "zstd")
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+INDEX_VERSION = 1
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COPY_BLOCK_SIZE = 1024 * 1024
+
+def check_compression(compression: Optional[str]) -> None:
+    """
+    Raise ValueError if compression is unknown or its module is not installed.
+    """
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"unknown compression '{compression}'")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package (pip install zstandard)")
+
+def compressed_path(output_path: str, compression: Optional[str]) -> str:
+    """
+    Return output_path with the compression's file suffix, unless it already has it.
+    """
+    suffix = COMPRESSION_SUFFIXES.get(compression, "")
+    return output_path if output_path.endswith(suffix) else output_path + suffix
+
+def index_path_for(output_path: str) -> str:
+    """
+    Return the path of the sidecar index for an output path given with --output.
+    """
+    return f"{os.path.splitext(output_path)[0]}.index.json"
+
+class FrameWriter:
+    """
+    Writes frames to a binary file: each frame is compressed on its own (or written as is,
+    without compression) and its (offset, length) in the file is returned by finish.
+    """
+
+    def __init__(self, f, compression: Optional[str] = None):
+        self.f = f
+        self.compression = compression
+        self._compressor = None
+        self._offset = 0
+
+    def start(self) -> None:
+        self._offset = self.f.tell()
+        if self.compression == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif self.compression == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def write(self, data: bytes) -> None:
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self.f.write(data)
+
+    def finish(self) -> Tuple[int, int]:
+        if self._compressor is not None:
+            self.f.write(self._compressor.flush())
+            self._compressor = None
+        return self._offset, self.f.tell() - self._offset
+
+def decompress_frame(data: bytes, compression: Optional[str]) -> bytes:
+    """
+    Decompress one frame written by FrameWriter.
+    """
+    if compression == "gzip":
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    if compression == "zstd":
+        check_compression(compression)
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+def iter_json_string(pieces: Iterable[str]) -> Iterator[str]:
+    """
+    Yield a JSON string literal encoding the concatenation of pieces, piece by piece, so
+    that long contents are never held as one escaped string.
+    """
+    yield '"'
+    for piece in pieces:
+        yield json.dumps(piece, ensure_ascii=False)[1:-1]
+    yield '"'
+
+def section_record_prefix(relative_path: str, chunk_index: int, total_chunks: int, tokens: int) -> str:
+    """
+    Return the start of a JSONL section record, up to the value of its "content" field,
+    which the caller writes (see iter_json_string) before closing the record with "}\\n".
+    """
+    fields = {"type": "section", "path": relative_path, "chunk_index": chunk_index,
+              "total_chunks": total_chunks, "tokens": tokens}
+    return json.dumps(fields, ensure_ascii=False)[:-1] + ', "content": '
+
+def summary_record(display_base_dir: str, section_count: int, total_tokens: int,
+                   relative_paths: List[str], notes: Optional[List[str]] = None) -> str:
+    """
+    Return the JSONL summary record written after the sections.
+    """
+    record = {"type": "summary", "base_directory": display_base_dir, "sections": section_count,
+              "total_tokens": total_tokens, "files": relative_paths}
+    if notes:
+        record["notes"] = notes
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def load_index(index_path: str) -> dict:
+    """
+    Load a sidecar index. Raises RuntimeError if it is missing or not a supported index.
+    """
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Error: Could not read output index '{index_path}': {e}")
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        raise RuntimeError(f"Error: '{index_path}' is not a version {INDEX_VERSION} llm-fuse output index.")
+    return index
+
+def save_index(index_path: str, index: dict) -> None:
+    """
+    Write a sidecar index, replacing any previous one atomically.
+    """
+    temp_path = index_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        # json.dumps uses the C encoder; json.dump would encode piece by piece in Python.
+        f.write(json.dumps(index, ensure_ascii=False) + "\n")
+    os.replace(temp_path, index_path)
+
+def read_indexed_section(index_path: str, entry: dict, index: Optional[dict] = None) -> str:
+    """
+    Return the content of one section listed in an index, reading and decompressing only
+    that section's frame.
+    """
+    if index is None:
+        index = load_index(index_path)
+    path = os.path.join(os.path.dirname(os.path.abspath(index_path)), entry["file"])
+    with open(path, 'rb') as f:
+        f.seek(entry["offset"])
+        data = decompress_frame(f.read(entry["length"]), index["compression"])
+    if index["format"] == "jsonl":
+        return json.loads(data)["content"]
+    start = entry["content_offset"]
+    return data[start:start + entry["content_length"]].decode("utf-8")
+
+def copy_frames(src, dst, frames: Iterable[Tuple[int, int]]) -> Iterator[int]:
+    """
+    Copy (offset, length) frames from src to the end of dst in the given order, yielding
+    the new offset of each.
+    """
+    for offset, length in frames:
+        yield dst.tell()
+        src.seek(offset)
+        while length > 0:
+            block = src.read(min(length, COPY_BLOCK_SIZE))
+            if not block:
+                raise OSError("output file is shorter than its index")
+            dst.write(block)
+            length -= len(block)
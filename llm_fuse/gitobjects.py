@@ -0,0 +1,92 @@
+"""
+Read file contents straight from a Git object database.
+
+list_git_tree lists the blobs of a tree-ish with their sizes (git ls-tree -r -l), and
+iter_blobs streams the contents of many blobs through a single `git cat-file --batch`
+process, so a whole commit can be read without a checkout and without one process or
+open() per file.
+"""
+
+import os
+import subprocess
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# (path relative to the listed directory, blob id, size in bytes)
+GitEntry = Tuple[str, str, int]
+
+SYMLINK_MODE = b"120000"
+
+def list_git_tree(directory: str, ref: str) -> List[GitEntry]:
+    """
+    List every blob reachable from the tree of ref below directory, in git's path order.
+    Symbolic links and submodules are left out. Raises RuntimeError if git fails (for
+    example when directory is not inside a repository or ref does not exist).
+    """
+    try:
+        output = subprocess.check_output(
+            ["git", "ls-tree", "-r", "-l", "-z", ref],
+            cwd=directory,
+            stderr=subprocess.PIPE
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        detail = getattr(e, "stderr", None)
+        message = detail.decode("utf-8", "replace").strip() if detail else str(e)
+        raise RuntimeError(f"Error listing files of '{ref}': {message}")
+    entries = []
+    for record in output.split(b"\0"):
+        if not record:
+            continue
+        meta, path = record.split(b"\t", 1)
+        mode, kind, oid, size = meta.split()
+        if kind != b"blob" or mode == SYMLINK_MODE:
+            continue
+        entries.append((os.fsdecode(path), oid.decode("ascii"), int(size)))
+    return entries
+
+def iter_blobs(directory: str, oids: Iterable[str]) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Yield (oid, contents) for every object id, in order, reading them all through one
+    `git cat-file --batch` process. Contents are None for objects that do not exist.
+    The ids are written from a separate thread so that neither pipe can fill up and stall.
+    """
+    oids = list(oids)
+    if not oids:
+        return
+    process = subprocess.Popen(
+        ["git", "cat-file", "--batch"],
+        cwd=directory,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE
+    )
+
+    def feed():
+        try:
+            for oid in oids:
+                process.stdin.write(oid.encode("ascii") + b"\n")
+            process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        for oid in oids:
+            header = process.stdout.readline()
+            if not header:
+                raise RuntimeError("git cat-file exited unexpectedly")
+            fields = header.split()
+            if len(fields) != 3:
+                # "<oid> missing" (or ambiguous): nothing else follows.
+                yield oid, None
+                continue
+            size = int(fields[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)
+            yield oid, data
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        writer.join()
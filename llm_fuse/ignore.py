@@ -0,0 +1,157 @@
+"""
+.gitignore-style ignore files for llm-fuse's directory walk.
+
+Patterns from .gitignore and .llmfuseignore files are compiled once into regular
+expressions. Each ignore file applies to the directory it lives in and everything below it;
+deeper files take precedence over shallower ones and, within a file, the last matching
+pattern wins, as in git. Supported syntax: comments, blank lines, "!" negation, trailing
+"/" for directories only, leading or inner "/" to anchor a pattern to the ignore file's
+directory, "*", "?", "[...]" and "**".
+"""
+
+import os
+import re
+from typing import List, Optional, Pattern, Tuple
+
+IGNORE_FILE_NAMES = (".gitignore", ".llmfuseignore")
+
+# (compiled pattern, negated, directories only)
+Rule = Tuple[Pattern, bool, bool]
+
+def _translate_glob(pattern: str) -> str:
+    """
+    Translate a gitignore glob (without anchoring or trailing slash) into a regex fragment.
+    """
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                at_end = i + 2 == n or pattern[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        # "dir/**" matches everything inside dir.
+                        out.append(".*")
+                    else:
+                        # "**/" matches zero or more directories.
+                        out.append("(?:.*/)?")
+                        i += 1
+                    i += 2
+                    continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith(("[!", "[^"), i) else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+def compile_ignore_pattern(line: str) -> Optional[Rule]:
+    """
+    Compile one line of an ignore file. Returns None for blank lines and comments.
+    """
+    line = line.rstrip("\n").rstrip("\r")
+    # Trailing spaces are ignored unless escaped with a backslash.
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    line = line.lstrip("/")
+    body = _translate_glob(line)
+    regex = ("^" if anchored else "^(?:.*/)?") + body + "$"
+    return re.compile(regex), negated, dir_only
+
+def load_ignore_file(path: str) -> List[Rule]:
+    """
+    Read and compile an ignore file, returning an empty list if it cannot be read.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        rule = compile_ignore_pattern(line)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+def load_directory_rules(directory: str) -> List[Rule]:
+    """
+    Load the rules from every ignore file present in a directory.
+    """
+    rules = []
+    for name in IGNORE_FILE_NAMES:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            rules.extend(load_ignore_file(path))
+    return rules
+
+def match_rules(rules: List[Rule], rel_path: str, is_dir: bool) -> Optional[bool]:
+    """
+    Return True if rules ignore rel_path, False if a negation re-includes it, or None if
+    no rule matches. rel_path uses "/" separators and is relative to the rules' directory.
+    """
+    for regex, negated, dir_only in reversed(rules):
+        if dir_only and not is_dir:
+            continue
+        if regex.match(rel_path):
+            return not negated
+    return None
+
+class IgnoreMatcher:
+    """
+    Tracks the ignore rules in effect while walking a tree top-down. Each entry of the scope
+    list pairs a directory prefix relative to the walk root ("" or "sub/dir/") with the
+    rules loaded from that directory.
+    """
+
+    def __init__(self, scopes: Optional[List[Tuple[str, List[Rule]]]] = None):
+        self.scopes = scopes or []
+
+    def child(self, rel_dir: str, rules: List[Rule]) -> "IgnoreMatcher":
+        """
+        Return the matcher for a subdirectory that contributes its own rules.
+        """
+        if not rules:
+            return self
+        return IgnoreMatcher(self.scopes + [(rel_dir + "/" if rel_dir else "", rules)])
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Decide whether a path relative to the walk root is ignored. Deeper scopes win.
+        """
+        for prefix, rules in reversed(self.scopes):
+            result = match_rules(rules, rel_path[len(prefix):], is_dir)
+            if result is not None:
+                return result
+        return False
@@ -5,13 +5,32 @@ llm-fuse
 A tool to help aggregate source files (or any text files) into one or more output files
 that you can paste into an LLM prompt to provide context. This version supports:
 
-- Scanning a local directory (or only Git-tracked files via --git)
+- Scanning a local directory (or only Git-tracked files via --git, optionally read straight
+  from the object database at a given commit with --git-ref)
 - Cloning a remote Git repository (GitHub, GitLab, etc.) via URL with --repo
 - Optional branch specification using --branch
-- Recursive file scanning with include/exclude filtering (via regex)
-- Rough token counting (approx. 1 token per 4 characters)
+- A persistent, incrementally fetched mirror of remote repositories (--mirror), checking out
+  only the files the include/exclude filters can select
+- Restricting a run to the files changed since a Git ref (--since, --changed-only), optionally
+  as unified diffs (--diff)
+- Recursive file scanning with include/exclude filtering (via regex), pruning excluded
+  directories and honouring .gitignore/.llmfuseignore files
+- Rough token counting (approx. 1 token per 4 characters) or a pluggable tokenizer (--tokenizer)
 - Automatic chunking of file content if it exceeds a specified token threshold (--max-tokens)
+- Optional packing of sections into output files of bounded token size (--pack-tokens)
+- Parallel file reading with a worker pool (--jobs), with deterministic output order
+- An incremental on-disk cache (under ~/.cache/llm-fuse/) of text detection and chunking results
+- Memory-mapped handling of very large files, copied to the output without decoding
+- Optional minification of file contents (--minify): comments, docstrings, indentation, long
+  literals and lockfiles are reduced before counting, so fewer tokens carry the same code
+- Collapsing of duplicate (and, with --near-duplicates, nearly identical) files into references
+- JSONL and gzip/zstd-compressed output (--format, --compress) with a sidecar index of section
+  offsets (--index) that also allows JSONL output to be updated in place (--update)
+- Relevance-ranked selection of the files that fit a token budget (--budget, --query)
+- Per-stage run statistics (--stats, --stats-json) and cProfile output (--profile)
+- A watch mode (--watch) that keeps the output up to date, re-reading only changed files
 - Producing one aggregated output file with a header summary and file system diagram
+  (optionally limited in depth with --tree-depth or collapsed with --tree-collapse)
   for all non-chunked and first-chunk content, plus separate output files for subsequent chunks.
   
 Usage:
@@ -26,20 +45,46 @@ Notes:
     processed, and then removed after generating the output files.
   - In the aggregated output file, file paths are rendered relative to the repository root,
     always prefixed with "./" (e.g. "./webpack.config.js", "./src/js/main.js").
-  - The token count is estimated using a simple heuristic of 1 token per 4 characters.
-  - Files exceeding the --max-tokens threshold are split into manageable chunks.
+  - The token count is estimated using a simple heuristic of 1 token per 4 characters,
+    unless another backend is chosen with --tokenizer (an offline BPE vocabulary or a
+    per-extension byte-class estimator).
+  - Files exceeding the --max-tokens threshold are split into manageable chunks, at top-level
+    definitions, blank lines or line ends where possible (see --chunk-strategy).
   - Only the first output file (group 1) includes the summary and file system diagram.
 """
 
 import os
 import re
+import json
 import math
 import argparse
+import codecs
+import cProfile
+import hashlib
+import mmap
 import subprocess
 import tempfile
 import shutil
 import sys
-from typing import List, Tuple, Optional
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Pattern, Tuple, Optional, Union
+
+from llm_fuse.cache import CACHE_DIR_NAME, FileCache, content_digest, default_cache_dir
+from llm_fuse.chunking import CHUNK_STRATEGIES, Chunker
+from llm_fuse.dedup import DEFAULT_NEAR_THRESHOLD, Deduplicator, format_dedup_summary
+from llm_fuse.formats import (COMPRESSIONS, INDEX_VERSION, OUTPUT_FORMATS, FrameWriter, check_compression,
+                              compressed_path, copy_frames, index_path_for, iter_json_string, load_index,
+                              save_index, section_record_prefix, summary_record)
+from llm_fuse.gitobjects import GitEntry, iter_blobs, list_git_tree
+from llm_fuse.ignore import IgnoreMatcher, load_directory_rules
+from llm_fuse.minify import Minifier
+from llm_fuse.mirror import checkout_worktree, default_mirror_root, remove_worktree, update_mirror
+from llm_fuse.relevance import BudgetSelector
+from llm_fuse.sections import FileSection, as_section, sections_from_layout
+from llm_fuse.stats import RunStats
+from llm_fuse.tokenizers import HeuristicTokenizer, Tokenizer, calibrate_byte_class, get_tokenizer
 
 def approximate_token_count(text: str) -> int:
     """
@@ -47,17 +92,106 @@ def approximate_token_count(text: str) -> int:
     """
     return math.ceil(len(text) / 4)
 
+# Extensions that are always binary; such files are skipped without being opened.
+BINARY_EXTENSIONS = frozenset((
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".icns", ".webp", ".tif", ".tiff", ".psd",
+    ".zip", ".jar", ".war", ".ear", ".apk", ".aar", ".gz", ".tgz", ".bz2", ".xz", ".lz", ".lzma",
+    ".zst", ".7z", ".rar", ".tar", ".iso", ".dmg", ".deb", ".rpm",
+    ".so", ".dll", ".dylib", ".exe", ".o", ".obj", ".a", ".lib", ".class", ".pyc", ".pyo", ".pyd",
+    ".whl", ".egg", ".wasm", ".node",
+    ".mp3", ".mp4", ".m4a", ".wav", ".ogg", ".flac", ".avi", ".mov", ".mkv", ".webm",
+    ".ttf", ".otf", ".woff", ".woff2", ".eot",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".odt", ".ods",
+    ".sqlite", ".sqlite3", ".db", ".npy", ".npz", ".pkl", ".pickle", ".pt", ".pth", ".onnx", ".h5",
+))
+
+# Leading bytes of common binary formats, checked on the bytes already read for decoding.
+MAGIC_NUMBERS = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF87a", b"GIF89a", b"PK\x03\x04", b"PK\x05\x06", b"\x7fELF",
+    b"\xca\xfe\xba\xbe", b"\xcf\xfa\xed\xfe", b"\xce\xfa\xed\xfe", b"\xfe\xed\xfa\xcf", b"%PDF-",
+    b"\x1f\x8b", b"\xfd7zXZ\x00", b"7z\xbc\xaf\x27\x1c", b"\x28\xb5\x2f\xfd", b"Rar!\x1a\x07",
+    b"\x00asm", b"OggS", b"fLaC", b"RIFF", b"SQLite format 3\x00", b"wOFF", b"wOF2",
+)
+
+# Bytes inspected for the control-character ratio, and the ratio above which a file is binary.
+CLASSIFY_WINDOW = 8192
+MAX_CONTROL_RATIO = 0.1
+# Data that is not valid UTF-8 is only accepted as a legacy 8-bit encoding (e.g. Latin-1)
+# when at most this share of its bytes are non-ASCII; compressed data is around one half.
+MAX_LEGACY_HIGH_RATIO = 0.3
+# C0 control characters other than tab, newline, vertical tab, form feed, carriage return and escape.
+_CONTROL_BYTES = bytes(b for b in range(32) if b not in (9, 10, 11, 12, 13, 27)) + b"\x7f"
+_NON_CONTROL_BYTES = bytes(b for b in range(256) if b not in _CONTROL_BYTES)
+_ASCII_BYTES = bytes(range(128))
+
+def binary_extension_reason(file_path: str) -> Optional[str]:
+    """
+    Return "binary-extension" if the file name alone marks it as binary, otherwise None.
+    """
+    if os.path.splitext(file_path)[1].lower() in BINARY_EXTENSIONS:
+        return "binary-extension"
+    return None
+
+def classify_bytes(data: bytes) -> Optional[str]:
+    """
+    Classify file contents without decoding them. Returns None for text, or the reason the
+    data looks binary: "magic-number", "nul-bytes", "control-chars" or "non-text-encoding".
+    The NUL check covers the whole buffer; the other checks use the first CLASSIFY_WINDOW
+    bytes. UTF-16 text with a byte order mark is treated as text, and data that is not
+    UTF-8 is accepted as a legacy 8-bit encoding only if it is mostly ASCII.
+    """
+    if data.startswith(MAGIC_NUMBERS):
+        return "magic-number"
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return None
+    if b"\x00" in data:
+        return "nul-bytes"
+    window = data[:CLASSIFY_WINDOW]
+    if not window:
+        return None
+    if len(window.translate(None, _NON_CONTROL_BYTES)) / len(window) > MAX_CONTROL_RATIO:
+        return "control-chars"
+    high_ratio = len(window.translate(None, _ASCII_BYTES)) / len(window)
+    if high_ratio > MAX_LEGACY_HIGH_RATIO:
+        try:
+            # A multi-byte sequence may be cut at the end of the window.
+            codecs.getincrementaldecoder('utf-8')().decode(window, final=False)
+        except UnicodeDecodeError:
+            return "non-text-encoding"
+    return None
+
+def decode_text(data: bytes) -> str:
+    """
+    Decode file bytes the same way reading in UTF-8 text mode would, including universal
+    newlines. Files with a UTF-16 byte order mark are decoded as UTF-16, and bytes that are
+    not valid UTF-8 fall back to Windows-1252 and then Latin-1 so legacy sources are kept.
+    """
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        text = data.decode('utf-16')
+    else:
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            try:
+                text = data.decode('cp1252')
+            except UnicodeDecodeError:
+                text = data.decode('latin-1')
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
 def is_text_file(file_path: str) -> bool:
     """
-    Attempt to read a small portion of the file with UTF-8 encoding.
-    If successful, assume it is a text file; otherwise skip binary or unreadable files.
+    Decide whether a file is text from its extension and the leading bytes of its contents
+    (magic numbers, NUL bytes and the ratio of control characters).
+    Unreadable files are treated as binary.
     """
+    if binary_extension_reason(file_path):
+        return False
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            f.read(1024)
-        return True
+        with open(file_path, 'rb') as f:
+            head = f.read(CLASSIFY_WINDOW)
     except Exception:
         return False
+    return classify_bytes(head) is None
 
 def get_git_tracked_files(directory: str) -> Optional[List[str]]:
     """
@@ -75,15 +209,158 @@ def get_git_tracked_files(directory: str) -> Optional[List[str]]:
     except Exception:
         return None
 
+def get_changed_files(directory: str, since: str = "HEAD") -> Optional[List[str]]:
+    """
+    Return the files below directory (relative to it) that differ from the commit since:
+    committed, staged and unstaged changes from 'git diff --name-only', plus untracked files
+    that are not ignored. Deleted files are left out. Returns None if git fails (for example
+    if the directory is not a git repository or the ref does not exist).
+    """
+    try:
+        changed = subprocess.check_output(
+            ["git", "diff", "--name-only", "--relative", "-z", "--diff-filter=d", since, "--"],
+            cwd=directory,
+            stderr=subprocess.DEVNULL
+        )
+        untracked = subprocess.check_output(
+            ["git", "ls-files", "--others", "--exclude-standard", "-z"],
+            cwd=directory,
+            stderr=subprocess.DEVNULL
+        )
+    except Exception:
+        return None
+    paths = [os.fsdecode(path) for path in changed.split(b"\0") + untracked.split(b"\0") if path]
+    return sorted(set(paths))
+
+def get_file_diff(directory: str, rel_path: str, since: str = "HEAD") -> str:
+    """
+    Return the unified diff of one file against the commit since, or the whole file as an
+    addition if git does not track it.
+    """
+    output = subprocess.run(
+        ["git", "diff", "--no-color", "--no-ext-diff", "--relative", since, "--", rel_path],
+        cwd=directory,
+        stdout=subprocess.PIPE,
+        check=True
+    ).stdout
+    if not output:
+        # Untracked file: "git diff --no-index" exits with status 1 when there are differences.
+        output = subprocess.run(
+            ["git", "diff", "--no-color", "--no-ext-diff", "--no-index", "--", os.devnull, rel_path],
+            cwd=directory,
+            stdout=subprocess.PIPE
+        ).stdout
+    return decode_text(output)
+
+# --budget looks at most this many recent commits for file recency.
+RECENCY_MAX_COMMITS = 2000
+
+def get_last_commit_times(directory: str, max_commits: int = RECENCY_MAX_COMMITS) -> Optional[Dict[str, int]]:
+    """
+    Return the time of the latest commit touching each file below directory (keyed by the
+    path relative to it, with "/" separators), looking at the last max_commits commits.
+    Returns None if git fails (for example if the directory is not a git repository).
+    """
+    try:
+        output = subprocess.check_output(
+            ["git", "-c", "core.quotepath=off", "log", f"--max-count={max_commits}", "--format=@%ct",
+             "--name-only", "--relative", "--no-renames"],
+            cwd=directory,
+            stderr=subprocess.DEVNULL
+        )
+    except Exception:
+        return None
+    times: Dict[str, int] = {}
+    timestamp = 0
+    for line in os.fsdecode(output).splitlines():
+        if line.startswith("@") and line[1:].isdigit():
+            timestamp = int(line[1:])
+        elif line:
+            # Commits are listed newest first, so the first time seen is the latest.
+            times.setdefault(line, timestamp)
+    return times
+
+# Regex features that let a match depend on what follows it: end anchors, word boundaries
+# and lookarounds. A pattern using them may match a directory's path but not the paths in it.
+_PATH_END_SENSITIVE = re.compile(r"\$|\\[ZbB]|\(\?<?[=!]")
+
+def _prunes_directories(exclude: Pattern) -> bool:
+    """
+    Return True if every path inside a directory whose path (with a trailing separator)
+    matches exclude is certain to match it too, so the directory can be skipped unread.
+    """
+    return not _PATH_END_SENSITIVE.search(exclude.pattern)
+
+def _walk_directory(directory: str, exclude: Optional[Pattern], use_ignore_files: bool) -> List[str]:
+    """
+    Walk directory top-down with os.scandir, in the same order as os.walk, returning file paths.
+    Directories whose path (with a trailing separator) matches the exclude pattern, or that
+    an ignore file excludes, are pruned before being descended into; exclude should only be
+    given if _prunes_directories allows it. Symbolic links to directories are not followed.
+    """
+    file_paths = []
+    root_matcher = IgnoreMatcher().child("", load_directory_rules(directory)) if use_ignore_files else None
+    stack = [(directory, "", root_matcher)]
+    while stack:
+        root, rel_root, matcher = stack.pop()
+        subdirs = []
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            continue
+        for entry in entries:
+            rel_path = rel_root + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Never aggregate llm-fuse's own cache directory (or .git when honouring ignore files).
+                if entry.name == CACHE_DIR_NAME or (matcher is not None and entry.name == ".git"):
+                    continue
+                if entry.is_symlink():
+                    continue
+                if exclude is not None and exclude.search(entry.path + os.sep):
+                    continue
+                if matcher is not None and matcher.is_ignored(rel_path, True):
+                    continue
+                subdirs.append((entry.path, rel_path))
+            else:
+                # A .git file points a worktree or submodule at its repository.
+                if matcher is not None and (entry.name == ".git" or matcher.is_ignored(rel_path, False)):
+                    continue
+                file_paths.append(entry.path)
+        for path, rel_path in reversed(subdirs):
+            child = matcher.child(rel_path, load_directory_rules(path)) if matcher is not None else None
+            stack.append((path, rel_path + "/", child))
+    return file_paths
+
 def collect_files(directory: str, include_regex: Optional[str],
-                  exclude_regex: Optional[str], git_only: bool) -> List[str]:
+                  exclude_regex: Optional[str], git_only: bool,
+                  use_ignore_files: bool = True, changed_since: Optional[str] = None) -> List[str]:
     """
     Collect a list of file paths based on the provided options.
+    If changed_since is given, only the files changed since that commit (including uncommitted
+    and untracked files, see get_changed_files) are considered, without scanning the tree;
+    a RuntimeError is raised if they cannot be listed.
     If git_only is True and the directory is a git repository, only Git-tracked files are considered.
-    Otherwise, all files under the directory (recursively) are considered.
-    Filtering via include/exclude regex is applied on the full file path.
+    Otherwise, all files under the directory (recursively) are considered, skipping anything
+    excluded by .gitignore/.llmfuseignore files unless use_ignore_files is False.
+    Filtering via include/exclude regex is applied on the full file path; both patterns are
+    compiled once, and directories matching the exclude pattern are not descended into
+    unless the pattern could match a directory but not the files in it (see
+    _prunes_directories).
     """
+    include = re.compile(include_regex) if include_regex else None
+    exclude = re.compile(exclude_regex) if exclude_regex else None
     file_paths = []
+    if changed_since is not None:
+        changed = get_changed_files(directory, changed_since)
+        if changed is None:
+            raise RuntimeError(f"Error: Unable to list files changed since '{changed_since}'. "
+                               "Is the directory inside a Git repository?")
+        file_paths = [os.path.join(directory, f) for f in changed]
+        git_only = False
     if git_only:
         git_files = get_git_tracked_files(directory)
         if git_files:
@@ -91,62 +368,431 @@ def collect_files(directory: str, include_regex: Optional[str],
             file_paths = [os.path.join(directory, f) for f in git_files]
         else:
             print("Warning: Not a Git repository or unable to retrieve Git files. Falling back to a full directory scan.")
-    if not file_paths:
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_paths.append(os.path.join(root, file))
+    if not file_paths and changed_since is None:
+        prune = exclude if exclude is not None and _prunes_directories(exclude) else None
+        file_paths = _walk_directory(directory, prune, use_ignore_files)
     # Apply include/exclude filters if specified
     filtered_paths = []
     for path in file_paths:
-        if include_regex and not re.search(include_regex, path):
+        if include is not None and not include.search(path):
             continue
-        if exclude_regex and re.search(exclude_regex, path):
+        if exclude is not None and exclude.search(path):
             continue
         filtered_paths.append(path)
     return filtered_paths
 
-def process_files(file_paths: List[str], max_tokens: Optional[int] = None) -> Tuple[List[dict], int]:
+def collect_git_blobs(directory: str, ref: str, include_regex: Optional[str],
+                      exclude_regex: Optional[str]) -> List[GitEntry]:
     """
-    Process the list of files. For each file determined to be a text file,
-    read its content and compute its approximate token count.
-    If max_tokens is provided and the file's token count exceeds this threshold,
-    split the content into chunks.
-    
-    Returns a list of dictionaries (each containing file path, content, tokens, and, if chunked,
-    chunk index/total chunks) and the total token count.
+    List the blobs of ref's tree below directory as (file path, blob id, size) triples,
+    filtered like collect_files on the full path the file would have in a checkout.
+    Raises RuntimeError if the tree cannot be listed.
+    """
+    include = re.compile(include_regex) if include_regex else None
+    exclude = re.compile(exclude_regex) if exclude_regex else None
+    entries = []
+    for rel_path, oid, size in list_git_tree(directory, ref):
+        path = os.path.join(directory, rel_path)
+        if include is not None and not include.search(path):
+            continue
+        if exclude is not None and exclude.search(path):
+            continue
+        entries.append((path, oid, size))
+    return entries
+
+# Files are read and counted in batches so tokenizers can share work across many files.
+BATCH_MAX_FILES = 32
+PARALLEL_BATCH_MAX_FILES = 8
+BATCH_MAX_BYTES = 4 * 1024 * 1024
+
+def _read_file_text(file_path: str, profile: str, cache: Optional[FileCache] = None,
+                    minifier: Optional[Minifier] = None) -> dict:
+    """
+    Read a single file with one open and one read. Returns {"skipped": reason} for binary
+    files, otherwise a dictionary with the content and, when the cache already knows it,
+    the chunk layout for this profile. Known binary extensions are skipped without opening
+    the file, and files the cache knows to be unchanged skip classification as well.
+    With a minifier, the content is the minified text; with a cache as well, it is stored
+    there, and unchanged files with a cached layout reuse it without being read.
+    Read errors propagate to the caller.
+    """
+    reason = binary_extension_reason(file_path)
+    if reason is not None:
+        return {"skipped": reason}
+    entry = None
+    if cache is not None:
+        key = cache.key_for(file_path)
+        st = os.stat(file_path)
+        entry = cache.lookup(key, st)
+        if entry is not None and not entry["is_text"]:
+            return {"skipped": entry.get("reason") or "binary"}
+        if entry is not None and minifier is not None:
+            layout = cache.get_layout(entry, profile)
+            content = cache.load_text(entry["digest"], minifier.name) if layout is not None else None
+            if content is not None:
+                cache.record(key, st, is_text=True, digest=entry["digest"], profile=profile, layout=layout)
+                return {"content": content, "layout": layout}
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if entry is None:
+        reason = classify_bytes(data)
+        if reason is not None:
+            if cache is not None:
+                cache.record(key, st, is_text=False, reason=reason)
+            return {"skipped": reason, "bytes": len(data)}
+    content = decode_text(data)
+    if cache is None:
+        if minifier is not None:
+            content = minifier.minify(content, file_path)
+        return {"content": content, "layout": None, "bytes": len(data)}
+
+    if entry is None:
+        digest = content_digest(data)
+        entry = cache.lookup_digest(key, st.st_size, digest)
+    else:
+        digest = entry["digest"]
+    if minifier is not None:
+        minified = cache.load_text(digest, minifier.name) if entry is not None else None
+        if minified is None:
+            minified = minifier.minify(content, file_path)
+            cache.store_text(digest, minifier.name, minified)
+        content = minified
+    layout = cache.get_layout(entry, profile)
+    if layout is not None:
+        cache.record(key, st, is_text=True, digest=digest, profile=profile, layout=layout)
+    return {"content": content, "layout": layout, "cache_key": (key, st, digest), "bytes": len(data)}
+
+# Files at least this large are memory-mapped and copied to the output as raw byte ranges.
+DEFAULT_MMAP_THRESHOLD = 32 * 1024 * 1024
+# Block size used when copying mapped files and output bodies.
+MMAP_WINDOW = 1024 * 1024
+
+def _map_large_file(file_path: str, max_tokens: Optional[int], tokenizer: Tokenizer, chunker: Chunker,
+                    profile: str, cache: Optional[FileCache] = None) -> Optional[dict]:
     """
-    files_data = []
-    total_tokens = 0
+    Classify, count and chunk a large file through mmap without materialising it as a string.
+    The chunker lays the mapped bytes out a segment at a time (see Chunker.layout_bytes), with
+    the same boundaries as the regular path, and the result holds byte ranges that the writer
+    copies verbatim.
+
+    Returns {"skipped": reason} for binary files, {"ranges": [(start, end, tokens), ...]}
+    for text files (with the number of bytes scanned under "bytes"), or None when the file needs the regular decode path to keep its output
+    identical (non-UTF-8 data, carriage returns or a UTF-16 byte order mark).
+    """
+    reason = binary_extension_reason(file_path)
+    if reason is not None:
+        return {"skipped": reason}
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return None
+        key = cache.key_for(file_path) if cache is not None else None
+        entry = cache.lookup(key, st) if cache is not None else None
+        if entry is not None:
+            if not entry["is_text"]:
+                return {"skipped": entry.get("reason") or "binary"}
+            layout = cache.get_layout(entry, profile)
+            if layout is not None:
+                return {"ranges": layout, "bytes": 0}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            reason = classify_bytes(mm[:CLASSIFY_WINDOW])
+            if reason is None and mm.find(b"\x00") != -1:
+                reason = "nul-bytes"
+            if reason is not None:
+                if cache is not None:
+                    cache.record(key, st, is_text=False, reason=reason)
+                return {"skipped": reason, "bytes": len(mm)}
+            if mm[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE) or mm.find(b"\r") != -1:
+                return None
+            try:
+                layout = chunker.layout_bytes(mm, max_tokens, tokenizer, file_path)
+            except UnicodeDecodeError:
+                return None
+            if cache is not None:
+                digest = hashlib.sha1(mm).hexdigest()
+                cache.record(key, st, is_text=True, digest=digest, profile=profile, layout=layout)
+    return {"ranges": layout, "bytes": st.st_size}
+
+def _load_batch(file_paths: List[str], max_tokens: Optional[int], tokenizer: Tokenizer,
+                chunker: Chunker, cache: Optional[FileCache] = None,
+                mmap_threshold: Optional[int] = None, stats: Optional[RunStats] = None,
+                minifier: Optional[Minifier] = None) -> List[dict]:
+    """
+    Read a batch of files and compute their chunk layouts, counting the tokens of every
+    file without a cached layout in a single tokenizer.count_batch call.
+    Files of at least mmap_threshold bytes are memory-mapped instead and described by byte
+    ranges (under "ranges") rather than content.
+    Returns one dictionary per file, in input order: text files carry their content and
+    layout, binary files the reason under "skipped" and unreadable files an "error".
+    With stats, the time spent reading and chunking each file is recorded there.
+    With a minifier, every file is read and minified first: minified text cannot be copied
+    from the file, so mmap_threshold is ignored.
+    """
+    profile = f"{tokenizer.name}:{chunker.name}:max_tokens={max_tokens}"
+    mmap_profile = "mmap:" + profile
+    if minifier is not None:
+        profile += f":{minifier.name}"
+    loaded = []
     for file_path in file_paths:
-        if not is_text_file(file_path):
+        start_time = time.perf_counter()
+        try:
+            item = None
+            if minifier is None and mmap_threshold is not None and os.path.getsize(file_path) >= mmap_threshold:
+                item = _map_large_file(file_path, max_tokens, tokenizer, chunker, mmap_profile, cache)
+            if item is None:
+                item = _read_file_text(file_path, profile, cache, minifier)
+        except Exception as e:
+            loaded.append({"path": file_path, "error": e})
             continue
+        item["path"] = file_path
+        item["seconds"] = time.perf_counter() - start_time
+        loaded.append(item)
+    _layout_loaded(loaded, max_tokens, tokenizer, chunker, profile, cache)
+    if stats is not None:
+        for item in loaded:
+            if "error" not in item:
+                stats.record_file(item["path"], item["seconds"], item.get("bytes", 0))
+    return loaded
+
+def _layout_loaded(loaded: List[dict], max_tokens: Optional[int], tokenizer: Tokenizer, chunker: Chunker,
+                   profile: str, cache: Optional[FileCache] = None) -> None:
+    """
+    Compute the chunk layout of every loaded item that has content but no layout yet,
+    counting all of them in a single tokenizer.count_batch call. The time taken is added
+    to each item's "seconds", sharing the batched count in proportion to content length.
+    """
+    uncounted = [item for item in loaded if "content" in item and item["layout"] is None]
+    if uncounted:
+        count_start = time.perf_counter()
+        counts = tokenizer.count_batch([item["content"] for item in uncounted],
+                                       [item["path"] for item in uncounted])
+        count_seconds = time.perf_counter() - count_start
+        total_chars = sum(len(item["content"]) for item in uncounted) or 1
+        for item, tokens in zip(uncounted, counts):
+            layout_start = time.perf_counter()
+            item["layout"] = chunker.layout(item["content"], max_tokens, tokenizer, item["path"], tokens)
+            if cache is not None:
+                key, st, digest = item["cache_key"]
+                cache.record(key, st, is_text=True, digest=digest, profile=profile, layout=item["layout"])
+            item["seconds"] += (time.perf_counter() - layout_start
+                                + count_seconds * len(item["content"]) / total_chars)
+
+def _iter_path_batches(file_paths: Iterable[str], max_files: int = BATCH_MAX_FILES,
+                       max_bytes: int = BATCH_MAX_BYTES) -> Iterator[List[str]]:
+    """
+    Group file paths into batches bounded by file count and total on-disk size.
+    """
+    batch = []
+    batch_bytes = 0
+    for file_path in file_paths:
+        batch.append(file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            tokens = approximate_token_count(content)
-            if max_tokens is not None and tokens > max_tokens:
-                # Estimate maximum characters per chunk (approximation: 1 token ≈ 4 characters)
-                max_chars = max_tokens * 4
-                chunks = [content[i:i+max_chars] for i in range(0, len(content), max_chars)]
-                for idx, chunk in enumerate(chunks):
-                    tokens_chunk = approximate_token_count(chunk)
-                    total_tokens += tokens_chunk
-                    files_data.append({
-                        "path": file_path,
-                        "content": chunk,
-                        "tokens": tokens_chunk,
-                        "chunk_index": idx + 1,
-                        "total_chunks": len(chunks)
-                    })
+            batch_bytes += os.path.getsize(file_path)
+        except OSError:
+            pass
+        if len(batch) >= max_files or batch_bytes >= max_bytes:
+            yield batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield batch
+
+def _iter_loaded_sections(loaded: List[dict], skip_counts: Optional[Counter] = None) -> Iterator[FileSection]:
+    """
+    Turn a loaded batch into sections, reporting read errors in input order and tallying
+    skipped files by reason in skip_counts.
+    """
+    for item in loaded:
+        if "error" in item:
+            print(f"Skipping file '{item['path']}' due to error: {item['error']}")
+            if skip_counts is not None:
+                skip_counts["read-error"] += 1
+            continue
+        if "skipped" in item:
+            if skip_counts is not None:
+                skip_counts[item["skipped"]] += 1
+            continue
+        if "ranges" in item:
+            yield from sections_from_layout(item["path"], None, item["ranges"])
+        else:
+            yield from sections_from_layout(item["path"], item["content"], item["layout"])
+
+def _iter_file_sections_parallel(file_paths: Iterable[str], max_tokens: Optional[int], jobs: int,
+                                 tokenizer: Tokenizer, chunker: Chunker, cache: Optional[FileCache],
+                                 skip_counts: Optional[Counter], mmap_threshold: Optional[int],
+                                 stats: Optional[RunStats], minifier: Optional[Minifier]) -> Iterator[FileSection]:
+    """
+    Spread _load_batch over a thread pool while yielding results in input order.
+    At most 2 * jobs batches are in flight at once so memory stays bounded while streaming.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for batch in _iter_path_batches(file_paths, max_files=PARALLEL_BATCH_MAX_FILES):
+            pending.append(executor.submit(_load_batch, batch, max_tokens, tokenizer, chunker, cache,
+                                           mmap_threshold, stats, minifier))
+            if len(pending) >= jobs * 2:
+                yield from _iter_loaded_sections(pending.popleft().result(), skip_counts)
+        while pending:
+            yield from _iter_loaded_sections(pending.popleft().result(), skip_counts)
+
+def iter_file_sections(file_paths: Iterable[str], max_tokens: Optional[int] = None,
+                       jobs: int = 1, cache: Optional[FileCache] = None,
+                       tokenizer: Optional[Tokenizer] = None,
+                       chunker: Optional[Chunker] = None,
+                       skip_counts: Optional[Counter] = None,
+                       mmap_threshold: Optional[int] = None,
+                       stats: Optional[RunStats] = None,
+                       minifier: Optional[Minifier] = None) -> Iterator[FileSection]:
+    """
+    Lazily process the list of files, yielding one FileSection per file (or per chunk
+    when the file exceeds max_tokens). Files are read in small batches as the consumer asks
+    for the next section, so peak memory is bounded by the largest single file or batch
+    rather than by the size of the whole repository.
+
+    The tokenizer (the 4-characters heuristic by default) counts each batch of files at once,
+    and the chunker (line/definition-aware by default) uses it to place chunk boundaries.
+    With jobs > 1, text detection, reading and chunking run on a pool of worker threads;
+    sections are still yielded in input order, so the output is identical to the serial path.
+    With a cache, unchanged files reuse their recorded text verdict and chunk layout.
+    Files skipped as binary or unreadable are tallied by reason in skip_counts, if given.
+    Files of at least mmap_threshold bytes are memory-mapped and yield sections that are
+    byte ranges of the file (their "content_range") instead of decoded content;
+    write_output_files copies those ranges straight from the file, so they are never held
+    as strings.
+    Per-file read and chunk timings and bytes read are recorded in stats, if given.
+    With a minifier, file contents are minified (see llm_fuse.minify) before they are
+    counted and chunked, so sections and their token counts describe the minified text;
+    large files are then read rather than memory-mapped.
+    """
+    if tokenizer is None:
+        tokenizer = HeuristicTokenizer()
+    if chunker is None:
+        chunker = Chunker()
+    if jobs > 1:
+        yield from _iter_file_sections_parallel(file_paths, max_tokens, jobs, tokenizer, chunker, cache,
+                                                skip_counts, mmap_threshold, stats, minifier)
+        return
+    for batch in _iter_path_batches(file_paths):
+        loaded = _load_batch(batch, max_tokens, tokenizer, chunker, cache, mmap_threshold, stats, minifier)
+        yield from _iter_loaded_sections(loaded, skip_counts)
+
+def iter_git_sections(directory: str, entries: List[GitEntry], max_tokens: Optional[int] = None,
+                      tokenizer: Optional[Tokenizer] = None, chunker: Optional[Chunker] = None,
+                      skip_counts: Optional[Counter] = None, max_blob_size: Optional[int] = None,
+                      stats: Optional[RunStats] = None,
+                      minifier: Optional[Minifier] = None) -> Iterator[FileSection]:
+    """
+    Lazily yield file sections for blobs listed by collect_git_blobs, reading their
+    contents from the object database of the repository containing directory through a
+    single `git cat-file --batch` process. No working tree files are opened.
+    Blobs with a known binary extension, or of at least max_blob_size bytes, are skipped
+    using the sizes from the tree listing, before their contents are read.
+    Sections are the same as those iter_file_sections would produce for a checkout
+    (minified too, with a minifier).
+    """
+    if tokenizer is None:
+        tokenizer = HeuristicTokenizer()
+    if chunker is None:
+        chunker = Chunker()
+    profile = f"{tokenizer.name}:{chunker.name}:max_tokens={max_tokens}"
+    items = []
+    wanted = []
+    for path, oid, size in entries:
+        reason = binary_extension_reason(path)
+        if reason is None and max_blob_size is not None and size >= max_blob_size:
+            reason = "too-large"
+        item = {"path": path, "seconds": 0.0, "bytes": 0}
+        if reason is not None:
+            item["skipped"] = reason
+        else:
+            item["oid"] = oid
+            wanted.append(oid)
+        items.append(item)
+
+    blobs = iter_blobs(directory, wanted)
+    batch = []
+    batch_bytes = 0
+    for index, item in enumerate(items):
+        if "oid" in item:
+            start_time = time.perf_counter()
+            _, data = next(blobs)
+            if data is None:
+                item["error"] = RuntimeError(f"blob {item['oid']} is missing")
             else:
-                total_tokens += tokens
-                files_data.append({
-                    "path": file_path,
-                    "content": content,
-                    "tokens": tokens
-                })
-        except Exception as e:
-            print(f"Skipping file '{file_path}' due to error: {e}")
+                reason = classify_bytes(data)
+                if reason is not None:
+                    item["skipped"] = reason
+                else:
+                    item["content"] = decode_text(data)
+                    if minifier is not None:
+                        item["content"] = minifier.minify(item["content"], item["path"])
+                    item["layout"] = None
+                item["bytes"] = len(data)
+                batch_bytes += len(data)
+            item["seconds"] = time.perf_counter() - start_time
+        batch.append(item)
+        if len(batch) >= BATCH_MAX_FILES or batch_bytes >= BATCH_MAX_BYTES or index == len(items) - 1:
+            _layout_loaded(batch, max_tokens, tokenizer, chunker, profile)
+            if stats is not None:
+                for loaded in batch:
+                    if "error" not in loaded:
+                        stats.record_file(loaded["path"], loaded["seconds"], loaded["bytes"])
+            yield from _iter_loaded_sections(batch, skip_counts)
+            batch = []
+            batch_bytes = 0
+
+def iter_diff_sections(directory: str, file_paths: List[str], since: str = "HEAD",
+                       max_tokens: Optional[int] = None, tokenizer: Optional[Tokenizer] = None,
+                       chunker: Optional[Chunker] = None, skip_counts: Optional[Counter] = None,
+                       stats: Optional[RunStats] = None) -> Iterator[FileSection]:
+    """
+    Lazily yield sections holding the unified diff of each file against the commit since
+    (see get_file_diff) instead of its full content, counted and chunked like file content.
+    """
+    if tokenizer is None:
+        tokenizer = HeuristicTokenizer()
+    if chunker is None:
+        chunker = Chunker()
+    profile = f"{tokenizer.name}:{chunker.name}:max_tokens={max_tokens}"
+    for batch in _iter_path_batches(file_paths):
+        loaded = []
+        for file_path in batch:
+            start_time = time.perf_counter()
+            item = {"path": file_path}
+            try:
+                diff = get_file_diff(directory, os.path.relpath(file_path, directory), since)
+            except Exception as e:
+                item["error"] = e
+            else:
+                item.update({"content": diff, "layout": None, "bytes": len(diff)})
+            item["seconds"] = time.perf_counter() - start_time
+            loaded.append(item)
+        _layout_loaded(loaded, max_tokens, tokenizer, chunker, profile)
+        if stats is not None:
+            for item in loaded:
+                if "error" not in item:
+                    stats.record_file(item["path"], item["seconds"], item["bytes"])
+        yield from _iter_loaded_sections(loaded, skip_counts)
+
+def process_files(file_paths: List[str], max_tokens: Optional[int] = None,
+                  jobs: int = 1, cache: Optional[FileCache] = None,
+                  tokenizer: Optional[Tokenizer] = None,
+                  chunker: Optional[Chunker] = None,
+                  minifier: Optional[Minifier] = None) -> Tuple[List[FileSection], int]:
+    """
+    Process the list of files. For each file determined to be a text file,
+    read its content and compute its approximate token count.
+    If max_tokens is provided and the file's token count exceeds this threshold,
+    split the content into chunks. With a minifier, the content is minified first.
+    
+    Returns a list of FileSection records (each with the file path, content, tokens, and, if
+    chunked, chunk index/total chunks; they can also be read like dictionaries) and the
+    total token count. Chunks of a file share a single copy of its content.
+    This materialises every section in memory; prefer iter_file_sections for large inputs.
+    """
+    files_data = list(iter_file_sections(file_paths, max_tokens, jobs, cache, tokenizer, chunker,
+                                         minifier=minifier))
+    total_tokens = sum(file_data["tokens"] for file_data in files_data)
     return files_data, total_tokens
 
 def build_tree_from_paths(paths: List[str]) -> dict:
@@ -190,8 +836,261 @@ def render_tree(tree: dict, prefix: str = "") -> List[str]:
             lines.extend(render_tree(tree[key], new_prefix))
     return lines
 
-def write_output_files(files_data: List[dict], total_tokens: int, output_path: str,
-                       base_dir: str, display_base_dir: Optional[str] = None) -> None:
+# The diagram is rendered and written in blocks of about this many lines.
+TREE_BLOCK_LINES = 4096
+
+def _tree_sort_key(directory: str) -> Tuple[str, ...]:
+    """
+    Sort key placing every directory right after its parent, with siblings compared
+    case-insensitively (as render_tree does) and names differing only in case ordered by
+    their exact spelling.
+    """
+    # "\x00" ends each name, so that "a" sorts before "ab".
+    return tuple(part.lower() + "\x00" + part for part in directory.split(os.sep))
+
+def _iter_tree_blocks(paths: Iterable[str], max_depth: Optional[int] = None,
+                      collapse: Optional[int] = None) -> Iterator[List[str]]:
+    """
+    Yield the lines of the file system diagram (see iter_tree_lines) in blocks of about
+    TREE_BLOCK_LINES lines.
+    """
+    files_by_dir: Dict[str, List[str]] = {}
+    for path in set(paths):
+        directory, _, name = path.rpartition(os.sep)
+        files_by_dir.setdefault(directory, []).append(name)
+    # Every ancestor of a directory holding files is listed too.
+    directories = set(files_by_dir)
+    for directory in files_by_dir:
+        while directory:
+            directory = directory.rpartition(os.sep)[0]
+            if directory in directories:
+                break
+            directories.add(directory)
+    directories.discard("")
+    if len({directory.lower() for directory in directories}) == len(directories):
+        # Without names differing only in case, one lowercased string per directory sorts the same.
+        sort_key = lambda directory: directory.lower().replace(os.sep, "\x00")
+    else:
+        sort_key = _tree_sort_key
+
+    # Entries in diagram order, as parallel lists: depth, then either a directory name or a
+    # directory's list of file names, and whether the (last) entry is last in its directory.
+    depths: List[int] = []
+    entries: List[Union[str, List[str]]] = []
+    last: List[bool] = []
+    # Files below the max_depth level, summarised when the walk leaves that level.
+    hidden = 0
+
+    def close_level(directory: str, level: int, last_subdirectory: int) -> None:
+        nonlocal hidden
+        names = files_by_dir.get(directory)
+        if max_depth is not None and level >= max_depth:
+            hidden += len(names) if names else 0
+            if level == max_depth:
+                depths.append(level)
+                entries.append([f"… {hidden:,} file{'s' if hidden > 1 else ''}"])
+                last.append(True)
+                hidden = 0
+            return
+        if names:
+            if len(names) > 1:
+                # Case-insensitive order, with an exact-spelling tie break from the first sort.
+                names.sort()
+                names.sort(key=str.lower)
+            if collapse is not None and len(names) > collapse:
+                more = len(names) - collapse
+                names = names[:collapse] + [f"… {more:,} more file{'s' if more > 1 else ''}"]
+            depths.append(level)
+            entries.append(names)
+            last.append(True)
+        elif last_subdirectory >= 0:
+            last[last_subdirectory] = True
+
+    # Open directories from the root down, with the entry index of their latest subdirectory.
+    stack: List[str] = [""]
+    last_subdirectories: List[int] = [-1]
+    for directory in sorted(directories, key=sort_key):
+        # Ancestors sort first, so the parent is open: close everything below it.
+        parent, _, name = directory.rpartition(os.sep)
+        while stack[-1] != parent:
+            close_level(stack.pop(), len(stack), last_subdirectories.pop())
+        depth = len(stack) - 1
+        if max_depth is None or depth < max_depth:
+            last_subdirectories[-1] = len(entries)
+            depths.append(depth)
+            entries.append(name)
+            last.append(False)
+        stack.append(directory)
+        last_subdirectories.append(-1)
+    while stack:
+        close_level(stack.pop(), len(stack), last_subdirectories.pop())
+
+    # prefixes[depth] is always set by the most recent directory one level up: the parent.
+    prefixes = [""] * (max(depths, default=0) + 2)
+    block: List[str] = []
+    for depth, entry, is_last in zip(depths, entries, last):
+        prefix = prefixes[depth]
+        if isinstance(entry, str):
+            if is_last:
+                block.append(prefix + "└── " + entry)
+                prefixes[depth + 1] = prefix + "    "
+            else:
+                block.append(prefix + "├── " + entry)
+                prefixes[depth + 1] = prefix + "│   "
+        else:
+            block.extend([prefix + "├── " + name for name in entry[:-1]])
+            block.append(prefix + "└── " + entry[-1])
+        if len(block) >= TREE_BLOCK_LINES:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def iter_tree_lines(paths: Iterable[str], max_depth: Optional[int] = None,
+                    collapse: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield the lines of the file system diagram for a list of relative file paths, in the
+    same form as render_tree(build_tree_from_paths(paths)), without building a nested tree.
+    Duplicate paths (such as the chunks of one file) are listed once.
+
+    Files are grouped by directory in one pass and only the (much shorter) list of
+    directories is sorted, so that each directory's subtree is contiguous; a directory's
+    files are listed when the walk leaves it, which is also when its last subdirectory is
+    known. Lines are built from per-depth prefixes, without recursion.
+    With max_depth, only that many levels are shown and the contents of deeper directories
+    are summarised as "… N files". With collapse, at most that many files are listed per
+    directory (subdirectories are always listed) and the rest summarised as "… N more files".
+    """
+    for block in _iter_tree_blocks(paths, max_depth, collapse):
+        yield from block
+
+def format_file_header(relative_path: str, file_data: Union[FileSection, dict]) -> str:
+    """
+    Build the separator block written before each file section.
+    Chunks after the first one also show their position within the file.
+    """
+    section = as_section(file_data)
+    if section.chunk_index > 1:
+        title = f"{relative_path} (Chunk {section.chunk_index} of {section.total_chunks})"
+    else:
+        title = relative_path
+    return (
+        "--------------------------------------------------\n"
+        f"File: {title}\n"
+        f"Approx. tokens: {section.tokens}\n"
+        "--------------------------------------------------\n"
+    )
+
+def iter_summary_header(display_base_dir: str, section_count: int, total_tokens: int,
+                        relative_paths: Iterable[str], diagram_lines: Optional[Iterable[str]] = None,
+                        tree_depth: Optional[int] = None, tree_collapse: Optional[int] = None,
+                        notes: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Yield the summary header and file system diagram written at the top of the main output
+    file, piece by piece, so that the diagram of a huge repository is never held as one string.
+    diagram_lines may be passed in when the diagram has already been rendered; otherwise it
+    is rendered from relative_paths by iter_tree_lines with the given depth and collapse limits.
+    notes are extra summary lines, written after the totals.
+    """
+    yield (
+        "LLM Fuse Aggregation Output\n"
+        "===============================\n"
+        f"Base directory: {display_base_dir}\n"
+        f"Total files (or chunks) processed: {section_count}\n"
+        f"Total approximate tokens: {total_tokens}\n"
+    )
+    for note in notes or []:
+        yield note + "\n"
+    yield (
+        "\n"
+        "File System Diagram:\n"
+        "---------------------\n"
+    )
+    if diagram_lines is None:
+        for block in _iter_tree_blocks(relative_paths, tree_depth, tree_collapse):
+            yield "\n".join(block) + "\n"
+    else:
+        for line in diagram_lines:
+            yield line + "\n"
+    yield "\n"
+
+def format_summary_header(display_base_dir: str, section_count: int, total_tokens: int,
+                          relative_paths: Iterable[str], diagram_lines: Optional[Iterable[str]] = None,
+                          tree_depth: Optional[int] = None, tree_collapse: Optional[int] = None,
+                          notes: Optional[List[str]] = None) -> str:
+    """
+    Build the summary header and file system diagram written at the top of the main output file.
+    """
+    return "".join(iter_summary_header(display_base_dir, section_count, total_tokens, relative_paths,
+                                       diagram_lines, tree_depth, tree_collapse, notes))
+
+class _FirstFitPacker:
+    """
+    Order-preserving first-fit bin packing: each section goes into the first output file
+    (bin) with enough remaining token capacity, opening a new bin when none has room.
+    Bins with less than min_free tokens left are dropped from the search.
+    """
+
+    def __init__(self, capacity: int, reserve_tokens: int = 0, min_free: int = 16):
+        self.capacity = capacity
+        self.min_free = min_free
+        self.free = [capacity - reserve_tokens]
+        self.open_bins = [0]
+
+    def place(self, tokens: int) -> int:
+        """
+        Return the 1-based bin number for a section of the given size.
+        """
+        for position, bin_index in enumerate(self.open_bins):
+            if self.free[bin_index] >= tokens:
+                break
+        else:
+            self.free.append(self.capacity)
+            bin_index = len(self.free) - 1
+            position = len(self.open_bins)
+            self.open_bins.append(bin_index)
+            if tokens > self.capacity:
+                print(f"Warning: A section of {tokens} tokens exceeds the --pack-tokens capacity of {self.capacity}.")
+        self.free[bin_index] -= tokens
+        if self.free[bin_index] < self.min_free:
+            del self.open_bins[position]
+        return bin_index + 1
+
+# Separator blocks cost roughly this many tokens; chunks are sized to leave room for them.
+PACK_SECTION_OVERHEAD = 64
+PACK_MIN_TOKENS = 2 * PACK_SECTION_OVERHEAD
+
+def estimate_summary_tokens(file_paths: List[str], base_dir: str, display_base_dir: str,
+                            tree_depth: Optional[int] = None, tree_collapse: Optional[int] = None,
+                            notes: Optional[List[str]] = None) -> int:
+    """
+    Estimate (from above) the tokens taken by the summary header and file system diagram
+    for a set of candidate files, so that packing can reserve room for them in the main file.
+    notes should be at least as long as the notes that will be written.
+    """
+    relative_paths = [os.path.relpath(path, base_dir) for path in file_paths]
+    header_chars = sum(len(piece) for piece in iter_summary_header(display_base_dir, len(file_paths), 10 ** 12,
+                                                                   relative_paths, None, tree_depth, tree_collapse,
+                                                                   notes))
+    return math.ceil(header_chars / 4)
+
+def _spool_file(output_path: str, **kwargs):
+    """
+    Open a temporary file next to output_path to spool its body in. Errors name output_path,
+    as opening it directly would, since the temporary file's name means nothing to the user.
+    """
+    try:
+        return tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(output_path)), **kwargs)
+    except OSError as e:
+        raise OSError(e.errno, e.strerror, output_path) from None
+
+def write_output_files(files_data: Iterable[Union[FileSection, dict]], total_tokens: Optional[int], output_path: str,
+                       base_dir: str, display_base_dir: Optional[str] = None,
+                       pack_tokens: Optional[int] = None, reserve_tokens: int = 0,
+                       stats: Optional[RunStats] = None, tree_depth: Optional[int] = None,
+                       tree_collapse: Optional[int] = None, dedup: Optional[Deduplicator] = None,
+                       output_format: str = "text", compression: Optional[str] = None,
+                       index: bool = False) -> Tuple[int, int]:
     """
     Write the aggregated content to one or more output files.
     
@@ -201,77 +1100,529 @@ def write_output_files(files_data: List[dict], total_tokens: int, output_path: s
       
     - For file sections with chunk_index > 1, they are grouped by chunk index and
       written to separate output files (named by appending _<chunk_index> to the base name).
+
+    With pack_tokens, output files are instead treated as bins of that token capacity and
+    each section (content plus its separator block) is placed into the first file with room,
+    preserving input order within each file. reserve_tokens are kept free in the main file
+    for the summary header. A <base>.manifest.json file lists which section went where.
+
+    files_data may be any iterable of FileSection records or section dictionaries, including
+    the generator returned by iter_file_sections. Each file's relative path is computed once.
+    Sections are written as they arrive: the main file's sections are spooled to a temporary
+    file next to the output and copied in after the header, since the header's totals and
+    diagram are only known once every section has been seen.
+    If total_tokens is None it is computed from the sections.
+    The size of every file written is added to stats.bytes_written, if stats is given.
+    tree_depth and tree_collapse limit the file system diagram (see iter_tree_lines).
+    With dedup, sections are passed through the Deduplicator first, so duplicate files are
+    written as references, and its summary is added to the header.
+
+    output_format "jsonl" writes one JSON record per section and a summary record to
+    output_path instead. compression ("gzip" or "zstd") compresses every section as its
+    own frame and adds the matching suffix to the file names, and index writes the sidecar
+    <base>.index.json with the position of every section (see llm_fuse.formats).
+
+    Returns the number of sections written and the total token count.
     """
-    # Group the file sections by chunk index; treat missing 'chunk_index' as 1.
-    groups = {}
-    for file_data in files_data:
-        chunk = file_data.get("chunk_index", 1)
-        groups.setdefault(chunk, []).append(file_data)
-    
-    # Process each group in ascending order.
-    for chunk_index in sorted(groups.keys()):
-        group = groups[chunk_index]
-        # Determine output file name.
-        if chunk_index == 1:
-            out_file = output_path
-        else:
-            base, ext = os.path.splitext(output_path)
-            out_file = f"{base}_{chunk_index}{ext}"
-        
-        try:
-            with open(out_file, 'w', encoding='utf-8') as f:
-                # Only group 1 gets the summary header and file system diagram.
-                if chunk_index == 1:
-                    header = (
-                        "LLM Fuse Aggregation Output\n"
-                        "===============================\n"
-                        f"Base directory: {display_base_dir if display_base_dir is not None else base_dir}\n"
-                        f"Total files (or chunks) processed: {len(files_data)}\n"
-                        f"Total approximate tokens: {total_tokens}\n\n"
-                    )
-                    f.write(header)
-                    relative_paths = [os.path.relpath(fd['path'], base_dir) for fd in files_data]
-                    tree = build_tree_from_paths(relative_paths)
-                    diagram_lines = render_tree(tree)
-                    f.write("File System Diagram:\n")
-                    f.write("---------------------\n")
-                    for line in diagram_lines:
-                        f.write(line + "\n")
-                    f.write("\n")
-                # Write each file section in the group.
-                for file_data in group:
-                    rel_path = os.path.relpath(file_data['path'], base_dir)
+    base, ext = os.path.splitext(output_path)
+    packer = _FirstFitPacker(pack_tokens, reserve_tokens) if pack_tokens is not None else None
+    manifest = {}
+    chunk_files = {}
+    relative_paths = []
+    section_count = 0
+    streamed_tokens = 0
+    out_file = output_path
+    # When packing, the main file always exists, even if the summary fills it on its own.
+    has_main_group = packer is not None
+    files_data = (as_section(item) for item in files_data)
+    if dedup is not None:
+        files_data = dedup.filter(files_data)
+    if output_format != "text" or compression is not None or index:
+        return _write_framed_output(files_data, total_tokens, output_path, base_dir,
+                                    display_base_dir if display_base_dir is not None else base_dir,
+                                    pack_tokens, reserve_tokens, stats, tree_depth, tree_collapse, dedup,
+                                    output_format, compression, index)
+    try:
+        with _spool_file(output_path, mode='w+', encoding='utf-8') as main_body:
+            try:
+                last_file = None
+                for item in files_data:
+                    section = as_section(item)
+                    rel_path = section.file.relpath(base_dir)
+                    if section.file is not last_file:
+                        relative_paths.append(rel_path)
+                        last_file = section.file
+                    section_count += 1
+                    streamed_tokens += section.tokens
                     relative_path = "./" + rel_path.replace("\\", "/")
-                    if "chunk_index" in file_data:
-                        # If it was chunked, display chunk info.
-                        if file_data['chunk_index'] > 1:
-                            file_header = (
-                                "--------------------------------------------------\n"
-                                f"File: {relative_path} (Chunk {file_data['chunk_index']} of {file_data['total_chunks']})\n"
-                                f"Approx. tokens: {file_data['tokens']}\n"
-                                "--------------------------------------------------\n"
-                            )
-                        else:
-                            file_header = (
-                                "--------------------------------------------------\n"
-                                f"File: {relative_path}\n"
-                                f"Approx. tokens: {file_data['tokens']}\n"
-                                "--------------------------------------------------\n"
-                            )
+                    file_header = format_file_header(relative_path, section)
+                    chunk_index = _place_section(section, relative_path, file_header, packer, manifest)
+                    if chunk_index == 1:
+                        out_file = output_path
+                        f = main_body
+                        has_main_group = True
                     else:
-                        file_header = (
-                            "--------------------------------------------------\n"
-                            f"File: {relative_path}\n"
-                            f"Approx. tokens: {file_data['tokens']}\n"
-                            "--------------------------------------------------\n"
-                        )
+                        out_file = f"{base}_{chunk_index}{ext}"
+                        f = chunk_files.get(chunk_index)
+                        if f is None:
+                            f = chunk_files[chunk_index] = open(out_file, 'w', encoding='utf-8')
                     f.write(file_header)
-                    f.write(file_data['content'])
+                    if section.mapped:
+                        with open(section.path, 'rb') as src:
+                            _copy_range(src.fileno(), f, section.offset, section.length)
+                    else:
+                        f.write(section.content)
                     f.write("\n\n")
-            print(f"Output written to: {out_file}")
-        except Exception as e:
-            print(f"Error writing output file '{out_file}': {e}")
-            sys.exit(1)
+            finally:
+                for f in chunk_files.values():
+                    f.close()
+            if total_tokens is None:
+                total_tokens = streamed_tokens
+            elif dedup is not None:
+                total_tokens -= dedup.saved_tokens
+            if has_main_group:
+                out_file = output_path
+                dedup_summary = dedup.summary() if dedup is not None else None
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    # Only group 1 gets the summary header and file system diagram.
+                    f.writelines(iter_summary_header(
+                        display_base_dir if display_base_dir is not None else base_dir,
+                        section_count, total_tokens, relative_paths,
+                        tree_depth=tree_depth, tree_collapse=tree_collapse,
+                        notes=[dedup_summary] if dedup_summary else None
+                    ))
+                    main_body.flush()
+                    _copy_range(main_body.fileno(), f, 0, os.fstat(main_body.fileno()).st_size)
+            if packer is not None:
+                out_file = f"{base}.manifest.json"
+                _write_pack_manifest(out_file, output_path, pack_tokens, manifest)
+    except Exception as e:
+        print(f"Error writing output file '{out_file}': {e}")
+        sys.exit(1)
+    written = []
+    if has_main_group:
+        print(f"Output written to: {output_path}")
+        written.append(output_path)
+    for chunk_index in sorted(chunk_files.keys()):
+        print(f"Output written to: {base}_{chunk_index}{ext}")
+        written.append(f"{base}_{chunk_index}{ext}")
+    if packer is not None:
+        print(f"Packing manifest written to: {base}.manifest.json")
+        written.append(f"{base}.manifest.json")
+    if stats is not None:
+        stats.bytes_written += sum(os.path.getsize(path) for path in written)
+    return section_count, total_tokens
+
+def _place_section(section: FileSection, relative_path: str, file_header: str,
+                   packer: Optional[_FirstFitPacker], manifest: dict) -> int:
+    """
+    Return the output group (1 for the main file) a section is written to: its chunk index
+    or, when packing, the bin chosen by packer, which is then recorded in manifest.
+    """
+    if packer is None:
+        return section.chunk_index
+    section_tokens = section.tokens + approximate_token_count(file_header)
+    chunk_index = packer.place(section_tokens)
+    manifest.setdefault(chunk_index, []).append({
+        "path": relative_path,
+        "chunk_index": section.chunk_index,
+        "total_chunks": section.total_chunks,
+        "tokens": section.tokens,
+        "section_tokens": section_tokens
+    })
+    return chunk_index
+
+def _iter_section_bytes(section: FileSection) -> Iterator[bytes]:
+    """
+    Yield the UTF-8 bytes of a section, read in blocks for memory-mapped sections.
+    """
+    if not section.mapped:
+        yield section.content.encode('utf-8')
+        return
+    with open(section.path, 'rb') as src:
+        src.seek(section.offset)
+        remaining = section.length
+        while remaining > 0:
+            block = src.read(min(remaining, MMAP_WINDOW))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+def _iter_section_text(section: FileSection) -> Iterator[str]:
+    """
+    Yield the text of a section, decoding memory-mapped sections block by block.
+    """
+    if not section.mapped:
+        yield section.content
+        return
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for block in _iter_section_bytes(section):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+def _write_section_frame(writer: FrameWriter, section: FileSection, relative_path: str, file_header: str,
+                         file_name: str, output_format: str) -> dict:
+    """
+    Write one section as a frame (a JSONL record, or its separator block, content and
+    trailing blank line) and return its index entry.
+    """
+    entry = {"path": relative_path, "chunk_index": section.chunk_index, "total_chunks": section.total_chunks,
+             "tokens": section.tokens, "file": file_name}
+    writer.start()
+    if output_format == "jsonl":
+        prefix = section_record_prefix(relative_path, section.chunk_index, section.total_chunks, section.tokens)
+        writer.write(prefix.encode('utf-8'))
+        for piece in iter_json_string(_iter_section_text(section)):
+            writer.write(piece.encode('utf-8'))
+        writer.write(b"}\n")
+    else:
+        header = file_header.encode('utf-8')
+        writer.write(header)
+        content_length = 0
+        for block in _iter_section_bytes(section):
+            writer.write(block)
+            content_length += len(block)
+        writer.write(b"\n\n")
+        entry["content_offset"] = len(header)
+        entry["content_length"] = content_length
+    entry["offset"], entry["length"] = writer.finish()
+    return entry
+
+def _write_framed_output(files_data: Iterable[FileSection], total_tokens: Optional[int], output_path: str,
+                         base_dir: str, display_base_dir: str, pack_tokens: Optional[int], reserve_tokens: int,
+                         stats: Optional[RunStats], tree_depth: Optional[int], tree_collapse: Optional[int],
+                         dedup: Optional[Deduplicator], output_format: str, compression: Optional[str],
+                         index: bool) -> Tuple[int, int]:
+    """
+    write_output_files for JSONL, compressed or indexed output. Every section, and the
+    summary, is written as one frame through FrameWriter (see llm_fuse.formats) and its
+    position is recorded for the index. Text output is split into the same files as plain
+    text output, each with the compression suffix; JSONL output is one file, with the
+    summary record last.
+    """
+    main_path = compressed_path(output_path, compression)
+    suffix = main_path[len(output_path):]
+    base, ext = os.path.splitext(output_path)
+    packer = _FirstFitPacker(pack_tokens, reserve_tokens) if pack_tokens is not None else None
+    manifest = {}
+    chunk_files = {}
+    chunk_writers = {}
+    relative_paths = []
+    main_entries = []
+    chunk_entries = []
+    section_count = 0
+    streamed_tokens = 0
+    jsonl = output_format == "jsonl"
+    has_main_group = packer is not None or jsonl
+    out_file = main_path
+    try:
+        # Text sections of the main file are spooled until the header, which comes first, is known.
+        main_body = open(main_path, 'wb') if jsonl else _spool_file(output_path)
+        try:
+            main_writer = FrameWriter(main_body, compression)
+            last_file = None
+            for section in files_data:
+                rel_path = section.file.relpath(base_dir)
+                if section.file is not last_file:
+                    relative_paths.append(rel_path)
+                    last_file = section.file
+                section_count += 1
+                streamed_tokens += section.tokens
+                relative_path = "./" + rel_path.replace("\\", "/")
+                file_header = format_file_header(relative_path, section)
+                chunk_index = 1 if jsonl else _place_section(section, relative_path, file_header, packer, manifest)
+                if chunk_index == 1:
+                    out_file = main_path
+                    writer = main_writer
+                    entries = main_entries
+                    has_main_group = True
+                else:
+                    out_file = f"{base}_{chunk_index}{ext}{suffix}"
+                    writer = chunk_writers.get(chunk_index)
+                    if writer is None:
+                        chunk_files[chunk_index] = open(out_file, 'wb')
+                        writer = chunk_writers[chunk_index] = FrameWriter(chunk_files[chunk_index], compression)
+                    entries = chunk_entries
+                entries.append(_write_section_frame(writer, section, relative_path, file_header,
+                                                    os.path.basename(out_file), output_format))
+            if total_tokens is None:
+                total_tokens = streamed_tokens
+            elif dedup is not None:
+                total_tokens -= dedup.saved_tokens
+            dedup_summary = dedup.summary() if dedup is not None else None
+            notes = [dedup_summary] if dedup_summary else None
+            summary = None
+            out_file = main_path
+            if jsonl:
+                main_writer.start()
+                main_writer.write(summary_record(display_base_dir, section_count, total_tokens,
+                                                 ["./" + path.replace("\\", "/") for path in relative_paths],
+                                                 notes).encode('utf-8'))
+                offset, length = main_writer.finish()
+                summary = {"file": os.path.basename(main_path), "offset": offset, "length": length}
+            elif has_main_group:
+                with open(main_path, 'wb') as f:
+                    header_writer = FrameWriter(f, compression)
+                    header_writer.start()
+                    for piece in iter_summary_header(display_base_dir, section_count, total_tokens, relative_paths,
+                                                     tree_depth=tree_depth, tree_collapse=tree_collapse, notes=notes):
+                        header_writer.write(piece.encode('utf-8'))
+                    offset, length = header_writer.finish()
+                    main_body.seek(0)
+                    shutil.copyfileobj(main_body, f, MMAP_WINDOW)
+                summary = {"file": os.path.basename(main_path), "offset": offset, "length": length}
+                for entry in main_entries:
+                    entry["offset"] += length
+        finally:
+            main_body.close()
+            for f in chunk_files.values():
+                f.close()
+        if packer is not None:
+            out_file = f"{base}.manifest.json"
+            _write_pack_manifest(out_file, output_path, pack_tokens, manifest, suffix)
+        written = ([main_path] if has_main_group else []) + \
+                  [f"{base}_{chunk_index}{ext}{suffix}" for chunk_index in sorted(chunk_files.keys())]
+        if index:
+            out_file = index_path_for(output_path)
+            save_index(out_file, {
+                "version": INDEX_VERSION,
+                "format": output_format,
+                "compression": compression,
+                "base_directory": display_base_dir,
+                "files": {os.path.basename(path): {"size": os.path.getsize(path), "dead_bytes": 0} for path in written},
+                "summary": summary,
+                "sections": main_entries + chunk_entries
+            })
+    except Exception as e:
+        print(f"Error writing output file '{out_file}': {e}")
+        sys.exit(1)
+    for path in written:
+        print(f"Output written to: {path}")
+    if packer is not None:
+        print(f"Packing manifest written to: {base}.manifest.json")
+        written.append(f"{base}.manifest.json")
+    if index:
+        print(f"Output index written to: {index_path_for(output_path)}")
+        written.append(index_path_for(output_path))
+    if stats is not None:
+        stats.bytes_written += sum(os.path.getsize(path) for path in written)
+    return section_count, total_tokens
+
+def write_calibration(files_data: Iterable[Union[FileSection, dict]], output_path: str,
+                      reference: Tokenizer) -> Tuple[int, int]:
+    """
+    Fit the byteclass tokenizer's weights to the reference tokenizer on the sections of
+    files_data (see calibrate_byte_class) and save them as JSON to output_path, for use as
+    --tokenizer byteclass:PATH. Memory-mapped sections carry no decoded text and are left out.
+    Returns the number of sections sampled and their total token count.
+    """
+    totals = [0, 0]
+
+    def samples() -> Iterator[Tuple[str, str]]:
+        for item in files_data:
+            section = as_section(item)
+            if section.mapped:
+                continue
+            totals[0] += 1
+            totals[1] += section.tokens
+            yield section.path, section.content
+
+    calibration = calibrate_byte_class(samples(), reference)
+    try:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(calibration, f, indent=2)
+            f.write("\n")
+    except OSError as e:
+        print(f"Error writing calibration file '{output_path}': {e}")
+        sys.exit(1)
+    print(f"Calibration written to: {output_path}")
+    return totals[0], totals[1]
+
+def update_output_files(files_data: Iterable[Union[FileSection, dict]], output_path: str, base_dir: str,
+                        stats: Optional[RunStats] = None, drop_missing: bool = False) -> Tuple[int, int]:
+    """
+    Update indexed JSONL output (written with output_format="jsonl" and index=True) in
+    place. The sections of each file in files_data are appended and replace that file's
+    earlier sections in the index; other files are left as they are. With drop_missing,
+    the sections of files that no longer exist under base_dir are dropped as well. A new
+    summary record is appended, and the output is compacted once its dead bytes outweigh
+    the live ones.
+
+    Raises RuntimeError if the output has no index or is not JSONL.
+    Returns the number of sections written and the total token count of the updated output.
+    """
+    index_path = index_path_for(output_path)
+    index = load_index(index_path)
+    if index["format"] != "jsonl":
+        raise RuntimeError(f"Error: Only JSONL output can be updated in place, but '{output_path}' is "
+                           f"{index['format']} output.")
+    try:
+        check_compression(index["compression"])
+    except ValueError as e:
+        raise RuntimeError(f"Error: Cannot update '{output_path}': {e}")
+    summary = index["summary"]
+    file_name = summary["file"]
+    main_path = os.path.join(os.path.dirname(os.path.abspath(index_path)), file_name)
+    info = index["files"][file_name]
+    new_entries = {}
+    section_count = 0
+    with open(main_path, 'r+b') as f:
+        # Drop anything an interrupted update wrote after the indexed data.
+        f.truncate(info["size"])
+        f.seek(0, os.SEEK_END)
+        writer = FrameWriter(f, index["compression"])
+        for item in files_data:
+            section = as_section(item)
+            relative_path = "./" + section.file.relpath(base_dir).replace("\\", "/")
+            new_entries.setdefault(relative_path, []).append(
+                _write_section_frame(writer, section, relative_path, "", file_name, "jsonl"))
+            section_count += 1
+        # Replaced files keep their place in the output order; new files go last.
+        dead_bytes = info["dead_bytes"] + summary["length"]
+        entries = []
+        exists = {}
+        for entry in index["sections"]:
+            replacement = new_entries.get(entry["path"])
+            if replacement is None:
+                if drop_missing:
+                    path = entry["path"]
+                    if path not in exists:
+                        exists[path] = os.path.exists(os.path.join(base_dir, path))
+                    if not exists[path]:
+                        dead_bytes += entry["length"]
+                        continue
+                entries.append(entry)
+                continue
+            dead_bytes += entry["length"]
+            entries.extend(replacement)
+            new_entries[entry["path"]] = []
+        for replacement in new_entries.values():
+            entries.extend(replacement)
+        total_tokens = sum(entry["tokens"] for entry in entries)
+        relative_paths = list(dict.fromkeys(entry["path"] for entry in entries))
+        writer.start()
+        writer.write(summary_record(index["base_directory"], len(entries), total_tokens,
+                                    relative_paths).encode('utf-8'))
+        offset, length = writer.finish()
+        summary = {"file": file_name, "offset": offset, "length": length}
+        appended = f.tell() - info["size"]
+        size = f.tell()
+    if dead_bytes > size - dead_bytes:
+        frames = entries + [summary]
+        temp_path = main_path + ".tmp"
+        with open(main_path, 'rb') as src, open(temp_path, 'wb') as dst:
+            offsets = list(copy_frames(src, dst, [(frame["offset"], frame["length"]) for frame in frames]))
+            size = dst.tell()
+        for frame, offset in zip(frames, offsets):
+            frame["offset"] = offset
+        os.replace(temp_path, main_path)
+        dead_bytes = 0
+        appended = size
+    index["files"][file_name] = {"size": size, "dead_bytes": dead_bytes}
+    index["summary"] = summary
+    index["sections"] = entries
+    save_index(index_path, index)
+    print(f"Output updated: {main_path}")
+    if stats is not None:
+        stats.bytes_written += appended + os.path.getsize(index_path)
+    return section_count, total_tokens
+
+def select_within_budget(sections: Iterable[FileSection], base_dir: str, display_base_dir: str, budget: int,
+                         query: Optional[str] = None, commit_times: Optional[Dict[str, int]] = None,
+                         dedup: Optional[Deduplicator] = None) -> List[str]:
+    """
+    Rank the files behind sections by relevance (see llm_fuse.relevance) and return the
+    paths of the files to write so that the output stays within about budget tokens.
+    A file costs the tokens of its sections and their separator blocks and its lines in
+    the diagram; room is kept for the summary header. With a query, section contents are
+    searched for its terms. commit_times (from get_last_commit_times) rank recently
+    changed files higher. With dedup (a Deduplicator used for this selection only), the
+    content shared by duplicate files is charged once: a copy of a file already selected
+    costs only its reference section. The paths are returned in their original order.
+    """
+    selector = BudgetSelector(query)
+
+    def section_cost(section: FileSection) -> int:
+        file_header = format_file_header("./" + section.file.relpath(base_dir).replace("\\", "/"), section)
+        return section.tokens + approximate_token_count(file_header + "\n\n")
+
+    def add(file_sections: List[FileSection]) -> None:
+        for section in file_sections:
+            text = section.content if selector.index is not None and not section.mapped else None
+            selector.add(section.path, section.file.relpath(base_dir), section_cost(section), text)
+        if dedup is not None:
+            path = file_sections[0].path
+            resolved = list(dedup.filter(file_sections))
+            original = dedup.originals.get(path)
+            if original is not None:
+                reference, = resolved
+                selector.link(path, original, section_cost(reference))
+
+    # The sections of a file are consecutive.
+    pending: List[FileSection] = []
+    for section in sections:
+        if pending and section.file is not pending[0].file:
+            add(pending)
+            pending = []
+        pending.append(section)
+    if pending:
+        add(pending)
+    notes = None
+    if dedup is not None:
+        # Leave room for the duplicates line, at its longest.
+        count = 10 ** 6
+        notes = [format_dedup_summary(count, 10 ** 12, count if dedup.near_threshold is not None else None)]
+    reserve_tokens = approximate_token_count(format_summary_header(display_base_dir, 10 ** 12, 10 ** 12, [],
+                                                                   diagram_lines=[], notes=notes))
+    return selector.select(budget, commit_times, reserve_tokens)
+
+def _copy_range(src_fd: int, out, offset: int, count: int) -> None:
+    """
+    Append count bytes of src_fd, starting at offset, to the open text file out.
+    The bytes are copied in the kernel (copy_file_range, then sendfile) where possible, and
+    through a memory map otherwise; they never pass through Python strings.
+    """
+    out.flush()
+    out_fd = out.fileno()
+    end = offset + count
+    try:
+        while offset < end:
+            if hasattr(os, "copy_file_range"):
+                copied = os.copy_file_range(src_fd, out_fd, end - offset, offset)
+            else:
+                copied = os.sendfile(out_fd, src_fd, offset, end - offset)
+            if copied == 0:
+                break
+            offset += copied
+    except (OSError, AttributeError):
+        pass
+    # Bring the file object back in line with the descriptor's position.
+    out.seek(0, os.SEEK_END)
+    if offset < end:
+        with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as mm:
+            for pos in range(offset, end, MMAP_WINDOW):
+                out.buffer.write(mm[pos:min(pos + MMAP_WINDOW, end)])
+        out.seek(0, os.SEEK_END)
+
+def _write_pack_manifest(manifest_path: str, output_path: str, pack_tokens: int, manifest: dict,
+                         suffix: str = "") -> None:
+    """
+    Write the JSON manifest listing, for every packed output file, the sections it holds.
+    suffix is the compression suffix of the output file names, if any.
+    """
+    base, ext = os.path.splitext(output_path)
+    files = []
+    for bin_index in sorted(manifest.keys()):
+        sections = manifest[bin_index]
+        files.append({
+            "file": os.path.basename(output_path if bin_index == 1 else f"{base}_{bin_index}{ext}") + suffix,
+            "section_tokens": sum(section["section_tokens"] for section in sections),
+            "sections": sections
+        })
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"pack_tokens": pack_tokens, "files": files}, f, indent=2)
+        f.write("\n")
 
 def clone_repo(repo_url: str, branch: Optional[str] = None) -> str:
     """
@@ -303,7 +1654,12 @@ def extract_repo_name(repo_url: str) -> str:
         name = name[:-4]
     return name
 
-def main():
+def main(argv: Optional[List[str]] = None, checkout: Optional[str] = None):
+    """
+    Run llm-fuse with the given command-line arguments (sys.argv by default).
+    checkout is an existing clone of the --repo repository to process instead of cloning
+    it again (see llm_fuse.batch); it is removed afterwards like a clone would be.
+    """
     parser = argparse.ArgumentParser(
         description="Aggregate file contents into one or more files for LLM context."
     )
@@ -338,6 +1694,38 @@ def main():
         action="store_true",
         help="If set, only include Git-tracked files (if available)."
     )
+    parser.add_argument(
+        "--git-ref",
+        type=str,
+        default=None,
+        metavar="REF",
+        help="Read files straight from the Git object database at this commit, branch or tag "
+             "(e.g. HEAD) instead of the working tree. Implies --git; no checkout is needed. "
+             "Files of at least --large-file-threshold MiB are skipped."
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        metavar="REF",
+        help="Only include files changed since this commit, branch or tag, including uncommitted "
+             "and untracked files. Uses git instead of scanning the directory."
+    )
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="Only include files with uncommitted changes and untracked files (same as --since HEAD)."
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="With --since or --changed-only, include each file's unified diff instead of its full content."
+    )
+    parser.add_argument(
+        "--no-ignore-files",
+        action="store_true",
+        help="Do not honour .gitignore/.llmfuseignore files (or skip .git) when scanning a directory."
+    )
     parser.add_argument(
         "--repo",
         type=str,
@@ -349,25 +1737,329 @@ def main():
         default=None,
         help="Specify branch to clone from the repository (if not provided, the default branch is used)."
     )
+    parser.add_argument(
+        "--mirror",
+        action="store_true",
+        help="Keep a persistent blobless mirror of the --repo repository and refresh it with an "
+             "incremental fetch instead of cloning again. Only the files selected by simple --include/"
+             "--exclude patterns (such as '\\.py$' or 'node_modules') are checked out and downloaded."
+    )
+    parser.add_argument(
+        "--mirror-dir",
+        type=str,
+        default=None,
+        help="Directory holding the repository mirrors (implies --mirror). Defaults to "
+             "~/.cache/llm-fuse/mirrors."
+    )
     parser.add_argument(
         "--max-tokens",
         type=int,
         default=None,
         help="Maximum token threshold per chunk. Files exceeding this threshold will be split into manageable chunks."
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker threads used to detect, read and chunk files in parallel. "
+             "Use 0 for one worker per CPU. Output order is unaffected. Defaults to 1."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory for the incremental file cache. Defaults to a directory per scanned directory "
+             f"under ~/.cache/llm-fuse, outside the scanned tree; use '{CACHE_DIR_NAME}' to keep it inside "
+             "(it is then never aggregated). The cache is disabled for --repo runs unless this is given."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the incremental file cache."
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Ignore any existing cache entries and rebuild the cache from scratch."
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default="heuristic",
+        help="Token counting backend used for token counts and chunk boundaries: 'heuristic' "
+             "(1 token per 4 characters, the default), 'bpe:PATH' (offline BPE from a directory with "
+             "vocab.json/merges.txt) or 'byteclass[:CALIBRATION.json]' (fast per-extension estimator)."
+    )
+    parser.add_argument(
+        "--calibrate",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Instead of writing the output, fit the 'byteclass' estimator's per-extension weights to "
+             "the --tokenizer backend (e.g. 'bpe:PATH') on the selected files and save them as JSON to "
+             "PATH, for later runs with --tokenizer byteclass:PATH."
+    )
+    parser.add_argument(
+        "--chunk-strategy",
+        choices=CHUNK_STRATEGIES,
+        default="syntax",
+        help="Where chunks may be split: 'syntax' prefers top-level definitions and blank lines "
+             "(the default), 'lines' splits at line boundaries, 'fixed' slices at a fixed character offset."
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=0,
+        help="Number of lines repeated at the start of the next chunk for context. Defaults to 0."
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="Minify file contents before counting and chunking them: drop comments and docstrings, "
+             "collapse indentation, elide long literals, base64 and data tables, and reduce lockfiles "
+             "and minified bundles to a short preview. Diffs and memory-mapped files are left as is."
+    )
+    parser.add_argument(
+        "--pack-tokens",
+        type=int,
+        default=None,
+        help="Pack file sections into output files of at most this many tokens each (first fit, "
+             "in input order) and write a <output>.manifest.json listing where each section went. "
+             "Implies --max-tokens no larger than the capacity."
+    )
+    parser.add_argument(
+        "--tree-depth",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Show only N levels of the file system diagram; deeper contents are summarised as a file count."
+    )
+    parser.add_argument(
+        "--tree-collapse",
+        type=int,
+        default=None,
+        metavar="N",
+        help="List at most N files per directory in the file system diagram and summarise the rest "
+             "as \"… M more files\"."
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="text",
+        help="Output format: 'text' (the default) or 'jsonl', one JSON record per file section "
+             "followed by a summary record, written to a single file."
+    )
+    parser.add_argument(
+        "--compress",
+        choices=COMPRESSIONS,
+        default=None,
+        help="Compress the output files, each section as a separate gzip member or zstd frame so that "
+             "an index can locate it. Adds .gz or .zst to the file names. zstd needs the 'zstandard' package."
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Also write <output>.index.json with the output file, byte offset and length of every "
+             "section, for tools that read single sections without scanning the output."
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Update existing JSONL output written with --index in place: the sections of the files "
+             "found are appended and replace their earlier sections; other files are kept. "
+             "The format and compression are taken from the index. Useful with --changed-only."
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Write every file in full, even when its content is identical to a file already written. "
+             "By default such copies are replaced by a one-line reference to the first file."
+    )
+    parser.add_argument(
+        "--near-duplicates",
+        action="store_true",
+        help="Also collapse files that are nearly identical to a file already written (estimated "
+             "with MinHash), such as vendored copies with small edits. Their differences are not kept."
+    )
+    parser.add_argument(
+        "--near-duplicate-threshold",
+        type=float,
+        default=DEFAULT_NEAR_THRESHOLD,
+        metavar="SIMILARITY",
+        help="Estimated similarity (between 0 and 1) from which --near-duplicates collapses a file. "
+             f"Defaults to {DEFAULT_NEAR_THRESHOLD}."
+    )
+    parser.add_argument(
+        "--large-file-threshold",
+        type=int,
+        default=DEFAULT_MMAP_THRESHOLD // (1024 * 1024),
+        help="Size in MiB from which UTF-8 text files are memory-mapped, chunked at line boundaries "
+             "and copied to the output without being decoded into memory. Use 0 to disable. Defaults to "
+             f"{DEFAULT_MMAP_THRESHOLD // (1024 * 1024)}."
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-stage timings, bytes read and written, skipped files, peak memory and "
+             "the slowest files at the end of the run."
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Write the run statistics printed by --stats to a JSON file."
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Profile the whole run with cProfile and write the pstats data to this file "
+             "(worker threads started by --jobs are not profiled)."
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=None,
+        metavar="TOKENS",
+        help="Keep the whole output within about this many tokens by writing only the most relevant "
+             "files, ranked by path, README/entry point/config names, Git recency and --query matches."
+    )
+    parser.add_argument(
+        "--query",
+        type=str,
+        default=None,
+        help="Whitespace-separated keywords (or regexes matched against whole words) that make files "
+             "mentioning them rank higher for --budget."
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running after the first write, polling the scanned files for changes and "
+             "rewriting only the output files whose sections changed. Stop with Ctrl+C."
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between change checks in --watch mode. Defaults to 1.0."
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.3,
+        help="Seconds without further changes to wait for before updating in --watch mode. Defaults to 0.3."
+    )
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(_run, parser, args, checkout)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to: {args.profile}")
+    else:
+        _run(parser, args, checkout)
+
+def _run(parser: argparse.ArgumentParser, args: argparse.Namespace, checkout: Optional[str] = None) -> None:
+    """
+    Validate the parsed arguments and run the whole pipeline.
+    """
+    if args.pack_tokens is not None:
+        if args.pack_tokens < PACK_MIN_TOKENS:
+            parser.error(f"--pack-tokens must be at least {PACK_MIN_TOKENS}")
+        # Leave room for each section's separator block so every chunk fits in an empty file.
+        section_budget = args.pack_tokens - PACK_SECTION_OVERHEAD
+        if args.max_tokens is None or args.max_tokens > section_budget:
+            args.max_tokens = section_budget
+    if args.chunk_overlap < 0:
+        parser.error("--chunk-overlap must be 0 or a positive integer")
+    chunker = Chunker(args.chunk_strategy, args.chunk_overlap)
+    try:
+        tokenizer = get_tokenizer(args.tokenizer)
+    except (OSError, ValueError) as e:
+        parser.error(f"--tokenizer: {e}")
+    if args.calibrate is not None:
+        if tokenizer.name.startswith("byteclass"):
+            parser.error("--calibrate needs a reference --tokenizer other than byteclass, such as bpe:PATH")
+        unsupported = [flag for flag, value in (("--diff", args.diff), ("--watch", args.watch),
+                                                ("--update", args.update)) if value]
+        if unsupported:
+            parser.error(f"--calibrate cannot be combined with {', '.join(unsupported)}")
+    minifier = Minifier() if args.minify else None
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive integer")
+    jobs = args.jobs or os.cpu_count() or 1
+    if args.budget is not None and args.budget < 1:
+        parser.error("--budget must be a positive integer")
+    if args.query is not None:
+        if args.budget is None:
+            parser.error("--query requires --budget")
+        try:
+            BudgetSelector(args.query)
+        except re.error as e:
+            parser.error(f"--query: invalid regex: {e}")
+    if args.tree_depth is not None and args.tree_depth < 1:
+        parser.error("--tree-depth must be a positive integer")
+    if args.tree_collapse is not None and args.tree_collapse < 1:
+        parser.error("--tree-collapse must be a positive integer")
+    try:
+        check_compression(args.compress)
+    except ValueError as e:
+        parser.error(f"--compress: {e}")
+    if args.format == "jsonl" and args.pack_tokens is not None:
+        parser.error("--pack-tokens cannot be combined with --format jsonl")
+    if args.update and args.pack_tokens is not None:
+        parser.error("--update cannot be combined with --pack-tokens")
+    if not 0 < args.near_duplicate_threshold <= 1:
+        parser.error("--near-duplicate-threshold must be greater than 0 and at most 1")
+    if args.near_duplicates and args.no_dedup:
+        parser.error("--near-duplicates cannot be combined with --no-dedup")
+    if args.large_file_threshold < 0:
+        parser.error("--large-file-threshold must be 0 or a positive number of MiB")
+    mmap_threshold = args.large_file_threshold * 1024 * 1024 or None
+    changed_since = args.since or ("HEAD" if args.changed_only else None)
+    if args.diff and changed_since is None:
+        parser.error("--diff requires --since or --changed-only")
+    if changed_since is not None and args.git_ref:
+        parser.error("--git-ref cannot be combined with --since or --changed-only")
+    if args.watch:
+        unsupported = [flag for flag, value in (("--repo", args.repo), ("--git-ref", args.git_ref),
+                                                ("--since", args.since), ("--changed-only", args.changed_only),
+                                                ("--diff", args.diff), ("--pack-tokens", args.pack_tokens),
+                                                ("--budget", args.budget),
+                                                ("--format jsonl", args.format != "text"),
+                                                ("--compress", args.compress), ("--index", args.index),
+                                                ("--update", args.update),
+                                                ("--near-duplicates", args.near_duplicates))
+                       if value]
+        if unsupported:
+            parser.error(f"--watch cannot be combined with {', '.join(unsupported)}")
+        if args.poll_interval <= 0 or args.debounce < 0:
+            parser.error("--poll-interval must be positive and --debounce must not be negative")
+    stats = RunStats()
 
     temp_repo = False
     display_base_dir = None
+    mirror = None
     if args.repo:
         try:
-            repo_clone_dir = clone_repo(args.repo, args.branch)
+            with stats.stage("clone"):
+                if checkout is not None:
+                    repo_clone_dir = checkout
+                elif args.mirror or args.mirror_dir:
+                    mirror = update_mirror(args.repo, os.path.abspath(args.mirror_dir or default_mirror_root()))
+                    repo_clone_dir = checkout_worktree(mirror, args.branch, args.include, args.exclude)
+                else:
+                    repo_clone_dir = clone_repo(args.repo, args.branch)
         except RuntimeError as e:
             print(e)
             sys.exit(1)
         items = os.listdir(repo_clone_dir)
         subdirs = [os.path.join(repo_clone_dir, item) for item in items if os.path.isdir(os.path.join(repo_clone_dir, item))]
-        if len(subdirs) == 1:
+        # A sparse worktree may hold a single directory only because the rest was not checked out.
+        if len(subdirs) == 1 and mirror is None:
             base_dir = os.path.normpath(os.path.abspath(subdirs[0]))
         else:
             base_dir = os.path.normpath(os.path.abspath(repo_clone_dir))
@@ -384,23 +2076,179 @@ def main():
         display_base_dir = base_dir
         print(f"Scanning local directory: {base_dir}")
 
-    file_paths = collect_files(base_dir, args.include, args.exclude, args.git)
+    stats.root = base_dir
+    git_entries = None
+    with stats.stage("collect"):
+        if args.git_ref:
+            try:
+                git_entries = collect_git_blobs(base_dir, args.git_ref, args.include, args.exclude)
+            except RuntimeError as e:
+                print(e)
+                sys.exit(1)
+            file_paths = [path for path, _, _ in git_entries]
+        else:
+            try:
+                file_paths = collect_files(base_dir, args.include, args.exclude, args.git,
+                                           use_ignore_files=not args.no_ignore_files,
+                                           changed_since=changed_since)
+            except RuntimeError as e:
+                print(e)
+                sys.exit(1)
     if not file_paths:
         print("Error: No files found matching the specified criteria.")
         sys.exit(1)
     print(f"Found {len(file_paths)} files after filtering.")
 
-    files_data, total_tokens = process_files(file_paths, max_tokens=args.max_tokens)
-    print(f"Processed {len(files_data)} file sections. Total approximate tokens: {total_tokens}")
+    cache = None
+    # Blobs are read by content id and diffs are not files, so neither uses the file cache.
+    if not args.no_cache and not args.git_ref and not args.diff and (args.cache_dir or not temp_repo):
+        cache_dir = os.path.abspath(args.cache_dir) if args.cache_dir else default_cache_dir(base_dir)
+        with stats.stage("cache-load"):
+            cache = FileCache(cache_dir, base_dir, rebuild=args.rebuild_cache)
+
+    if args.watch:
+        _watch(args, base_dir, display_base_dir, cache, tokenizer, chunker, minifier, jobs, stats)
+        return
+
+    # Sections are read, chunked and written one at a time as the writer consumes them.
+    # Time spent producing sections is charged to "process" and excluded from "write".
+    skip_counts = stats.skip_counts
+
+    def make_sections(paths: List[str], skip_counts: Optional[Counter],
+                      stats: Optional[RunStats]) -> Iterator[FileSection]:
+        if args.diff:
+            return iter_diff_sections(base_dir, paths, changed_since, max_tokens=args.max_tokens,
+                                      tokenizer=tokenizer, chunker=chunker, skip_counts=skip_counts, stats=stats)
+        if git_entries is not None:
+            wanted = set(paths)
+            return iter_git_sections(base_dir, [entry for entry in git_entries if entry[0] in wanted],
+                                     max_tokens=args.max_tokens, tokenizer=tokenizer, chunker=chunker,
+                                     skip_counts=skip_counts, max_blob_size=mmap_threshold, stats=stats,
+                                     minifier=minifier)
+        return iter_file_sections(paths, max_tokens=args.max_tokens, jobs=jobs, cache=cache,
+                                  tokenizer=tokenizer, chunker=chunker, skip_counts=skip_counts,
+                                  mmap_threshold=mmap_threshold, stats=stats, minifier=minifier)
 
-    write_output_files(files_data, total_tokens, args.output, base_dir, display_base_dir)
+    # Calibration samples every file as it is, duplicates included.
+    use_dedup = not args.no_dedup and not args.update and args.calibrate is None
+    near_threshold = args.near_duplicate_threshold if args.near_duplicates else None
+    if args.budget is not None:
+        # A first pass counts (and, with --query, indexes) every file; only the selected
+        # files are read again for writing, with the cache making that pass cheap.
+        # Duplicates are found during selection too, so their shared content is charged once.
+        with stats.stage("select"):
+            candidate_count = len(file_paths)
+            file_paths = select_within_budget(make_sections(file_paths, skip_counts, None), base_dir,
+                                              display_base_dir, args.budget, args.query,
+                                              get_last_commit_times(base_dir),
+                                              Deduplicator(base_dir, tokenizer, near_threshold) if use_dedup else None)
+        if not file_paths:
+            print(f"Error: No file fits within the budget of {args.budget} tokens.")
+            sys.exit(1)
+        print(f"Selected {len(file_paths)} of {candidate_count} files to fit the budget of {args.budget} tokens.")
+        if cache is not None:
+            # Count the hits of the writing pass only, which reads just the selected files.
+            cache.hits = 0
+        sections = make_sections(file_paths, None, stats)
+    else:
+        sections = make_sections(file_paths, skip_counts, stats)
+    dedup = Deduplicator(base_dir, tokenizer, near_threshold) if use_dedup else None
+    with stats.stage("write"):
+        if args.calibrate is not None:
+            section_count, total_tokens = write_calibration(stats.timed_iter("process", sections),
+                                                            args.calibrate, tokenizer)
+        elif args.update:
+            # Updates are not deduplicated: the first copy of a file may be replaced later on.
+            # Only a scan of the whole tree can tell that an indexed file was deleted.
+            try:
+                section_count, total_tokens = update_output_files(stats.timed_iter("process", sections),
+                                                                  args.output, base_dir, stats=stats,
+                                                                  drop_missing=changed_since is None)
+            except (RuntimeError, OSError) as e:
+                print(e)
+                sys.exit(1)
+        else:
+            reserve_tokens = 0
+            if args.pack_tokens is not None:
+                # Leave room for the duplicates line, at its longest.
+                notes = None
+                if dedup is not None:
+                    count = len(file_paths)
+                    notes = [format_dedup_summary(count, 10 ** 12, count if args.near_duplicates else None)]
+                reserve_tokens = estimate_summary_tokens(file_paths, base_dir, display_base_dir,
+                                                         args.tree_depth, args.tree_collapse, notes)
+            section_count, total_tokens = write_output_files(stats.timed_iter("process", sections), None,
+                                                             args.output, base_dir, display_base_dir,
+                                                             pack_tokens=args.pack_tokens,
+                                                             reserve_tokens=reserve_tokens, stats=stats,
+                                                             tree_depth=args.tree_depth,
+                                                             tree_collapse=args.tree_collapse, dedup=dedup,
+                                                             output_format=args.format, compression=args.compress,
+                                                             index=args.index)
+    print(f"Processed {section_count} file sections. Total approximate tokens: {total_tokens}")
+    if dedup is not None and dedup.summary() is not None:
+        print(dedup.summary() + ".")
+    if skip_counts:
+        details = ", ".join(f"{reason}: {count}" for reason, count in sorted(skip_counts.items()))
+        print(f"Skipped {sum(skip_counts.values())} files ({details}).")
+    if cache is not None:
+        with stats.stage("cache-save"):
+            cache.save()
+        print(f"Reused cached results for {cache.hits} of {len(file_paths)} files.")
 
     if temp_repo:
         try:
-            shutil.rmtree(os.path.dirname(base_dir) if base_dir != os.path.abspath(repo_clone_dir) else repo_clone_dir)
+            with stats.stage("cleanup"):
+                if mirror is not None:
+                    remove_worktree(mirror, repo_clone_dir)
+                else:
+                    shutil.rmtree(os.path.dirname(base_dir) if base_dir != os.path.abspath(repo_clone_dir) else repo_clone_dir)
             print(f"Cleaned up temporary repository directory: {repo_clone_dir}")
         except Exception as e:
             print(f"Error cleaning up temporary directory: {e}")
 
+    if args.stats:
+        print(stats.format())
+    if args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump(stats.to_dict(), f, indent=2)
+            f.write("\n")
+        print(f"Run statistics written to: {args.stats_json}")
+
+def _watch(args: argparse.Namespace, base_dir: str, display_base_dir: str, cache: Optional[FileCache],
+           tokenizer: Tokenizer, chunker: Chunker, minifier: Optional[Minifier], jobs: int,
+           stats: RunStats) -> None:
+    """
+    Run --watch mode: write the output once, then keep it up to date until interrupted.
+    """
+    # Imported here because the watch module builds on this one.
+    from llm_fuse.watch import WatchSession
+
+    def collect():
+        return collect_files(base_dir, args.include, args.exclude, args.git,
+                             use_ignore_files=not args.no_ignore_files)
+
+    def load(paths):
+        # Sections are kept in memory between updates, so large files are not memory-mapped.
+        return iter_file_sections(paths, max_tokens=args.max_tokens, jobs=jobs, cache=cache, tokenizer=tokenizer,
+                                  chunker=chunker, skip_counts=stats.skip_counts, mmap_threshold=None,
+                                  minifier=minifier)
+
+    session = WatchSession(base_dir, display_base_dir, os.path.abspath(args.output), collect, load,
+                           tree_depth=args.tree_depth, tree_collapse=args.tree_collapse,
+                           dedup=not args.no_dedup, tokenizer=tokenizer)
+    written = session.start()
+    print(f"Processed {session.section_count} file sections. Total approximate tokens: {session.total_tokens}")
+    if session.references:
+        print(format_dedup_summary(len(session.references), session.saved_tokens) + ".")
+    print(f"Output written to: {', '.join(written)}")
+    print("Watching for changes (press Ctrl+C to stop)...")
+    try:
+        session.run(args.poll_interval, args.debounce)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    if cache is not None:
+        cache.save()
+
 if __name__ == "__main__":
     main()
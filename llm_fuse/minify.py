@@ -0,0 +1,361 @@
+"""
+Content minification for llm-fuse (--minify).
+
+A Minifier rewrites a file's text before it is counted and chunked, so that token counts,
+chunk layouts and budgets all reflect the text that is actually written. The transform
+depends on the file's language:
+
+- python    comments and docstrings removed, indentation collapsed to one space per level
+            (with "..." left where a removed docstring was a block's only statement)
+- c-like    // and /* */ comments removed, indentation collapsed to one space per bracket
+            level (CSS keeps only /* */ comments, since // is not a CSS comment)
+- hash      full-line # comments removed (shell, Ruby, YAML, TOML, INI, Makefiles, ...)
+- markup    <!-- --> comments removed, indentation stripped (HTML, XML, SVG)
+- json      indentation stripped
+- lockfile  reduced to a head/tail preview, as are minified bundles (*.min.js, or any source
+            file whose lines average more than BUNDLE_MIN_LINE_LENGTH characters)
+
+Blank lines are dropped (or, in prose and other files, collapsed to one). In every language,
+string literals longer than LONG_LITERAL_CHARS characters, runs of base64 and runs of
+numeric data lines are replaced by a short note of what was elided.
+
+Each transform is a single left-to-right pass: a tokenizing regex (written so that it
+never backtracks more than linearly) separates strings and comments from code, and lines
+are emitted as soon as they are complete, so the work is linear in the size of the file.
+Mapped large files and diffs are never minified.
+"""
+
+import os
+import re
+from typing import Iterable, Iterator, List, Optional
+
+# Bump when the output of a transform changes, so cached minified texts are not reused.
+MINIFY_VERSION = 1
+
+LONG_LITERAL_CHARS = 1024
+BASE64_MIN_CHARS = 100
+DATA_RUN_LINES = 8
+DATA_KEEP_LINES = 3
+PREVIEW_HEAD_CHARS = 2000
+PREVIEW_TAIL_CHARS = 500
+BUNDLE_MIN_CHARS = 5000
+BUNDLE_MIN_LINE_LENGTH = 500
+
+PYTHON_EXTENSIONS = {".py", ".pyi", ".pyw"}
+C_LIKE_EXTENSIONS = {
+    ".c", ".h", ".cc", ".cpp", ".cxx", ".hpp", ".hh", ".cs", ".java", ".js", ".jsx", ".mjs",
+    ".cjs", ".ts", ".tsx", ".go", ".rs", ".swift", ".kt", ".kts", ".scala", ".php", ".dart",
+    ".m", ".mm", ".groovy", ".scss", ".less",
+}
+CSS_EXTENSIONS = {".css"}
+HASH_COMMENT_EXTENSIONS = {
+    ".sh", ".bash", ".zsh", ".fish", ".rb", ".pl", ".pm", ".r", ".yml", ".yaml", ".toml",
+    ".cfg", ".ini", ".conf", ".properties", ".tf", ".cmake", ".mk", ".ps1",
+}
+HASH_COMMENT_NAMES = frozenset(("makefile", "dockerfile", "cmakelists.txt", "gemfile", "rakefile",
+                                "requirements.txt", ".gitignore", ".dockerignore", ".env"))
+MARKUP_EXTENSIONS = {".html", ".htm", ".xhtml", ".xml", ".svg", ".vue", ".xsl"}
+JSON_EXTENSIONS = {".json"}
+LOCKFILE_NAMES = frozenset((
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock",
+    "pipfile.lock", "uv.lock", "cargo.lock", "gemfile.lock", "composer.lock", "go.sum",
+    "packages.lock.json", "mix.lock", "pubspec.lock", "podfile.lock", "flake.lock",
+))
+BUNDLE_SUFFIXES = (".min.js", ".min.mjs", ".min.css", ".bundle.js")
+
+# Strings use the "unrolled loop" form, which fails in linear time on unterminated literals.
+_PYTHON_TOKEN = re.compile(r'''
+    (?P<string>"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""
+              |\'\'\'[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*\'\'\'
+              |"[^"\\\n]*(?:\\.[^"\\\n]*)*"
+              |'[^'\\\n]*(?:\\.[^'\\\n]*)*')
+   |(?P<comment>\#[^\n]*)
+   |(?P<newline>\n)
+   |(?P<code>[^"'\#\n]+|["'])
+''', re.VERBOSE | re.DOTALL)
+
+_C_TOKEN = re.compile(r'''
+    (?P<string>"[^"\\\n]*(?:\\.[^"\\\n]*)*"
+              |'[^'\\\n]*(?:\\.[^'\\\n]*)*'
+              |`[^`\\]*(?:\\.[^`\\]*)*`)
+   |(?P<comment>/\*[^*]*(?:\*(?!/)[^*]*)*\*/|//[^\n]*)
+   |(?P<newline>\n)
+   |(?P<code>[^"'`/\n]+|["'`/])
+''', re.VERBOSE | re.DOTALL)
+
+_CSS_TOKEN = re.compile(r'''
+    (?P<string>"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*')
+   |(?P<comment>/\*[^*]*(?:\*(?!/)[^*]*)*\*/)
+   |(?P<newline>\n)
+   |(?P<code>[^"'/\n]+|["'/])
+''', re.VERBOSE | re.DOTALL)
+
+_MARKUP_COMMENT = re.compile(r"<!--[^-]*(?:-(?!->)[^-]*)*-->")
+_JSON_STRING = re.compile(r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"')
+# What may follow a string for it to be a statement of its own: a comment or nothing.
+_REST_OF_LINE = re.compile(r"[ \t\f\r]*(?:#[^\n]*)?(?=\n|$)")
+_BASE64_RUN = re.compile(r"[A-Za-z0-9+/]{%d,}={0,2}" % BASE64_MIN_CHARS)
+_DATA_LINE = re.compile(r"[\s,;:(){}\[\]0-9a-fA-FxX.+\-]*[0-9][\s,;:(){}\[\]0-9a-fA-FxX.+\-]*")
+_CLOSERS = ")]}"
+
+def language_for(file_path: Optional[str]) -> Optional[str]:
+    """
+    Return the name of the transform used for a file, or None for prose and unknown files.
+    """
+    if not file_path:
+        return None
+    name = os.path.basename(file_path).lower()
+    ext = os.path.splitext(name)[1]
+    if name in LOCKFILE_NAMES:
+        return "lockfile"
+    if name.endswith(BUNDLE_SUFFIXES):
+        return "bundle"
+    if ext in PYTHON_EXTENSIONS:
+        return "python"
+    if ext in C_LIKE_EXTENSIONS:
+        return "c-like"
+    if ext in CSS_EXTENSIONS:
+        return "css"
+    if ext in HASH_COMMENT_EXTENSIONS or name in HASH_COMMENT_NAMES:
+        return "hash"
+    if ext in MARKUP_EXTENSIONS:
+        return "markup"
+    if ext in JSON_EXTENSIONS:
+        return "json"
+    return None
+
+def _elide_literal(token: str) -> str:
+    """
+    Replace the contents of a long string literal by a note, keeping its quotes.
+    """
+    if len(token) <= LONG_LITERAL_CHARS:
+        return token
+    quote = token[:3] if token[:3] in ('"""', "'''") else token[0]
+    return f"{quote}[... {len(token) - 2 * len(quote)} characters elided ...]{quote}"
+
+def _elide_base64(match) -> str:
+    run = match.group(0)
+    if not any(c.isdigit() for c in run) or not any(c.isalpha() for c in run):
+        return run
+    return f"[... {len(run)} characters of base64 elided ...]"
+
+def _preview(text: str) -> Iterator[str]:
+    """
+    Yield the first PREVIEW_HEAD_CHARS and last PREVIEW_TAIL_CHARS characters of text,
+    cut at line ends where possible, with a note of what was left out in between.
+    """
+    if len(text) <= PREVIEW_HEAD_CHARS + PREVIEW_TAIL_CHARS:
+        yield text
+        return
+    head_end = text.rfind("\n", 0, PREVIEW_HEAD_CHARS) + 1 or PREVIEW_HEAD_CHARS
+    tail_start = text.find("\n", len(text) - PREVIEW_TAIL_CHARS - 1, len(text) - 1) + 1 or len(text) - PREVIEW_TAIL_CHARS
+    omitted_lines = text.count("\n", head_end, tail_start)
+    yield text[:head_end]
+    if not text[:head_end].endswith("\n"):
+        yield "\n"
+    yield f"[... {tail_start - head_end} characters ({omitted_lines} lines) omitted by --minify ...]\n"
+    yield text[tail_start:]
+
+def _bracket_delta(token: str) -> int:
+    count = token.count
+    return count("(") + count("[") + count("{") - count(")") - count("]") - count("}")
+
+def _python_lines(text: str) -> Iterator[str]:
+    if not text.endswith("\n"):
+        text += "\n"
+    widths = [0]
+    depth = 0
+    continued = False
+    header_level = None
+    pending = None
+    previous_colon = False
+    parts: List[str] = []
+    has_code = False
+    dropped_string = False
+    for match in _PYTHON_TOKEN.finditer(text):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "code":
+            parts.append(token)
+            if not has_code and not token.isspace():
+                has_code = True
+            depth = max(depth + _bracket_delta(token), 0)
+        elif kind == "string":
+            if (not depth and not continued and not has_code
+                    and _REST_OF_LINE.match(text, match.end())):
+                dropped_string = True
+            else:
+                parts.append(_elide_literal(token))
+                has_code = True
+        elif kind == "comment":
+            if match.start() == 0 and token.startswith("#!"):
+                parts.append(token)
+                has_code = True
+        else:
+            line = "".join(parts)
+            text_part = line.strip()
+            parts = []
+            has_code = False
+            statement = not continued
+            if not text_part:
+                if dropped_string and statement and previous_colon:
+                    pending = header_level
+                dropped_string = False
+                continue
+            dropped_string = False
+            if statement:
+                width = len(line) - len(line.lstrip(" \t\f"))
+                while width < widths[-1]:
+                    widths.pop()
+                if width > widths[-1]:
+                    widths.append(width)
+                level = len(widths) - 1
+                if pending is not None and level <= pending:
+                    yield " " * (pending + 1) + "...\n"
+                pending = None
+                header_level = level
+                yield " " * level + text_part + "\n"
+            else:
+                yield " " * (len(widths)) + text_part + "\n"
+            continued = depth > 0 or text_part.endswith("\\")
+            previous_colon = not continued and text_part.endswith(":")
+    if pending is not None:
+        yield " " * (pending + 1) + "...\n"
+
+def _bracket_lines(text: str, token_pattern) -> Iterator[str]:
+    if not text.endswith("\n"):
+        text += "\n"
+    depth = 0
+    start_depth = 0
+    parts: List[str] = []
+    for match in token_pattern.finditer(text):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "code":
+            parts.append(token)
+            depth += _bracket_delta(token)
+        elif kind == "string":
+            parts.append(_elide_literal(token))
+        elif kind == "comment":
+            if token.startswith("/*"):
+                # A block comment separates the tokens on either side of it.
+                parts.append(" ")
+        else:
+            line = "".join(parts).strip()
+            parts = []
+            if line:
+                level = start_depth - (1 if line[0] in _CLOSERS else 0)
+                yield " " * max(level, 0) + line + "\n"
+            start_depth = max(depth, 0)
+            depth = start_depth
+
+def _iter_lines(text: str) -> Iterator[str]:
+    start = 0
+    find = text.find
+    while start < len(text):
+        end = find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+def _hash_lines(text: str) -> Iterator[str]:
+    for number, line in enumerate(_iter_lines(text)):
+        line = line.rstrip()
+        stripped = line.lstrip()
+        if not stripped or (stripped.startswith("#") and not (number == 0 and stripped.startswith("#!"))):
+            continue
+        yield line + "\n"
+
+def _stripped_lines(text: str) -> Iterator[str]:
+    for line in _iter_lines(text):
+        line = line.strip()
+        if line:
+            yield line + "\n"
+
+def _json_lines(text: str) -> Iterator[str]:
+    for line in _stripped_lines(text):
+        if len(line) > LONG_LITERAL_CHARS:
+            line = _JSON_STRING.sub(lambda match: _elide_literal(match.group()), line)
+        yield line
+
+def _prose_lines(text: str) -> Iterator[str]:
+    blank = False
+    for line in _iter_lines(text):
+        line = line.rstrip()
+        if line:
+            if blank:
+                yield "\n"
+            blank = False
+            yield line + "\n"
+        else:
+            blank = True
+
+def _elide_data(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Replace runs of at least DATA_RUN_LINES numeric data lines by their first
+    DATA_KEEP_LINES lines and a note, and elide base64 runs, passing other lines through.
+    """
+    run: List[str] = []
+    for line in lines:
+        if line.endswith("\n") and line.count("\n") == 1 and _DATA_LINE.fullmatch(line):
+            run.append(line)
+            continue
+        if run:
+            yield from _flush_data(run)
+            run = []
+        if len(line) >= BASE64_MIN_CHARS:
+            line = _BASE64_RUN.sub(_elide_base64, line)
+        yield line
+    if run:
+        yield from _flush_data(run)
+
+def _flush_data(run: List[str]) -> Iterator[str]:
+    if len(run) < DATA_RUN_LINES:
+        yield from run
+        return
+    yield from run[:DATA_KEEP_LINES]
+    indent = run[DATA_KEEP_LINES - 1][:len(run[DATA_KEEP_LINES - 1]) - len(run[DATA_KEEP_LINES - 1].lstrip())]
+    yield f"{indent}[... {len(run) - DATA_KEEP_LINES} lines of data elided ...]\n"
+
+class Minifier:
+    """
+    Applies the minification transform for each file's language. name identifies the
+    transform version in cache profiles.
+    """
+
+    def __init__(self):
+        self.name = f"minify{MINIFY_VERSION}"
+
+    def minify(self, content: str, file_path: Optional[str] = None) -> str:
+        """
+        Return the minified text of a file.
+        """
+        return "".join(self.iter_minified(content, file_path))
+
+    def iter_minified(self, content: str, file_path: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield the minified text of a file piece by piece, as the transform produces it.
+        """
+        language = language_for(file_path)
+        if language in ("lockfile", "bundle") or (
+                language is not None and len(content) >= BUNDLE_MIN_CHARS
+                and len(content) > BUNDLE_MIN_LINE_LENGTH * (content.count("\n") + 1)):
+            yield from _preview(content)
+            return
+        if language == "python":
+            lines = _python_lines(content)
+        elif language == "c-like":
+            lines = _bracket_lines(content, _C_TOKEN)
+        elif language == "css":
+            lines = _bracket_lines(content, _CSS_TOKEN)
+        elif language == "hash":
+            lines = _hash_lines(content)
+        elif language == "markup":
+            lines = _stripped_lines(_MARKUP_COMMENT.sub("", content))
+        elif language == "json":
+            lines = _json_lines(content)
+        else:
+            lines = _prose_lines(content)
+        yield from _elide_data(lines)
@@ -0,0 +1,134 @@
+"""
+Persistent mirror cache for --repo runs.
+
+Instead of a fresh `git clone --depth 1` per run, each repository URL gets a bare mirror
+under the mirror root (by default ~/.cache/llm-fuse/mirrors). The mirror is a partial
+clone (--filter=blob:none): it holds commits and trees, and file contents are fetched from
+the remote only when they are checked out. Later runs refresh it with an incremental
+`git fetch`. Every run checks the requested ref out into a temporary worktree of the
+mirror; when the include/exclude regexes can be expressed as sparse-checkout patterns,
+only the matching files are checked out, so only their blobs are ever downloaded.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional
+
+def default_mirror_root() -> str:
+    """
+    Return the default mirror directory, honouring XDG_CACHE_HOME.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "llm-fuse", "mirrors")
+
+def mirror_path(mirror_root: str, repo_url: str) -> str:
+    """
+    Return the mirror directory for a repository URL: its name plus a hash of the URL.
+    """
+    name = repo_url.rstrip("/").split("/")[-1]
+    if name.endswith(".git"):
+        name = name[:-4]
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", name) or "repo"
+    digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(mirror_root, f"{name}-{digest}.git")
+
+def _git(args: List[str], cwd: Optional[str] = None) -> None:
+    try:
+        subprocess.run(["git"] + args, cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:
+        detail = e.stderr.decode("utf-8", "replace").strip() if e.stderr else str(e)
+        raise RuntimeError(f"Error running git {args[0]}: {detail}")
+    except OSError as e:
+        raise RuntimeError(f"Error running git: {e}")
+
+def update_mirror(repo_url: str, mirror_root: str) -> str:
+    """
+    Create the blobless mirror of repo_url, or fetch into it if it already exists.
+    Returns the mirror's path. Raises RuntimeError if git fails.
+    """
+    path = mirror_path(mirror_root, repo_url)
+    if os.path.isdir(path):
+        print(f"Updating mirror of {repo_url}...")
+        _git(["fetch", "--prune", "origin"], cwd=path)
+        return path
+    os.makedirs(mirror_root, exist_ok=True)
+    print(f"Creating mirror of {repo_url} in {path}...")
+    partial = path + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    _git(["clone", "--quiet", "--mirror", "--filter=blob:none", repo_url, partial])
+    # Only a complete clone takes the mirror's name, so an interrupted one is never reused.
+    os.rename(partial, path)
+    return path
+
+def _regex_to_globs(regex: str) -> Optional[List[str]]:
+    """
+    Translate a simple path regex into equivalent gitignore-style globs, or return None.
+    Handled forms: extension matches such as "\\.py$", ".*\\.(js|ts)$" or "\\.min\\.js$",
+    and plain literals without "/" such as "node_modules" (matched anywhere in a path).
+    """
+    if regex.startswith(".*"):
+        regex = regex[2:]
+    match = re.fullmatch(r"((?:\\\.[A-Za-z0-9_-]+)+)\$", regex)
+    if match:
+        return ["*" + match.group(1).replace("\\.", ".")]
+    match = re.fullmatch(r"\\\.\(([A-Za-z0-9_]+(?:\|[A-Za-z0-9_]+)*)\)\$", regex)
+    if match:
+        return [f"*.{ext}" for ext in match.group(1).split("|")]
+    if re.fullmatch(r"(?:[A-Za-z0-9_-]|\\[.\-_])+", regex):
+        return ["*" + re.sub(r"\\(.)", r"\1", regex) + "*"]
+    return None
+
+def sparse_patterns(include_regex: Optional[str], exclude_regex: Optional[str],
+                    root: str = "") -> Optional[List[str]]:
+    """
+    Derive sparse-checkout patterns that select a superset of the files the include and
+    exclude regexes keep. The regexes are matched against full paths, so an include regex
+    that already matches the checkout root itself keeps everything and is not used.
+    Returns None when no narrowing is possible, meaning a full checkout. The regexes are
+    still applied to the checked-out files afterwards.
+    """
+    patterns = None
+    if include_regex and not re.search(include_regex, root + os.sep):
+        patterns = _regex_to_globs(include_regex)
+    excluded = _regex_to_globs(exclude_regex) if exclude_regex else None
+    if excluded:
+        patterns = (patterns or ["/*"]) + ["!" + glob for glob in excluded]
+    return patterns
+
+def checkout_worktree(mirror: str, ref: Optional[str] = None, include_regex: Optional[str] = None,
+                      exclude_regex: Optional[str] = None) -> str:
+    """
+    Check ref (default: the mirror's HEAD) out into a new temporary worktree of the mirror,
+    limited to the files the include/exclude regexes can select (see sparse_patterns).
+    Returns the worktree directory. Raises RuntimeError if git fails.
+    """
+    worktree = tempfile.mkdtemp(prefix="git_repo_")
+    patterns = sparse_patterns(include_regex, exclude_regex, worktree)
+    # Drop the records of worktrees whose directories were removed without telling git.
+    _git(["worktree", "prune"], cwd=mirror)
+    try:
+        if patterns:
+            _git(["worktree", "add", "--quiet", "--no-checkout", "--detach", worktree, ref or "HEAD"], cwd=mirror)
+            _git(["sparse-checkout", "set", "--no-cone", "--"] + patterns, cwd=worktree)
+            # Populate the index and the files matching the patterns, fetching only their blobs.
+            _git(["reset", "--quiet", "--hard"], cwd=worktree)
+        else:
+            _git(["worktree", "add", "--quiet", "--detach", worktree, ref or "HEAD"], cwd=mirror)
+    except RuntimeError:
+        remove_worktree(mirror, worktree)
+        raise
+    return worktree
+
+def remove_worktree(mirror: str, worktree: str) -> None:
+    """
+    Delete a worktree created by checkout_worktree and unregister it from the mirror.
+    """
+    shutil.rmtree(worktree, ignore_errors=True)
+    try:
+        _git(["worktree", "prune"], cwd=mirror)
+    except RuntimeError:
+        pass
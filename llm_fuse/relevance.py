@@ -0,0 +1,247 @@
+"""
+Relevance-ranked file selection for --budget.
+
+Every candidate file gets a score from cheap signals: how deep it sits in the tree,
+whether it is a README, an entry point or a project configuration file, how recently Git
+last changed it, and, with --query, how often the query terms occur in its path and
+contents. Files are then picked greedily by value density (value per token, where a
+file's value is its score scaled by the square root of its size, so larger files carry
+more content but with diminishing returns) until the token budget is used up. Copies of
+another file form a group with it: once one file of a group is picked, the others only
+cost the reference that replaces their content in the output.
+
+Query terms are looked up in an inverted index built from the words of every file. Only
+words matching a query term are kept in the index, so it stays small on large
+repositories, and each distinct word is matched against the query only once. All steps are
+linear in the size of the input, apart from one sort of the candidate files.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Weights of the scoring signals.
+BASE_SCORE = 1.0
+DEPTH_WEIGHT = 1.0
+README_WEIGHT = 2.0
+ENTRY_POINT_WEIGHT = 1.5
+CONFIG_WEIGHT = 1.0
+RECENCY_WEIGHT = 2.0
+QUERY_WEIGHT = 8.0
+
+# Recency decays with this half-life, measured from the newest commit.
+RECENCY_HALF_LIFE_DAYS = 30.0
+# A match in the file's path counts as this many matches in its contents.
+PATH_MATCH_WEIGHT = 5
+
+ENTRY_POINT_NAMES = frozenset((
+    "main.py", "__main__.py", "app.py", "cli.py", "manage.py", "wsgi.py", "asgi.py",
+    "index.js", "index.ts", "index.tsx", "main.js", "main.ts", "app.js", "app.ts", "server.js",
+    "main.go", "main.rs", "lib.rs", "main.c", "main.cpp", "main.java", "program.cs",
+))
+
+CONFIG_NAMES = frozenset((
+    "setup.py", "setup.cfg", "pyproject.toml", "requirements.txt", "package.json", "tsconfig.json",
+    "cargo.toml", "go.mod", "pom.xml", "build.gradle", "build.gradle.kts", "cmakelists.txt",
+    "makefile", "dockerfile", "docker-compose.yml", "docker-compose.yaml", "gemfile", "composer.json",
+))
+
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Boundaries inside camelCase and snake_case identifiers.
+SUBWORD_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+def word_terms(word: str) -> List[str]:
+    """
+    Return the lowercase index terms of a word: the word itself and, for compound
+    identifiers such as "parseConfig" or "parse_config", its parts.
+    """
+    terms = [word.lower()]
+    parts = SUBWORD_PATTERN.findall(word)
+    if len(parts) > 1:
+        terms.extend(part.lower() for part in parts)
+    return terms
+
+class QueryIndex:
+    """
+    Inverted index from query terms to the files containing them.
+
+    A query is a whitespace-separated list of terms. Plain words match index terms
+    case-insensitively (so "config" also matches "parseConfig"); terms containing regex
+    syntax are matched against whole words with re.fullmatch, ignoring case.
+    Raises re.error for invalid regex terms.
+    """
+
+    def __init__(self, query: str):
+        self.terms = list(dict.fromkeys(query.split()))
+        self.keywords = [(term, term.lower()) for term in self.terms if re.escape(term) == term]
+        self.patterns = [(term, re.compile(term, re.IGNORECASE)) for term in self.terms if re.escape(term) != term]
+        # Query term -> {file id: number of occurrences}.
+        self.postings: Dict[str, Dict[int, int]] = {term: {} for term in self.terms}
+        self.file_count = 0
+        # Word -> query terms it matches, so that each distinct word is matched only once.
+        self._matches: Dict[str, Tuple[str, ...]] = {}
+
+    def _match(self, word: str) -> Tuple[str, ...]:
+        matched = self._matches.get(word)
+        if matched is None:
+            terms = word_terms(word)
+            matched = tuple([term for term, keyword in self.keywords if keyword in terms]
+                            + [term for term, pattern in self.patterns if pattern.fullmatch(word)])
+            self._matches[word] = matched
+        return matched
+
+    def add(self, file_id: int, path: str, text: Optional[str]) -> None:
+        """
+        Index the words of a file's path and, if given, of its contents.
+        """
+        self.file_count = max(self.file_count, file_id + 1)
+        counts = Counter(WORD_PATTERN.findall(text)) if text else Counter()
+        for word in WORD_PATTERN.findall(path):
+            counts[word] += PATH_MATCH_WEIGHT
+        for word, count in counts.items():
+            for term in self._match(word):
+                postings = self.postings[term]
+                postings[file_id] = postings.get(file_id, 0) + count
+
+    def scores(self) -> Dict[int, float]:
+        """
+        Return a TF-IDF score for every file with at least one match, scaled so that the
+        best file scores 1.
+        """
+        scores: Dict[int, float] = {}
+        for postings in self.postings.values():
+            if not postings:
+                continue
+            idf = math.log(1 + self.file_count / len(postings))
+            for file_id, count in postings.items():
+                scores[file_id] = scores.get(file_id, 0.0) + (1 + math.log(count)) * idf
+        best = max(scores.values(), default=0.0)
+        return {file_id: score / best for file_id, score in scores.items()} if best else {}
+
+def static_score(relative_path: str) -> float:
+    """
+    Score a file from its path alone: shallow files, READMEs, entry points and project
+    configuration files score higher.
+    """
+    parts = relative_path.replace("\\", "/").split("/")
+    name = parts[-1].lower()
+    score = BASE_SCORE + DEPTH_WEIGHT / len(parts)
+    if name.startswith("readme"):
+        score += README_WEIGHT / len(parts)
+    if name in ENTRY_POINT_NAMES:
+        score += ENTRY_POINT_WEIGHT
+    if name in CONFIG_NAMES:
+        score += CONFIG_WEIGHT / len(parts)
+    return score
+
+def recency_scores(commit_times: Dict[str, int]) -> Dict[str, float]:
+    """
+    Map the last commit time of each file to a score between 0 and 1 that halves every
+    RECENCY_HALF_LIFE_DAYS before the newest commit.
+    """
+    if not commit_times:
+        return {}
+    newest = max(commit_times.values())
+    half_life = RECENCY_HALF_LIFE_DAYS * 24 * 60 * 60
+    return {path: 0.5 ** ((newest - timestamp) / half_life) for path, timestamp in commit_times.items()}
+
+class BudgetSelector:
+    """
+    Collects the candidate files (with their output cost in tokens) and picks the most
+    valuable set that fits a token budget.
+    """
+
+    def __init__(self, query: Optional[str] = None):
+        self.paths: List[str] = []
+        self.relative_paths: List[str] = []
+        self.costs: List[int] = []
+        # Per candidate: the file whose copies it belongs with (itself by default), and the
+        # cost of the reference section written when another file of the group is written.
+        self.groups: List[int] = []
+        self.reference_costs: List[Optional[int]] = []
+        self._ids: Dict[str, int] = {}
+        self.index = QueryIndex(query) if query else None
+
+    def add(self, path: str, relative_path: str, cost: int, text: Optional[str] = None) -> None:
+        """
+        Add cost tokens to a candidate file, registering it on first use. Call once per
+        section; text is the section's content, indexed when there is a query.
+        """
+        file_id = self._ids.get(path)
+        if file_id is None:
+            file_id = self._ids[path] = len(self.paths)
+            self.paths.append(path)
+            self.relative_paths.append(relative_path)
+            self.costs.append(0)
+            self.groups.append(file_id)
+            self.reference_costs.append(None)
+            if self.index is not None:
+                self.index.add(file_id, relative_path, None)
+        self.costs[file_id] += cost
+        if self.index is not None and text:
+            self.index.add(file_id, "", text)
+
+    def link(self, path: str, original: str, reference_cost: int) -> None:
+        """
+        Record that the file at path is a copy of original (added before it), which is
+        written as a reference costing reference_cost tokens when another file of their
+        group is written.
+        """
+        file_id = self._ids[path]
+        group = self.groups[self._ids[original]]
+        self.groups[file_id] = group
+        self.reference_costs[file_id] = reference_cost
+        # Whichever copy is written in full, the others (the original among them) become references.
+        if self.reference_costs[group] is None:
+            self.reference_costs[group] = reference_cost
+
+    def scores(self, commit_times: Optional[Dict[str, int]] = None) -> List[float]:
+        """
+        Return the score of every candidate, in the order they were added. commit_times
+        maps relative paths (with "/" separators) to their last commit time.
+        """
+        recency = recency_scores(commit_times or {})
+        query_scores = self.index.scores() if self.index is not None else {}
+        scores = []
+        for file_id, relative_path in enumerate(self.relative_paths):
+            score = static_score(relative_path)
+            score += RECENCY_WEIGHT * recency.get(relative_path.replace("\\", "/"), 0.0)
+            score += QUERY_WEIGHT * query_scores.get(file_id, 0.0)
+            scores.append(score)
+        return scores
+
+    def select(self, budget: int, commit_times: Optional[Dict[str, int]] = None,
+               reserve_tokens: int = 0) -> List[str]:
+        """
+        Greedily pick files in order of value density until budget tokens (less
+        reserve_tokens, kept for the summary header) are used. Each file also costs its
+        line in the file system diagram, and a copy of a file already picked costs only
+        its reference. Returns the chosen paths in input order.
+        """
+        scores = self.scores(commit_times)
+        costs = [cost + _diagram_tokens(relative_path) for cost, relative_path in zip(self.costs, self.relative_paths)]
+        order = sorted(range(len(self.paths)),
+                       key=lambda file_id: scores[file_id] / math.sqrt(max(costs[file_id], 1)), reverse=True)
+        remaining = budget - reserve_tokens
+        chosen = []
+        chosen_groups = set()
+        for file_id in order:
+            cost = costs[file_id]
+            group = self.groups[file_id]
+            if group in chosen_groups:
+                cost = self.reference_costs[file_id] + _diagram_tokens(self.relative_paths[file_id])
+            if cost <= remaining:
+                remaining -= cost
+                chosen.append(file_id)
+                chosen_groups.add(group)
+        chosen.sort()
+        return [self.paths[file_id] for file_id in chosen]
+
+def _diagram_tokens(relative_path: str) -> int:
+    """
+    Upper estimate of the tokens a file adds to the diagram: its own line plus a line for
+    each of its directories, at 1 token per 4 characters.
+    """
+    parts = relative_path.replace("\\", "/").split("/")
+    return sum(math.ceil((4 * (depth + 1) + len(part) + 1) / 4) for depth, part in enumerate(parts))
@@ -0,0 +1,153 @@
+"""
+Compact in-memory records for file sections.
+
+Every text file read by llm-fuse becomes one FileRecord, holding its path, its decoded
+content (or None for memory-mapped files, which are copied to the output as byte ranges)
+and its number of chunks. Each section of the file is a FileSection that refers to that
+record and stores only its position within the content as an (offset, length) view plus
+its token count, so chunks share their path and content instead of carrying copies.
+The relative path used in headers and the diagram is computed once per file and interned.
+
+FileSection also behaves like the dictionaries earlier versions produced ("path",
+"content", "tokens", and "chunk_index"/"total_chunks" for chunked files or
+"content_range" for memory-mapped ones), so existing callers keep working.
+"""
+
+import os
+import sys
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+class FileRecord:
+    """
+    A file whose sections are being written: its path, its content (None when the
+    sections are byte ranges of the file itself) and how many sections it was split into.
+    """
+
+    __slots__ = ("path", "content", "total_chunks", "_relpath", "_relbase")
+
+    def __init__(self, path: str, content: Optional[str], total_chunks: int = 1):
+        self.path = path
+        self.content = content
+        self.total_chunks = total_chunks
+        self._relpath = None
+        self._relbase = None
+
+    def relpath(self, base_dir: str) -> str:
+        """
+        Return the path relative to base_dir, computing and interning it only once.
+        """
+        if self._relbase != base_dir:
+            self._relpath = sys.intern(os.path.relpath(self.path, base_dir))
+            self._relbase = base_dir
+        return self._relpath
+
+class FileSection:
+    """
+    One section (a whole file or one chunk of it) as an (offset, length) view into its
+    FileRecord: character offsets into the content, or byte offsets into the file for
+    memory-mapped files.
+    """
+
+    __slots__ = ("file", "offset", "length", "tokens", "chunk_index")
+
+    def __init__(self, file: FileRecord, offset: int, length: int, tokens: int, chunk_index: int = 1):
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.tokens = tokens
+        self.chunk_index = chunk_index
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FileSection":
+        """
+        Build a section (with its own FileRecord) from a section dictionary.
+        """
+        total_chunks = data.get("total_chunks", 1)
+        chunk_index = data.get("chunk_index", 1)
+        if "content_range" in data:
+            start, end = data["content_range"]
+            return cls(FileRecord(data["path"], None, total_chunks), start, end - start, data["tokens"], chunk_index)
+        content = data.get("content", "")
+        return cls(FileRecord(data["path"], content, total_chunks), 0, len(content), data["tokens"], chunk_index)
+
+    @property
+    def path(self) -> str:
+        return self.file.path
+
+    @property
+    def total_chunks(self) -> int:
+        return self.file.total_chunks
+
+    @property
+    def mapped(self) -> bool:
+        """
+        True when the section is a byte range of the file rather than decoded content.
+        """
+        return self.file.content is None
+
+    @property
+    def content(self) -> str:
+        """
+        The section's text, sliced from the file content on access.
+        """
+        content = self.file.content
+        if content is None:
+            raise AttributeError("memory-mapped sections have no decoded content")
+        if self.offset == 0 and self.length == len(content):
+            return content
+        return content[self.offset:self.offset + self.length]
+
+    @property
+    def content_range(self) -> Tuple[int, int]:
+        return self.offset, self.offset + self.length
+
+    # Dictionary adapter.
+
+    def keys(self) -> List[str]:
+        keys = ["path", "content_range" if self.mapped else "content", "tokens"]
+        if self.total_chunks > 1:
+            keys += ["chunk_index", "total_chunks"]
+        return keys
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self.keys() else default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def to_dict(self) -> dict:
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (FileSection, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"FileSection({self.path!r}, chunk {self.chunk_index}/{self.total_chunks}, {self.tokens} tokens)"
+
+def sections_from_layout(path: str, content: Optional[str],
+                         layout: List[Tuple[int, int, int]]) -> Iterator[FileSection]:
+    """
+    Yield the sections of one file from its chunk layout of (start, end, tokens) triples,
+    which are character offsets into content, or byte offsets when content is None.
+    """
+    record = FileRecord(path, content, len(layout))
+    for index, (start, end, tokens) in enumerate(layout):
+        yield FileSection(record, start, end - start, tokens, index + 1)
+
+def as_section(item: Union[FileSection, dict]) -> FileSection:
+    """
+    Return item as a FileSection, converting section dictionaries.
+    """
+    return item if isinstance(item, FileSection) else FileSection.from_dict(item)
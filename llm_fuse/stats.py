@@ -0,0 +1,144 @@
+"""
+Run statistics for llm-fuse (--stats / --stats-json).
+
+RunStats collects the wall time of each pipeline stage, bytes read and written, files
+skipped by reason, peak memory and the slowest files to read and chunk. Stages that are
+interleaved by the streaming pipeline are separated by timing the section generator on
+its own: the time spent producing sections is charged to "process" and subtracted from
+the stage that consumes them.
+"""
+
+import heapq
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+SLOWEST_FILES = 10
+
+def peak_rss_kb() -> Optional[int]:
+    """
+    Return the peak resident set size of this process in KiB, or None where unsupported.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+class RunStats:
+    """
+    Accumulates statistics for one run. record_file may be called from worker threads.
+    Slowest files are reported relative to root, when it is set.
+    """
+
+    def __init__(self, slowest: int = SLOWEST_FILES, root: Optional[str] = None):
+        self.root = root
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_examined = 0
+        self.skip_counts = Counter()
+        self.slowest = slowest
+        # Min-heap of (seconds, path, bytes) holding the slowest files seen so far.
+        self._slowest_files: List[Tuple[float, str, int]] = []
+        self._lock = threading.Lock()
+        # Time charged to nested timers, so that enclosing stages can exclude it.
+        self._nested = 0.0
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a block as the given stage, excluding time charged by timed_iter inside it.
+        """
+        start = time.perf_counter()
+        nested = self._nested
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start - (self._nested - nested))
+
+    def timed_iter(self, name: str, items: Iterable) -> Iterator:
+        """
+        Wrap an iterable, charging the time spent producing each item to the given stage.
+        """
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                self.add_time(name, elapsed)
+                self._nested += elapsed
+            yield item
+
+    def record_file(self, path: str, seconds: float, num_bytes: int) -> None:
+        """
+        Record the time spent examining (reading, classifying and chunking) one file and
+        the bytes read from it.
+        """
+        with self._lock:
+            self.files_examined += 1
+            self.bytes_read += num_bytes
+            entry = (seconds, path, num_bytes)
+            if len(self._slowest_files) < self.slowest:
+                heapq.heappush(self._slowest_files, entry)
+            elif self.slowest and entry > self._slowest_files[0]:
+                heapq.heapreplace(self._slowest_files, entry)
+
+    def slowest_files(self) -> List[Tuple[float, str, int]]:
+        """
+        Return (seconds, path, bytes) for the slowest files, slowest first.
+        """
+        return sorted(self._slowest_files, reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "total_seconds": round(sum(self.stages.values()), 6),
+            "files_examined": self.files_examined,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "skipped": dict(sorted(self.skip_counts.items())),
+            "peak_rss_kb": peak_rss_kb(),
+            "slowest_files": [
+                {"path": os.path.relpath(path, self.root) if self.root else path, "seconds": round(seconds, 6), "bytes": num_bytes}
+                for seconds, path, num_bytes in self.slowest_files()
+            ]
+        }
+
+    def format(self) -> str:
+        """
+        Render the statistics as the plain-text block printed by --stats.
+        """
+        data = self.to_dict()
+        lines = ["Run statistics:"]
+        for name, seconds in data["stages"].items():
+            lines.append(f"  {name:<12}{seconds:>10.3f} s")
+        lines.append(f"  {'total':<12}{data['total_seconds']:>10.3f} s")
+        lines.append(f"  Files examined: {data['files_examined']} ({data['bytes_read']} bytes read)")
+        lines.append(f"  Bytes written: {data['bytes_written']}")
+        if data["skipped"]:
+            details = ", ".join(f"{reason}: {count}" for reason, count in data["skipped"].items())
+            lines.append(f"  Skipped: {sum(data['skipped'].values())} ({details})")
+        if data["peak_rss_kb"] is not None:
+            lines.append(f"  Peak memory: {data['peak_rss_kb']} KiB")
+        if data["slowest_files"]:
+            lines.append("  Slowest files:")
+            for entry in data["slowest_files"]:
+                lines.append(f"    {entry['seconds']:>8.4f} s  {entry['bytes']:>10} bytes  {entry['path']}")
+        return "\n".join(lines)
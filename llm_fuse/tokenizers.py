@@ -0,0 +1,307 @@
+"""
+Pluggable token counting backends for llm-fuse.
+
+Every backend implements the Tokenizer interface: count() for a single text and
+count_batch() for many texts at once (backends share work such as BPE word caches across a
+batch). The --tokenizer option selects a backend by name, optionally followed by a colon
+and a path to the backend's data file:
+
+- heuristic            roughly one token per 4 characters (the historical default)
+- bpe:PATH             an offline byte-level BPE tokenizer loaded from a GPT-2 style
+                       vocab.json/merges.txt pair (PATH is the directory or merges file)
+- byteclass[:PATH]     a fast estimator that counts byte classes (word characters, spaces,
+                       newlines, punctuation, non-ASCII) with weights calibrated per file
+                       extension, optionally overridden from a JSON calibration file
+                       (see calibrate_byte_class, run by llm-fuse --calibrate PATH)
+
+Additional backends can be added with register_tokenizer().
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+class Tokenizer:
+    """
+    Base class for token counting backends.
+    """
+    name = "tokenizer"
+    # When set, count(text) is exactly ceil(len(text) / chars_per_token), which lets callers
+    # compute chunk sizes arithmetically instead of re-counting.
+    chars_per_token: Optional[int] = None
+
+    def count(self, text: str, path: Optional[str] = None) -> int:
+        """
+        Return the number of tokens in text. path is a hint for extension-aware backends.
+        """
+        raise NotImplementedError
+
+    def count_batch(self, texts: Sequence[str], paths: Optional[Sequence[Optional[str]]] = None) -> List[int]:
+        """
+        Return the token counts for many texts at once.
+        """
+        if paths is None:
+            paths = [None] * len(texts)
+        return [self.count(text, path) for text, path in zip(texts, paths)]
+
+    def cost_batch(self, texts: Sequence[str], paths: Optional[Sequence[Optional[str]]] = None) -> List[float]:
+        """
+        Return additive costs for many texts, such as the lines of a file: the costs of
+        adjacent texts add up to (an estimate of) the count of their concatenation, whereas
+        counts may be rounded per text. Defaults to count_batch.
+        """
+        return self.count_batch(texts, paths)
+
+class HeuristicTokenizer(Tokenizer):
+    """
+    Estimate one token per 4 characters.
+    """
+    name = "heuristic"
+    chars_per_token = 4
+
+    def count(self, text: str, path: Optional[str] = None) -> int:
+        return math.ceil(len(text) / 4)
+
+def _bytes_to_unicode() -> Dict[int, str]:
+    """
+    The reversible byte-to-character mapping used by GPT-2 style byte-level BPE vocabularies.
+    """
+    printable = (list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1))
+                 + list(range(ord("®"), ord("ÿ") + 1)))
+    codes = printable[:]
+    extra = 0
+    for b in range(256):
+        if b not in printable:
+            printable.append(b)
+            codes.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, (chr(c) for c in codes)))
+
+# GPT-2's pre-tokenization pattern, with \p{L} and \p{N} expressed in terms of the re module.
+_BPE_PRETOKENIZE = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+""")
+
+class BPETokenizer(Tokenizer):
+    """
+    Offline byte-level BPE tokenizer loaded from a GPT-2 style merges.txt (and vocab.json).
+    Only the number of tokens is computed; merged words are cached so that counting a batch
+    of files that share identifiers does the merge work once per distinct word.
+    """
+
+    def __init__(self, path: str, word_cache_size: int = 200000):
+        merges_path, vocab_path = self._resolve_paths(path)
+        digest = hashlib.sha1()
+        with open(merges_path, 'r', encoding='utf-8') as f:
+            merges_text = f.read()
+        digest.update(merges_text.encode('utf-8'))
+        self.vocab = None
+        if vocab_path is not None:
+            with open(vocab_path, 'r', encoding='utf-8') as f:
+                vocab_text = f.read()
+            digest.update(vocab_text.encode('utf-8'))
+            self.vocab = json.loads(vocab_text)
+        self.ranks = {}
+        for line in merges_text.splitlines():
+            if not line or line.startswith("#version"):
+                continue
+            parts = line.split()
+            if len(parts) == 2:
+                self.ranks.setdefault((parts[0], parts[1]), len(self.ranks))
+        self.name = f"bpe-{digest.hexdigest()[:12]}"
+        self.byte_encoder = _bytes_to_unicode()
+        self.word_cache_size = word_cache_size
+        self._word_cache = {}
+
+    @staticmethod
+    def _resolve_paths(path: str) -> Tuple[str, Optional[str]]:
+        if os.path.isdir(path):
+            merges_path = os.path.join(path, "merges.txt")
+            vocab_path = os.path.join(path, "vocab.json")
+        else:
+            merges_path = path
+            vocab_path = os.path.join(os.path.dirname(path), "vocab.json")
+        if not os.path.isfile(merges_path):
+            raise ValueError(f"BPE merges file not found: {merges_path}")
+        return merges_path, vocab_path if os.path.isfile(vocab_path) else None
+
+    def _word_tokens(self, word: str) -> int:
+        cached = self._word_cache.get(word)
+        if cached is not None:
+            return cached
+        symbols = [self.byte_encoder[b] for b in word.encode('utf-8')]
+        ranks = self.ranks
+        while len(symbols) > 1:
+            best = None
+            best_rank = None
+            for pair in zip(symbols, symbols[1:]):
+                rank = ranks.get(pair)
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best, best_rank = pair, rank
+            if best is None:
+                break
+            merged = []
+            i = 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and symbols[i] == best[0] and symbols[i + 1] == best[1]:
+                    merged.append(best[0] + best[1])
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    i += 1
+            symbols = merged
+        if self.vocab is not None:
+            # Symbols missing from the vocabulary fall back to one token per byte.
+            tokens = sum(1 if s in self.vocab else len(s) for s in symbols)
+        else:
+            tokens = len(symbols)
+        if len(self._word_cache) >= self.word_cache_size:
+            self._word_cache.clear()
+        self._word_cache[word] = tokens
+        return tokens
+
+    def count(self, text: str, path: Optional[str] = None) -> int:
+        word_tokens = self._word_tokens
+        return sum(word_tokens(word) for word in _BPE_PRETOKENIZE.findall(text))
+
+# Byte classes used by the byte-class estimator. Every byte maps to one class letter so that
+# a single bytes.translate() followed by bytes.count() per class counts the whole text in C.
+_BYTE_CLASSES = "wsnpu"
+
+def _build_class_table() -> bytes:
+    table = bytearray(256)
+    for b in range(256):
+        c = chr(b)
+        if b >= 0x80:
+            table[b] = ord("u")
+        elif c == "\n":
+            table[b] = ord("n")
+        elif c.isspace():
+            table[b] = ord("s")
+        elif c.isalnum() or c == "_":
+            table[b] = ord("w")
+        else:
+            table[b] = ord("p")
+    return bytes(table)
+
+_CLASS_TABLE = _build_class_table()
+
+# Tokens per byte of each class, roughly calibrated against a GPT-style BPE vocabulary.
+# w: word characters, s: spaces/tabs, n: newlines, p: punctuation, u: non-ASCII bytes.
+DEFAULT_BYTE_CLASS_WEIGHTS = {"w": 0.24, "s": 0.08, "n": 0.55, "p": 0.7, "u": 0.4}
+BYTE_CLASS_EXTENSION_WEIGHTS = {
+    ".md": {"w": 0.22, "s": 0.02, "n": 0.5, "p": 0.6, "u": 0.4},
+    ".txt": {"w": 0.22, "s": 0.02, "n": 0.5, "p": 0.6, "u": 0.4},
+    ".rst": {"w": 0.22, "s": 0.02, "n": 0.5, "p": 0.6, "u": 0.4},
+    ".py": {"w": 0.25, "s": 0.06, "n": 0.5, "p": 0.65, "u": 0.4},
+    ".json": {"w": 0.3, "s": 0.05, "n": 0.4, "p": 0.8, "u": 0.4},
+    ".yaml": {"w": 0.27, "s": 0.06, "n": 0.5, "p": 0.7, "u": 0.4},
+    ".yml": {"w": 0.27, "s": 0.06, "n": 0.5, "p": 0.7, "u": 0.4},
+    ".html": {"w": 0.26, "s": 0.06, "n": 0.5, "p": 0.75, "u": 0.4},
+    ".css": {"w": 0.27, "s": 0.06, "n": 0.5, "p": 0.75, "u": 0.4},
+}
+
+class ByteClassTokenizer(Tokenizer):
+    """
+    Fast estimator that weights counts of byte classes, with weights calibrated per file
+    extension. Much cheaper than BPE and far closer than the 4-characters heuristic for code,
+    whitespace-heavy files and CJK text.
+    """
+    name = "byteclass"
+
+    def __init__(self, path: Optional[str] = None):
+        self.extension_weights = dict(BYTE_CLASS_EXTENSION_WEIGHTS)
+        self.default_weights = dict(DEFAULT_BYTE_CLASS_WEIGHTS)
+        if path is not None:
+            with open(path, 'r', encoding='utf-8') as f:
+                calibration = json.load(f)
+            self.default_weights.update(calibration.pop("default", {}))
+            self.extension_weights.update(calibration)
+            with open(path, 'rb') as f:
+                self.name = f"byteclass-{hashlib.sha1(f.read()).hexdigest()[:12]}"
+
+    def weights_for(self, path: Optional[str]) -> Dict[str, float]:
+        if path:
+            weights = self.extension_weights.get(os.path.splitext(path)[1].lower())
+            if weights is not None:
+                return weights
+        return self.default_weights
+
+    def estimate_bytes(self, data: bytes, path: Optional[str] = None) -> float:
+        """
+        Return the unrounded token estimate for UTF-8 encoded data. Estimates are additive:
+        those of adjacent pieces of data add up to the estimate of the whole.
+        """
+        classes = data.translate(_CLASS_TABLE)
+        weights = self.weights_for(path)
+        return sum(classes.count(c.encode()) * weights.get(c, 0.0) for c in _BYTE_CLASSES)
+
+    def count_bytes(self, data: bytes, path: Optional[str] = None) -> int:
+        """
+        Estimate the tokens in UTF-8 encoded data without decoding it.
+        """
+        if not data:
+            return 0
+        return max(1, round(self.estimate_bytes(data, path)))
+
+    def count(self, text: str, path: Optional[str] = None) -> int:
+        return self.count_bytes(text.encode('utf-8'), path)
+
+    def cost_batch(self, texts: Sequence[str], paths: Optional[Sequence[Optional[str]]] = None) -> List[float]:
+        if paths is None:
+            paths = [None] * len(texts)
+        return [self.estimate_bytes(text.encode('utf-8'), path) for text, path in zip(texts, paths)]
+
+def calibrate_byte_class(samples: Iterable[Tuple[str, str]], reference: Tokenizer) -> Dict[str, Dict[str, float]]:
+    """
+    Produce a calibration for ByteClassTokenizer from (path, text) samples by scaling each
+    extension's weights so the estimate matches the reference tokenizer's total count.
+    The result can be saved as JSON and passed as --tokenizer byteclass:PATH.
+    """
+    estimator = ByteClassTokenizer()
+    totals = {}
+    for path, text in samples:
+        ext = os.path.splitext(path)[1].lower() or "default"
+        estimated, actual = totals.get(ext, (0, 0))
+        totals[ext] = (estimated + estimator.count(text, path), actual + reference.count(text, path))
+    calibration = {}
+    for ext, (estimated, actual) in totals.items():
+        if estimated:
+            base = estimator.weights_for(None if ext == "default" else "x" + ext)
+            calibration[ext] = {c: round(w * actual / estimated, 4) for c, w in base.items()}
+    return calibration
+
+TOKENIZERS: Dict[str, Callable[[Optional[str]], Tokenizer]] = {}
+
+def register_tokenizer(name: str, factory: Callable[[Optional[str]], Tokenizer]) -> None:
+    """
+    Register a tokenizer backend. factory receives the optional path from the
+    --tokenizer NAME:PATH specification.
+    """
+    TOKENIZERS[name] = factory
+
+def _heuristic_factory(path: Optional[str]) -> Tokenizer:
+    return HeuristicTokenizer()
+
+def _bpe_factory(path: Optional[str]) -> Tokenizer:
+    if not path:
+        raise ValueError("The bpe tokenizer requires a path: --tokenizer bpe:/path/to/vocab-dir")
+    return BPETokenizer(path)
+
+register_tokenizer("heuristic", _heuristic_factory)
+register_tokenizer("bpe", _bpe_factory)
+register_tokenizer("byteclass", ByteClassTokenizer)
+
+def get_tokenizer(spec: Optional[str] = None) -> Tokenizer:
+    """
+    Build a tokenizer from a NAME or NAME:PATH specification. Defaults to the heuristic.
+    Raises ValueError for unknown backends or unusable data files.
+    """
+    if not spec:
+        return HeuristicTokenizer()
+    name, _, path = spec.partition(":")
+    factory = TOKENIZERS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown tokenizer '{name}'. Available: {', '.join(sorted(TOKENIZERS))}")
+    return factory(path or None)
@@ -0,0 +1,366 @@
+"""
+Watch mode for llm-fuse (--watch).
+
+A WatchSession keeps the file list, every file's rendered sections and their token counts
+in memory. It polls the scanned files and their directories for changes (size and mtime
+for files, mtime for directories, which change when entries are added, removed or
+renamed), waits for a burst of changes to settle, and then re-reads only the changed
+files. Only the output files whose chunk groups were touched by the edit are updated, plus
+the main file for its header totals. The file list (and the diagram in the header) is only
+recomputed when a directory or an ignore file changed.
+
+With deduplication on, each file's content digest is kept as well, and after every update
+the files are walked in output order to find the copies of an earlier file. Copies are
+written as a reference section, as a normal run with the Deduplicator writes them. Only
+identical copies are collapsed: near-duplicates depend on every file before them.
+
+Output files are patched in place rather than rebuilt. The session remembers the segments
+(header and rendered sections) it last wrote to each file; segments that kept their length
+are overwritten where they are, and everything from the first segment whose length changed
+is written again and the file truncated. An update therefore costs O(files) bookkeeping plus
+the bytes after the first changed section of each touched file, not the whole output.
+"""
+
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from llm_fuse.dedup import DEDUP_MIN_TOKENS, file_digest, format_dedup_summary, format_reference
+from llm_fuse.ignore import IGNORE_FILE_NAMES
+from llm_fuse.main import format_file_header, format_summary_header, iter_tree_lines
+from llm_fuse.sections import FileRecord, FileSection
+from llm_fuse.tokenizers import HeuristicTokenizer, Tokenizer
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 0.3
+
+# (size, mtime_ns), or None for a path that no longer exists.
+Signature = Optional[Tuple[int, int]]
+# A rendered section: (chunk group, tokens, section bytes as written).
+Rendered = Tuple[int, int, bytes]
+
+def _signature(path: str) -> Signature:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+class WatchSession:
+    """
+    Incrementally maintained aggregation output for one directory.
+    collect returns the current list of file paths; load returns the FileSection records (as
+    produced by iter_file_sections) of the given paths, in order. tree_depth and
+    tree_collapse limit the diagram as in write_output_files. With dedup, copies of an
+    earlier file are replaced by a reference section counted with tokenizer.
+    """
+
+    def __init__(self, base_dir: str, display_base_dir: str, output_path: str,
+                 collect: Callable[[], List[str]], load: Callable[[List[str]], Iterable[FileSection]],
+                 tree_depth: Optional[int] = None, tree_collapse: Optional[int] = None,
+                 dedup: bool = False, tokenizer: Optional[Tokenizer] = None):
+        self.base_dir = base_dir
+        self.display_base_dir = display_base_dir
+        self.output_path = output_path
+        self.collect = collect
+        self.load = load
+        self.tree_depth = tree_depth
+        self.tree_collapse = tree_collapse
+        self.dedup = dedup
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+        self.paths: List[str] = []
+        self.file_signatures: Dict[str, Signature] = {}
+        self.dir_signatures: Dict[str, Signature] = {}
+        # Per file: its rendered sections.
+        self.rendered: Dict[str, List[Rendered]] = {}
+        # Content digests of the files large enough to be collapsed, and for each copy of an
+        # earlier file: (original path, tokens saved, rendered reference section).
+        self.digests: Dict[str, bytes] = {}
+        self.references: Dict[str, Tuple[str, int, Rendered]] = {}
+        # Per chunk group: the segments last written to its output file, in order.
+        self.written: Dict[int, List[bytes]] = {}
+        # Totals of the loaded sections, and of the sections written once copies are collapsed.
+        self.loaded_sections = 0
+        self.loaded_tokens = 0
+        self.section_count = 0
+        self.total_tokens = 0
+        self.saved_tokens = 0
+        self.diagram_lines: List[str] = []
+        base, ext = os.path.splitext(os.path.abspath(output_path))
+        # Our own output files must never be picked up as input.
+        self._output_pattern = re.compile(re.escape(base) + r"(?:_\d+)?" + re.escape(ext) + r"(?:\.tmp)?$")
+
+    def start(self) -> List[str]:
+        """
+        Load every file and write all output files. Returns the output files written.
+        """
+        self._set_paths(self._collect())
+        self._reload(self.paths)
+        self._collapse_duplicates()
+        self._render_diagram()
+        return self._write_groups({1} | {group for sections in self.rendered.values() for group, _, _ in sections})
+
+    def poll(self) -> Tuple[Dict[str, Signature], Dict[str, Signature]]:
+        """
+        Return the current signatures of the files and of the directories whose signature
+        differs from the one recorded when the output was last brought up to date.
+        """
+        changed_dirs = {}
+        for directory, signature in self.dir_signatures.items():
+            current = _signature(directory)
+            if current != signature:
+                changed_dirs[directory] = current
+        changed_files = {}
+        for path in self.paths:
+            current = _signature(path)
+            if current != self.file_signatures.get(path):
+                changed_files[path] = current
+        return changed_files, changed_dirs
+
+    def needs_recollect(self, changed_files: Dict[str, Signature], changed_dirs: Dict[str, Signature]) -> bool:
+        """
+        Decide whether the file list must be collected again: a directory changed (entries
+        were added, removed or renamed), a file disappeared or an ignore file changed.
+        """
+        if changed_dirs:
+            return True
+        return any(signature is None or os.path.basename(path) in IGNORE_FILE_NAMES
+                   for path, signature in changed_files.items())
+
+    def apply(self, changed: Iterable[str], recollect: bool) -> List[str]:
+        """
+        Bring the output up to date after the given files changed, collecting the file list
+        again first if recollect is set. Returns the output files written.
+        """
+        touched = set(changed)
+        if recollect:
+            old_paths = set(self.paths)
+            self._set_paths(self._collect())
+            new_paths = set(self.paths)
+            touched |= new_paths ^ old_paths
+        else:
+            for path in changed:
+                self.file_signatures[path] = _signature(path)
+        affected = {1}
+        had_sections = set()
+        for path in touched:
+            affected |= {group for group, _, _ in self.rendered.get(path, [])}
+            if self.rendered.get(path):
+                had_sections.add(path)
+        self._reload([path for path in self.paths if path in touched])
+        for path in set(self.rendered) - set(self.paths):
+            self._forget(path)
+        # Files that became, or stopped being, a copy of another file are rewritten as well.
+        collapsed = self._collapse_duplicates()
+        for path in touched | collapsed:
+            affected |= {group for group, _, _ in self.rendered.get(path, [])}
+        # The diagram only changes when files gain or lose their sections.
+        if {path for path in touched if self.rendered.get(path)} != had_sections:
+            self._render_diagram()
+        return self._write_groups(affected)
+
+    def run(self, poll_interval: float = DEFAULT_POLL_INTERVAL, debounce: float = DEFAULT_DEBOUNCE,
+            max_updates: Optional[int] = None) -> None:
+        """
+        Poll for changes until interrupted (or until max_updates updates have been applied).
+        Changes are applied once no further change has been seen for debounce seconds.
+        """
+        updates = 0
+        while max_updates is None or updates < max_updates:
+            time.sleep(poll_interval)
+            changes = self.poll()
+            if not changes[0] and not changes[1]:
+                continue
+            # Debounce: wait until two polls debounce seconds apart see the same state.
+            while True:
+                time.sleep(debounce)
+                latest = self.poll()
+                if latest == changes:
+                    break
+                changes = latest
+            changed_files, changed_dirs = changes
+            start = time.perf_counter()
+            written = self.apply(changed_files, self.needs_recollect(changed_files, changed_dirs))
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Updated after changes to {len(changed_files)} files and {len(changed_dirs)} directories in {elapsed:.0f} ms "
+                  f"({self.section_count} sections, {self.total_tokens} tokens); rewrote {len(written)} output files.")
+            updates += 1
+
+    def _collect(self) -> List[str]:
+        return [path for path in self.collect() if not self._output_pattern.match(os.path.abspath(path))]
+
+    def _set_paths(self, paths: List[str]) -> None:
+        self.paths = paths
+        self.file_signatures = {path: _signature(path) for path in paths}
+        directories = {self.base_dir}
+        for path in paths:
+            directory = os.path.dirname(path)
+            while directory not in directories and len(directory) > len(self.base_dir):
+                directories.add(directory)
+                directory = os.path.dirname(directory)
+        self.dir_signatures = {directory: _signature(directory) for directory in directories}
+
+    def _relative(self, path: str) -> str:
+        return "./" + os.path.relpath(path, self.base_dir).replace("\\", "/")
+
+    def _forget(self, path: str) -> None:
+        for _, tokens, _ in self.rendered.pop(path, []):
+            self.loaded_sections -= 1
+            self.loaded_tokens -= tokens
+        self.digests.pop(path, None)
+        self.references.pop(path, None)
+
+    def _reload(self, paths: List[str]) -> None:
+        for path in paths:
+            self._forget(path)
+            self.rendered[path] = []
+        records = {}
+        for section in self.load(paths):
+            relative_path = "./" + section.file.relpath(self.base_dir).replace("\\", "/")
+            text = format_file_header(relative_path, section) + section.content + "\n\n"
+            self.rendered[section.path].append((section.chunk_index, section.tokens, _encode(text)))
+            records.setdefault(section.path, section.file)
+            self.loaded_sections += 1
+            self.loaded_tokens += section.tokens
+        if self.dedup:
+            for path, record in records.items():
+                if sum(tokens for _, tokens, _ in self.rendered[path]) >= DEDUP_MIN_TOKENS:
+                    self.digests[path] = file_digest(record)
+
+    def _collapse_duplicates(self) -> Set[str]:
+        """
+        Find the files whose content is identical to an earlier file in output order, update
+        the written totals, and return the files whose reference was added, removed or
+        changed. References of unchanged copies are reused, so this costs O(files).
+        """
+        references = {}
+        originals: Dict[bytes, str] = {}
+        for path in self.paths:
+            digest = self.digests.get(path)
+            if digest is None:
+                continue
+            original = originals.setdefault(digest, path)
+            if original == path:
+                continue
+            reference = self.references.get(path)
+            if reference is None or reference[0] != original:
+                reference = self._render_reference(path, original)
+            references[path] = reference
+        changed = {path for path in set(references) | set(self.references)
+                   if references.get(path) is not self.references.get(path)}
+        self.references = references
+        self.saved_tokens = sum(saved for _, saved, _ in references.values())
+        self.section_count = self.loaded_sections - sum(len(self.rendered[path]) - 1 for path in references)
+        self.total_tokens = self.loaded_tokens - self.saved_tokens
+        return changed
+
+    def _render_reference(self, path: str, original: str) -> Tuple[str, int, Rendered]:
+        tokens = sum(tokens for _, tokens, _ in self.rendered[path])
+        text = format_reference(f"Identical to {self._relative(original)}", tokens)
+        reference_tokens = self.tokenizer.count(text, path)
+        section = FileSection(FileRecord(path, text), 0, len(text), reference_tokens)
+        rendered = (1, reference_tokens, _encode(format_file_header(self._relative(path), section) + text + "\n\n"))
+        return original, tokens - reference_tokens, rendered
+
+    def _sections(self, path: str) -> List[Rendered]:
+        """
+        Return the sections written for a file: its own, or the reference replacing them.
+        """
+        reference = self.references.get(path)
+        if reference is not None:
+            return [reference[2]]
+        return self.rendered.get(path, [])
+
+    def _render_diagram(self) -> None:
+        relative_paths = [os.path.relpath(path, self.base_dir) for path in self.paths if self.rendered.get(path)]
+        self.diagram_lines = list(iter_tree_lines(relative_paths, self.tree_depth, self.tree_collapse))
+
+    def _group_path(self, group: int) -> str:
+        if group == 1:
+            return self.output_path
+        base, ext = os.path.splitext(self.output_path)
+        return f"{base}_{group}{ext}"
+
+    def _segments(self, group: int) -> List[bytes]:
+        segments = []
+        if group == 1:
+            notes = None
+            if self.references:
+                notes = [format_dedup_summary(len(self.references), self.saved_tokens)]
+            segments.append(_encode(format_summary_header(self.display_base_dir, self.section_count, self.total_tokens,
+                                                          [], diagram_lines=self.diagram_lines, notes=notes)))
+        for file_path in self.paths:
+            for section_group, _, data in self._sections(file_path):
+                if section_group == group:
+                    segments.append(data)
+        return segments
+
+    def _write_groups(self, groups: Set[int]) -> List[str]:
+        """
+        Bring the output file of every given chunk group up to date, and delete those of
+        groups that no longer have any sections. A file is patched in place when it still
+        has the size last written to it, and otherwise replaced atomically.
+        """
+        present = {group for path in self.rendered for group, _, _ in self._sections(path)}
+        written = []
+        for group in sorted(groups):
+            path = self._group_path(group)
+            if group not in present and group != 1:
+                if os.path.exists(path):
+                    os.remove(path)
+                self.written.pop(group, None)
+                continue
+            segments = self._segments(group)
+            if not _patch(path, self.written.get(group), segments):
+                temp_path = path + ".tmp"
+                with open(temp_path, 'wb') as f:
+                    f.writelines(segments)
+                os.replace(temp_path, path)
+            self.written[group] = segments
+            written.append(path)
+        # Writing may have changed the mtime of a watched directory; that is not an edit.
+        output_dir = os.path.dirname(os.path.abspath(self.output_path))
+        if output_dir in self.dir_signatures:
+            self.dir_signatures[output_dir] = _signature(output_dir)
+        return written
+
+def _encode(text: str) -> bytes:
+    """
+    Encode output text as a normal run writes it (UTF-8, platform line endings).
+    """
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode('utf-8')
+
+def _patch(path: str, old: Optional[List[bytes]], new: List[bytes]) -> bool:
+    """
+    Turn the file at path, which holds the old segments, into the new ones: overwrite the
+    changed segments that kept their length, then write everything from the first segment
+    whose length changed and truncate. Returns False, without writing, when the file is
+    missing or its size does not match the old segments (e.g. it was edited by hand).
+    """
+    if old is None:
+        return False
+    try:
+        f = open(path, 'r+b')
+    except OSError:
+        return False
+    with f:
+        if os.fstat(f.fileno()).st_size != sum(len(data) for data in old):
+            return False
+        offset = 0
+        kept = 0
+        for before, after in zip(old, new):
+            if len(before) != len(after):
+                break
+            if before is not after and before != after:
+                f.seek(offset)
+                f.write(after)
+            offset += len(after)
+            kept += 1
+        if kept < len(old) or kept < len(new):
+            f.seek(offset)
+            f.writelines(new[kept:])
+            f.truncate()
+    return True
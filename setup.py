@@ -13,11 +13,19 @@ setup(
             # This creates a command named `llm-fuse` which points to the main() function
             # in the main module of your package (adjust the module path as necessary).
             "llm-fuse=llm_fuse.main:main",
+            "llm-fuse-bench=llm_fuse.bench:main",
+            "llm-fuse-batch=llm_fuse.batch:main",
         ],
     },
     install_requires=[
         # List any dependencies here, for example
     ],
+    extras_require={
+        # Needed for --compress zstd only.
+        "zstd": ["zstandard"],
+        # Development tools: the test suite itself needs nothing beyond the standard library.
+        "dev": ["pyflakes"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
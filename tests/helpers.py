@@ -0,0 +1,13 @@
+"""
+Helpers shared by the test modules.
+"""
+
+import os
+
+def write_file(path, text):
+    """
+    Write text to path, creating its parent directories.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
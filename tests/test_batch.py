@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from llm_fuse.batch import load_manifest, repo_argv, run_batch
+
+from helpers import write_file
+
+def _git(cwd, *args):
+    return subprocess.check_output(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                                   cwd=cwd, text=True)
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def load(self, manifest):
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f)
+        return load_manifest(self.manifest_path)
+
+    def test_defaults_and_overrides(self):
+        jobs = self.load({"args": ["--max-tokens", "100"], "exclude": "tests/", "repos": [
+            "https://example.com/org/api.git",
+            {"url": "https://example.com/org/api", "name": "api-dev", "branch": "dev", "exclude": None,
+             "args": ["--minify"], "output": "api.jsonl"},
+        ]})
+        self.assertEqual([job["name"] for job in jobs], ["api", "api-dev"])
+        self.assertEqual(repo_argv(jobs[0], "out/api"),
+                         ["--repo", "https://example.com/org/api.git", "--output", os.path.join("out/api", "output.txt"),
+                          "--stats-json", os.path.join("out/api", "stats.json"), "--exclude", "tests/",
+                          "--max-tokens", "100"])
+        self.assertEqual(repo_argv(jobs[1], "out/api-dev")[-5:], ["--branch", "dev", "--max-tokens", "100", "--minify"])
+
+    def test_invalid_manifests(self):
+        for manifest in ({"repos": []}, {"repos": [{"branch": "main"}]}, ["a/x.git", "b/x.git"],
+                         {"repos": ["x.git"], "args": ["--output=o.txt"]},
+                         {"repos": [{"url": "x.git", "args": "--minify"}]}):
+            with self.assertRaises(RuntimeError):
+                self.load(manifest)
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.remotes = {}
+        for name in ("alpha", "beta"):
+            source = os.path.join(self.temp_dir.name, "src", name)
+            write_file(os.path.join(source, "app", "main.py"), f"print('{name}')\n")
+            write_file(os.path.join(source, "README.md"), f"# {name}\n")
+            _git(self.temp_dir.name, "init", "-q", source)
+            _git(source, "add", ".")
+            _git(source, "commit", "-q", "-m", "init")
+            if name == "beta":
+                _git(source, "checkout", "-q", "-b", "dev")
+                write_file(os.path.join(source, "dev.py"), "DEV = True\n")
+                _git(source, "add", ".")
+                _git(source, "commit", "-q", "-m", "dev")
+            self.remotes[name] = os.path.join(self.temp_dir.name, f"{name}.git")
+            _git(self.temp_dir.name, "clone", "-q", "--bare", source, self.remotes[name])
+        self.output_dir = os.path.join(self.temp_dir.name, "out")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_one_output_set_per_repository(self):
+        jobs = [
+            {"name": "alpha", "url": "file://" + self.remotes["alpha"], "branch": None, "include": r"\.py$",
+             "exclude": None, "output": "output.txt", "args": []},
+            {"name": "beta", "url": self.remotes["beta"], "branch": "dev", "include": None, "exclude": None,
+             "output": "beta.jsonl", "args": ["--format", "jsonl"]},
+            {"name": "missing", "url": os.path.join(self.temp_dir.name, "missing.git"), "branch": None,
+             "include": None, "exclude": None, "output": "output.txt", "args": []},
+            {"name": "bad-args", "url": self.remotes["alpha"], "branch": None, "include": None, "exclude": None,
+             "output": "output.txt", "args": ["--chunk-overlap", "-1"]},
+        ]
+        results = run_batch(jobs, self.output_dir, max_workers=2, clone_jobs=2)
+        self.assertEqual([(result["name"], result["status"]) for result in results],
+                         [("alpha", "ok"), ("beta", "ok"), ("missing", "failed"), ("bad-args", "failed")])
+
+        with open(os.path.join(self.output_dir, "alpha", "output.txt"), encoding="utf-8") as f:
+            output = f.read()
+        self.assertIn("Base directory: ./alpha\n", output)
+        self.assertIn("print('alpha')", output)
+        self.assertNotIn("# alpha", output)
+        with open(os.path.join(self.output_dir, "beta", "beta.jsonl"), encoding="utf-8") as f:
+            paths = [json.loads(line).get("path") for line in f]
+        self.assertEqual(paths, ["./README.md", "./dev.py", "./app/main.py", None])
+
+        self.assertGreater(results[0]["stats"]["files_examined"], 0)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "beta", "stats.json")))
+        self.assertIn("Error cloning repository", results[2]["error"])
+        self.assertIn("--chunk-overlap", results[3]["error"])
+        with open(os.path.join(self.output_dir, "missing", "log.txt"), encoding="utf-8") as f:
+            self.assertIn("Error cloning repository", f.read())
+        with open(os.path.join(self.output_dir, "batch.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["repos"], results)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from llm_fuse.bench import STAGES, compare_reports, generate_repo, run_scenario
+from llm_fuse.main import collect_files, is_text_file
+from llm_fuse.stats import peak_rss_kb
+
+class TestBench(unittest.TestCase):
+
+    def test_generate_repo_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            summary = generate_repo(first, files=30, mean_size=512, binary_ratio=0.3, depth=3, seed=7)
+            self.assertEqual(summary, generate_repo(second, files=30, mean_size=512, binary_ratio=0.3, depth=3, seed=7))
+            paths = collect_files(first, None, None, git_only=False)
+            self.assertEqual(len(paths), 30)
+            self.assertEqual(sum(1 for path in paths if is_text_file(path)), summary["text_files"])
+            self.assertEqual(sum(os.path.getsize(path) for path in paths), summary["bytes"])
+            self.assertEqual(sorted(os.path.relpath(path, first) for path in paths),
+                             sorted(os.path.relpath(path, second) for path in collect_files(second, None, None, False)))
+
+    def test_run_scenario_reports_every_stage(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            result = run_scenario({"files": 10, "mean_size": 256, "binary_ratio": 0.0, "depth": 2}, work_dir, repeat=1)
+        self.assertEqual(result["files"], 10)
+        self.assertEqual(set(result["stages"]), set(STAGES))
+        self.assertIsNotNone(result["stages"]["process"]["mb_per_second"])
+
+    @unittest.skipIf(peak_rss_kb() is None, "peak RSS is not available on this platform")
+    def test_peak_memory_is_measured_per_scenario(self):
+        # Memory held by the benchmark process itself must not show up in a scenario's peak.
+        ballast = b"x" * (256 * 1024 * 1024)
+        with tempfile.TemporaryDirectory() as work_dir:
+            result = run_scenario({"files": 10, "mean_size": 256, "binary_ratio": 0.0, "depth": 2}, work_dir, repeat=1)
+        self.assertLess(result["peak_rss_kb"], len(ballast) // 1024)
+
+    def test_compare_reports_flags_slower_stages(self):
+        def report(process_seconds):
+            stages = {stage: {"seconds": 1.0} for stage in STAGES}
+            stages["process"] = {"seconds": process_seconds}
+            return {"scenarios": {"small": {"params": {"files": 1}, "stages": stages}}}
+
+        self.assertEqual(compare_reports(report(1.0), report(1.05)), [])
+        regressions = compare_reports(report(1.0), report(1.5))
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("small/process"))
+
+if __name__ == "__main__":
+    unittest.main()
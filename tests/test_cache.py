@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from llm_fuse.cache import FileCache, default_cache_dir
+from llm_fuse.main import process_files
+from llm_fuse.tokenizers import HeuristicTokenizer
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.cache_dir = os.path.join(self.root, ".llm-fuse-cache")
+        self.text_path = os.path.join(self.root, "file.txt")
+        with open(self.text_path, "w") as f:
+            f.write("abcdefghij")
+        self.binary_path = os.path.join(self.root, "file.bin")
+        with open(self.binary_path, "wb") as f:
+            f.write(b"\x00\xFF\x00\xFF")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_unchanged_files_skip_detection_and_counting(self):
+        paths = [self.text_path, self.binary_path]
+        cache = FileCache(self.cache_dir, self.root)
+        first = process_files(paths, max_tokens=1, cache=cache)
+        cache.save()
+
+        cache = FileCache(self.cache_dir, self.root)
+        with mock.patch("llm_fuse.main.classify_bytes") as is_text, \
+                mock.patch.object(HeuristicTokenizer, "count_batch", return_value=[]) as count:
+            second = process_files(paths, max_tokens=1, cache=cache)
+        is_text.assert_not_called()
+        count.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(cache.hits, 2)
+
+    def test_digest_fallback_when_only_mtime_changes(self):
+        cache = FileCache(self.cache_dir, self.root)
+        process_files([self.text_path], cache=cache)
+        cache.save()
+        st = os.stat(self.text_path)
+        os.utime(self.text_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+        cache = FileCache(self.cache_dir, self.root)
+        with mock.patch.object(HeuristicTokenizer, "count_batch", return_value=[]) as count:
+            process_files([self.text_path], cache=cache)
+        count.assert_not_called()
+
+    def test_changed_content_is_recounted(self):
+        cache = FileCache(self.cache_dir, self.root)
+        process_files([self.text_path], cache=cache)
+        cache.save()
+        with open(self.text_path, "w") as f:
+            f.write("abcdefghijklmnop")
+
+        cache = FileCache(self.cache_dir, self.root)
+        files_data, total_tokens = process_files([self.text_path], cache=cache)
+        self.assertEqual(total_tokens, 4)
+        self.assertEqual(cache.hits, 0)
+
+    def test_rebuild_ignores_existing_entries(self):
+        cache = FileCache(self.cache_dir, self.root)
+        process_files([self.text_path], cache=cache)
+        cache.save()
+        cache = FileCache(self.cache_dir, self.root, rebuild=True)
+        self.assertEqual(len(cache), 0)
+
+    def test_eviction_by_age_and_entry_count(self):
+        cache = FileCache(self.cache_dir, self.root, max_entries=1, max_age_seconds=60)
+        st = os.stat(self.text_path)
+        cache.record("old.txt", st, is_text=True)
+        cache.record("older.txt", st, is_text=True)
+        cache.record("new.txt", st, is_text=True)
+        now = time.time()
+        cache._entries["older.txt"]["used"] = now - 3600
+        cache._entries["old.txt"]["used"] = now - 30
+        self.assertEqual(cache.evict(now), 2)
+        self.assertIsNotNone(cache.lookup("new.txt", st))
+
+    def test_eviction_by_total_size(self):
+        cache = FileCache(self.cache_dir, self.root, max_bytes=5000)
+        st = os.stat(self.text_path)
+        now = time.time()
+        for age, name in enumerate(("new", "old", "older")):
+            digest = name * 8
+            cache.record(f"{name}.txt", st, is_text=True, digest=digest)
+            cache._entries[f"{name}.txt"]["used"] = now - age
+            cache.store_text(digest, "minify", "x" * 2000)
+        # A second entry with the newest text shares its size instead of adding to it.
+        cache.record("copy.txt", st, is_text=True, digest="new" * 8)
+        cache._entries["copy.txt"]["used"] = now
+        cache.save()
+        self.assertEqual(sorted(cache._entries), ["copy.txt", "new.txt", "old.txt"])
+        self.assertEqual(sorted(os.listdir(cache.texts_dir)), [f"{'new' * 8}.minify.txt", f"{'old' * 8}.minify.txt"])
+
+    def test_default_directory_is_outside_the_scanned_tree(self):
+        user_cache = os.path.join(self.root, "user-cache")
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": user_cache, "LOCALAPPDATA": user_cache}):
+            cache_dir = default_cache_dir(os.path.join(self.root, "repo"))
+            self.assertEqual(os.path.dirname(cache_dir), os.path.join(user_cache, "llm-fuse"))
+            self.assertEqual(default_cache_dir(os.path.join(self.root, "repo", "")), cache_dir)
+            self.assertNotEqual(default_cache_dir(os.path.join(self.root, "other")), cache_dir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from llm_fuse.main import collect_files, get_changed_files, iter_diff_sections
+
+from helpers import write_file
+
+def _git(cwd, *args):
+    return subprocess.check_output(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                                   cwd=cwd, text=True)
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class TestChangedFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = self.temp_dir.name
+        for name in ("a.py", "b.py", "sub/c.py", "gone.py"):
+            write_file(os.path.join(self.repo, name), f"# {name}\n")
+        _git(self.repo, "init", "-q")
+        _git(self.repo, "add", "-A")
+        _git(self.repo, "commit", "-q", "-m", "first")
+        write_file(os.path.join(self.repo, "b.py"), "# b.py\nprint('committed')\n")
+        _git(self.repo, "commit", "-q", "-am", "second")
+        # Uncommitted changes: a modification, a deletion and an untracked file.
+        write_file(os.path.join(self.repo, "sub", "c.py"), "# sub/c.py\nprint('changed')\n")
+        os.remove(os.path.join(self.repo, "gone.py"))
+        write_file(os.path.join(self.repo, "new.py"), "print('new')\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_changed_only_lists_working_tree_changes(self):
+        self.assertEqual(get_changed_files(self.repo), ["new.py", "sub/c.py"])
+        self.assertEqual(get_changed_files(os.path.join(self.repo, "sub")), ["c.py"])
+
+    def test_since_includes_committed_changes(self):
+        self.assertEqual(get_changed_files(self.repo, "HEAD~1"), ["b.py", "new.py", "sub/c.py"])
+        files = collect_files(self.repo, r"\.py$", r"new", git_only=False, changed_since="HEAD~1")
+        self.assertEqual(files, [os.path.join(self.repo, "b.py"), os.path.join(self.repo, "sub/c.py")])
+
+    def test_unknown_ref_is_an_error(self):
+        self.assertIsNone(get_changed_files(self.repo, "no-such-ref"))
+        with self.assertRaises(RuntimeError):
+            collect_files(self.repo, None, None, git_only=False, changed_since="no-such-ref")
+
+    def test_diff_sections(self):
+        paths = [os.path.join(self.repo, name) for name in ("new.py", "sub/c.py")]
+        sections = list(iter_diff_sections(self.repo, paths))
+        self.assertEqual([section["path"] for section in sections], paths)
+        self.assertIn("+print('new')", sections[0]["content"])
+        self.assertIn("new file mode", sections[0]["content"])
+        self.assertIn("@@ -1 +1,2 @@\n # sub/c.py\n+print('changed')\n", sections[1]["content"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import random
+import unittest
+
+from llm_fuse.chunking import Chunker
+from llm_fuse.tokenizers import ByteClassTokenizer, HeuristicTokenizer, Tokenizer
+
+PYTHON_SOURCE = "".join(
+    f"def function_{i}(value):\n"
+    f"    result = value * {i}\n"
+    f"    return result + {i}\n"
+    "\n"
+    for i in range(12)
+)
+
+C_SOURCE = "".join(
+    f"int function_{i}(int value) {{\n"
+    f"    if (value) {{\n"
+    f"\n"
+    f"        return value * {i};\n"
+    f"    }}\n"
+    f"    return {i};\n"
+    f"}}\n"
+    "\n"
+    for i in range(12)
+)
+
+class RoundingTokenizer(Tokenizer):
+    """
+    Rounds every count, so the counts of lines add up to less than the count of their text.
+    """
+    name = "rounding"
+
+    def count(self, text, path=None):
+        return max(1, round(len(text) / 5)) if text else 0
+
+def _chunks(content, layout):
+    return [content[start:end] for start, end, _ in layout]
+
+class TestChunker(unittest.TestCase):
+
+    def test_python_chunks_start_at_definitions(self):
+        layout = Chunker("syntax").layout(PYTHON_SOURCE, 60, HeuristicTokenizer(), "module.py")
+        chunks = _chunks(PYTHON_SOURCE, layout)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), PYTHON_SOURCE)
+        for chunk, (_, _, tokens) in zip(chunks, layout):
+            self.assertTrue(chunk.startswith("def "))
+            self.assertLessEqual(tokens, 60)
+            self.assertEqual(tokens, HeuristicTokenizer().count(chunk))
+
+    def test_brace_depth_ignores_blank_lines_inside_functions(self):
+        layout = Chunker("syntax").layout(C_SOURCE, 50, HeuristicTokenizer(), "module.c")
+        for chunk in _chunks(C_SOURCE, layout):
+            self.assertTrue(chunk.startswith("int function_"), chunk)
+
+    def test_lines_strategy_never_splits_inside_a_line(self):
+        text = "".join(f"line number {i} with some words\n" for i in range(100))
+        layout = Chunker("lines").layout(text, 50, ByteClassTokenizer(), "notes.txt")
+        for chunk, (_, _, tokens) in zip(_chunks(text, layout), layout):
+            self.assertTrue(chunk.endswith("\n"))
+            self.assertLessEqual(tokens, 50)
+
+    def test_chunks_fit_the_budget_when_line_costs_do_not_add_up(self):
+        rng = random.Random(7)
+        pieces = ["word ", "x", " ", "\n", "\n\n", "(", "é", "def f():\n"]
+        for tokenizer in (ByteClassTokenizer(), RoundingTokenizer()):
+            for _ in range(300):
+                text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 300)))
+                max_tokens = rng.randint(1, 40)
+                layout = Chunker(rng.choice(["lines", "syntax"]), rng.randint(0, 2)).layout(
+                    text, max_tokens, tokenizer, "module.py")
+                self.assertEqual((layout[0][0], layout[-1][1]), (0, len(text)))
+                for chunk, (_, _, tokens) in zip(_chunks(text, layout), layout):
+                    self.assertEqual(tokens, tokenizer.count(chunk, "module.py"))
+                    self.assertLessEqual(tokens, max_tokens)
+
+    def test_overlap_repeats_trailing_lines(self):
+        text = "".join(f"line {i:03d}\n" for i in range(60))
+        layout = Chunker("lines", overlap=2).layout(text, 20, HeuristicTokenizer())
+        chunks = _chunks(text, layout)
+        for previous, following in zip(chunks, chunks[1:]):
+            self.assertEqual(previous.splitlines()[-2:], following.splitlines()[:2])
+
+    def test_overlong_line_is_split_inside(self):
+        layout = Chunker("syntax").layout("abcdefghij", 1, HeuristicTokenizer())
+        self.assertEqual(_chunks("abcdefghij", layout), ["abcd", "efgh", "ij"])
+
+    def test_unknown_strategy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Chunker("sentences")
+
+if __name__ == "__main__":
+    unittest.main()
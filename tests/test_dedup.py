@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from llm_fuse.dedup import Deduplicator, estimate_similarity, minhash_sketch
+from llm_fuse.main import iter_file_sections, write_output_files
+
+from helpers import write_file
+
+MODULE = "".join(f"def handler_{i}(request):\n    return respond(request, status={200 + i})\n\n" for i in range(40))
+
+class TestDedup(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.temp_dir.name, "src")
+        write_file(os.path.join(self.src, "app", "handlers.py"), MODULE)
+        write_file(os.path.join(self.src, "vendor", "handlers.py"), MODULE)
+        write_file(os.path.join(self.src, "vendor", "patched.py"), MODULE.replace("status=210", "status=999"))
+        write_file(os.path.join(self.src, "a.txt"), "tiny\n")
+        write_file(os.path.join(self.src, "b.txt"), "tiny\n")
+        self.paths = [os.path.join(self.src, path) for path in
+                      ("a.txt", "app/handlers.py", "b.txt", "vendor/handlers.py", "vendor/patched.py")]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_identical_files_become_references(self):
+        dedup = Deduplicator(self.src)
+        sections = list(dedup.filter(iter_file_sections(self.paths, max_tokens=200)))
+        contents = {section.file.relpath(self.src).replace("\\", "/"): section.content for section in sections}
+        self.assertEqual(contents["b.txt"], "tiny\n")
+        self.assertTrue(contents["vendor/handlers.py"].startswith("[Identical to ./app/handlers.py; "))
+        self.assertIn("def handler_39", contents["vendor/patched.py"])
+        self.assertEqual(dedup.duplicates, 1)
+        self.assertEqual(dedup.near_duplicates, 0)
+        full_tokens = sum(section.tokens for section in iter_file_sections(self.paths[3:4], max_tokens=200))
+        reference, = [section for section in sections if section.path == self.paths[3]]
+        self.assertEqual(dedup.saved_tokens, full_tokens - reference.tokens)
+
+    def test_near_duplicates_only_when_enabled(self):
+        dedup = Deduplicator(self.src, near_threshold=0.8)
+        sections = list(dedup.filter(iter_file_sections(self.paths)))
+        patched, = [section for section in sections if section.path == self.paths[4]]
+        self.assertRegex(patched.content, r"^\[Nearly identical to \./app/handlers\.py \(about \d+% similar\); ")
+        self.assertEqual((dedup.duplicates, dedup.near_duplicates), (1, 1))
+        self.assertEqual(dedup.summary().split(" (")[0], "Duplicate files collapsed: 1 identical, 1 near-identical")
+
+    def test_summary_in_output_header(self):
+        output_path = os.path.join(self.temp_dir.name, "output.txt")
+        dedup = Deduplicator(self.src)
+        section_count, total_tokens = write_output_files(iter_file_sections(self.paths), None, output_path,
+                                                         self.src, dedup=dedup)
+        self.assertEqual(section_count, 5)
+        with open(output_path, encoding="utf-8") as f:
+            output = f.read()
+        self.assertIn(f"Total approximate tokens: {total_tokens}\n{dedup.summary()}\n\nFile System Diagram:", output)
+        self.assertEqual(output.count("def handler_0"), 2)
+        write_output_files(iter_file_sections(self.paths), None, output_path, self.src)
+        with open(output_path, encoding="utf-8") as f:
+            self.assertNotIn("Duplicate files collapsed", f.read())
+
+    def test_near_duplicates_independent_of_hash_seed(self):
+        lines = [f"value_{i} = compute({i}, {i * 7})" for i in range(200)]
+        write_file(os.path.join(self.src, "near", "a.py"), "\n".join(lines) + "\n")
+        for i in range(0, 200, 29):
+            lines[i] = f"value_{i} = changed({i})"
+        write_file(os.path.join(self.src, "near", "b.py"), "\n".join(lines) + "\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        outputs = []
+        for seed in ("1", "5"):
+            output_path = os.path.join(self.temp_dir.name, f"output-{seed}.txt")
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=root)
+            subprocess.run([sys.executable, "-m", "llm_fuse.main", os.path.join(self.src, "near"), "--no-cache",
+                            "--near-duplicates", "--near-duplicate-threshold", "0.8", "--output", output_path],
+                           env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(output_path, "rb") as f:
+                outputs.append(f.read())
+        self.assertIn(b"[Nearly identical to ./a.py", outputs[0])
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_minhash_similarity(self):
+        sketch = minhash_sketch(MODULE)
+        self.assertEqual(sketch, sorted(sketch))
+        self.assertEqual(len(sketch), 64)
+        self.assertEqual(estimate_similarity(sketch, minhash_sketch("  " + MODULE.replace("\n", "\n\n"))), 1.0)
+        self.assertEqual(estimate_similarity(sketch, minhash_sketch("unrelated\ntext\nhere\n")), 0.0)
+        self.assertEqual(minhash_sketch("\n\n"), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from llm_fuse.formats import iter_json_string, load_index, read_indexed_section, zstandard
+from llm_fuse.main import iter_file_sections, update_output_files, write_output_files
+
+from helpers import write_file
+
+class TestFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.temp_dir.name, "src")
+        self.files = {
+            "a.py": "print('a')\n",
+            "big.txt": "".join(f"line {i} \"quoted\" ünïcode\n" for i in range(100)),
+            "sub/c.md": "# Title\n",
+        }
+        for name, text in self.files.items():
+            write_file(os.path.join(self.src, name), text)
+        self.paths = [os.path.join(self.src, name) for name in sorted(self.files)]
+        self.out_dir = os.path.join(self.temp_dir.name, "out")
+        os.makedirs(self.out_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_all_sections(self, index_path):
+        index = load_index(index_path)
+        contents = {}
+        for entry in index["sections"]:
+            contents.setdefault(entry["path"], []).append(read_indexed_section(index_path, entry, index))
+        return {path[2:]: "".join(chunks) for path, chunks in contents.items()}
+
+    def test_text_index_matches_plain_output(self):
+        plain_path = os.path.join(self.out_dir, "plain.txt")
+        indexed_path = os.path.join(self.out_dir, "indexed.txt")
+        write_output_files(iter_file_sections(self.paths, max_tokens=100), None, plain_path, self.src)
+        write_output_files(iter_file_sections(self.paths, max_tokens=100), None, indexed_path, self.src, index=True)
+        for name in sorted(os.listdir(self.out_dir)):
+            if name.startswith("plain"):
+                with open(os.path.join(self.out_dir, name), "rb") as plain, \
+                        open(os.path.join(self.out_dir, name.replace("plain", "indexed")), "rb") as indexed:
+                    self.assertEqual(plain.read(), indexed.read())
+        index_path = os.path.join(self.out_dir, "indexed.index.json")
+        self.assertEqual(self.read_all_sections(index_path), self.files)
+        entry = load_index(index_path)["sections"][1]
+        with open(os.path.join(self.out_dir, entry["file"]), "rb") as f:
+            f.seek(entry["offset"])
+            self.assertTrue(f.read(entry["length"]).startswith(b"-----"))
+
+    def test_gzip_jsonl_frames(self):
+        output_path = os.path.join(self.out_dir, "out.jsonl")
+        section_count, total_tokens = write_output_files(iter_file_sections(self.paths, max_tokens=100), None,
+                                                         output_path, self.src, output_format="jsonl",
+                                                         compression="gzip", index=True)
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ["out.index.json", "out.jsonl.gz"])
+        with gzip.open(output_path + ".gz", "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), section_count + 1)
+        self.assertEqual(records[0], {"type": "section", "path": "./a.py", "chunk_index": 1, "total_chunks": 1,
+                                      "tokens": records[0]["tokens"], "content": "print('a')\n"})
+        self.assertEqual(records[-1]["type"], "summary")
+        self.assertEqual(records[-1]["total_tokens"], total_tokens)
+        self.assertEqual(records[-1]["files"], ["./a.py", "./big.txt", "./sub/c.md"])
+        self.assertEqual(self.read_all_sections(os.path.join(self.out_dir, "out.index.json")), self.files)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_frames(self):
+        output_path = os.path.join(self.out_dir, "out.txt")
+        write_output_files(iter_file_sections(self.paths), None, output_path, self.src, compression="zstd", index=True)
+        self.assertEqual(self.read_all_sections(os.path.join(self.out_dir, "out.index.json")), self.files)
+
+    def test_update_replaces_and_appends_sections(self):
+        output_path = os.path.join(self.out_dir, "out.jsonl")
+        write_output_files(iter_file_sections(self.paths, max_tokens=100), None, output_path, self.src,
+                           output_format="jsonl", index=True)
+        index_path = os.path.join(self.out_dir, "out.index.json")
+        size = os.path.getsize(output_path)
+        self.files["a.py"] = "print('changed')\n"
+        self.files["d.py"] = "print('new')\n"
+        for name in ("a.py", "d.py"):
+            write_file(os.path.join(self.src, name), self.files[name])
+        changed = [os.path.join(self.src, name) for name in ("a.py", "d.py")]
+        section_count, total_tokens = update_output_files(iter_file_sections(changed), output_path, self.src)
+        self.assertEqual(section_count, 2)
+        self.assertGreater(os.path.getsize(output_path), size)
+        index = load_index(index_path)
+        self.assertEqual([entry["path"] for entry in index["sections"]][:2], ["./a.py", "./big.txt"])
+        self.assertEqual(index["sections"][-1]["path"], "./d.py")
+        self.assertEqual(total_tokens, sum(entry["tokens"] for entry in index["sections"]))
+        self.assertEqual(self.read_all_sections(index_path), self.files)
+        # Replacing the large file leaves more dead bytes than live ones, so the output is compacted.
+        self.files["big.txt"] = "short\n"
+        write_file(os.path.join(self.src, "big.txt"), self.files["big.txt"])
+        update_output_files(iter_file_sections([os.path.join(self.src, "big.txt")]), output_path, self.src)
+        index = load_index(index_path)
+        self.assertEqual(index["files"]["out.jsonl"], {"size": os.path.getsize(output_path), "dead_bytes": 0})
+        with open(output_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record["type"] for record in records], ["section"] * 4 + ["summary"])
+        self.assertEqual(self.read_all_sections(index_path), self.files)
+
+    def test_update_drops_deleted_files(self):
+        output_path = os.path.join(self.out_dir, "out.jsonl")
+        write_output_files(iter_file_sections(self.paths, max_tokens=100), None, output_path, self.src,
+                           output_format="jsonl", index=True)
+        index_path = os.path.join(self.out_dir, "out.index.json")
+        os.remove(os.path.join(self.src, "sub", "c.md"))
+        del self.files["sub/c.md"]
+        remaining = [os.path.join(self.src, name) for name in sorted(self.files)]
+        # An update of some files keeps the others, deleted or not.
+        update_output_files(iter_file_sections(remaining[:1]), output_path, self.src)
+        self.assertIn("./sub/c.md", [entry["path"] for entry in load_index(index_path)["sections"]])
+        section_count, total_tokens = update_output_files(iter_file_sections(remaining[:1]), output_path, self.src,
+                                                          drop_missing=True)
+        index = load_index(index_path)
+        self.assertNotIn("./sub/c.md", [entry["path"] for entry in index["sections"]])
+        self.assertEqual(total_tokens, sum(entry["tokens"] for entry in index["sections"]))
+        self.assertEqual(self.read_all_sections(index_path), self.files)
+        with open(output_path, encoding="utf-8") as f:
+            summary = [json.loads(line) for line in f][-1]
+        self.assertEqual(summary["files"], ["./a.py", "./big.txt"])
+
+    def test_update_requires_jsonl_index(self):
+        output_path = os.path.join(self.out_dir, "out.txt")
+        with self.assertRaises(RuntimeError):
+            update_output_files(iter_file_sections(self.paths), output_path, self.src)
+        write_output_files(iter_file_sections(self.paths), None, output_path, self.src, index=True)
+        with self.assertRaises(RuntimeError):
+            update_output_files(iter_file_sections(self.paths), output_path, self.src)
+
+    def test_json_string_pieces(self):
+        text = "a\"b\\\né "
+        self.assertEqual(json.loads("".join(iter_json_string([text[:3], text[3:]]))), text)
+
+if __name__ == "__main__":
+    unittest.main()
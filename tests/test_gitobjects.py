@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from collections import Counter
+
+from llm_fuse.gitobjects import iter_blobs, list_git_tree
+from llm_fuse.main import collect_git_blobs, iter_git_sections, process_files
+
+def _git(cwd, *args):
+    return subprocess.check_output(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                                   cwd=cwd, text=True)
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class TestGitObjects(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = self.temp_dir.name
+        files = {
+            "README.md": "# Title\n",
+            "src/app.py": "def main():\n    return 1\n" * 20,
+            "src/data.bin": "\x00\x01binary",
+            "big.txt": "x" * 5000,
+        }
+        for rel_path, text in files.items():
+            path = os.path.join(self.repo, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", newline="") as f:
+                f.write(text)
+        _git(self.repo, "init", "-q")
+        _git(self.repo, "add", "-A")
+        _git(self.repo, "commit", "-q", "-m", "initial")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_list_git_tree_reports_sizes(self):
+        entries = {path: size for path, _, size in list_git_tree(self.repo, "HEAD")}
+        self.assertEqual(entries, {"README.md": 8, "big.txt": 5000, "src/app.py": 500, "src/data.bin": 8})
+        with self.assertRaises(RuntimeError):
+            list_git_tree(self.repo, "no-such-ref")
+
+    def test_iter_blobs_reads_in_order(self):
+        entries = list_git_tree(self.repo, "HEAD")
+        missing = "0" * 40
+        oids = [entries[1][1], missing, entries[0][1]]
+        blobs = list(iter_blobs(self.repo, oids))
+        self.assertEqual([oid for oid, _ in blobs], oids)
+        self.assertEqual(blobs[0][1], b"x" * 5000)
+        self.assertIsNone(blobs[1][1])
+        self.assertEqual(blobs[2][1], b"# Title\n")
+
+    def test_sections_come_from_the_commit_not_the_working_tree(self):
+        app_path = os.path.join(self.repo, "src", "app.py")
+        expected, _ = process_files([os.path.join(self.repo, "README.md"), app_path], max_tokens=40)
+        with open(app_path, "a") as f:
+            f.write("uncommitted change\n")
+        entries = collect_git_blobs(self.repo, "HEAD", None, r"big\.txt$")
+        sections = list(iter_git_sections(self.repo, entries, max_tokens=40))
+        self.assertEqual(sections, expected)
+
+    def test_large_and_binary_blobs_are_skipped(self):
+        skip_counts = Counter()
+        entries = collect_git_blobs(self.repo, "HEAD", None, None)
+        sections = list(iter_git_sections(self.repo, entries, skip_counts=skip_counts, max_blob_size=4096))
+        self.assertEqual(sorted(os.path.basename(s["path"]) for s in sections), ["README.md", "app.py"])
+        self.assertEqual(skip_counts["too-large"], 1)
+        self.assertEqual(sum(skip_counts.values()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
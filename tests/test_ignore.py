@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from llm_fuse.ignore import IgnoreMatcher, compile_ignore_pattern, match_rules
+from llm_fuse.main import collect_files
+
+def _rules(*lines):
+    return [rule for rule in (compile_ignore_pattern(line) for line in lines) if rule is not None]
+
+class TestIgnorePatterns(unittest.TestCase):
+
+    def test_unanchored_pattern_matches_at_any_depth(self):
+        rules = _rules("*.log")
+        self.assertTrue(match_rules(rules, "debug.log", False))
+        self.assertTrue(match_rules(rules, "a/b/debug.log", False))
+        self.assertIsNone(match_rules(rules, "debug.log.txt", False))
+
+    def test_anchored_and_directory_only_patterns(self):
+        rules = _rules("/build", "docs/*.md", "cache/")
+        self.assertTrue(match_rules(rules, "build", True))
+        self.assertIsNone(match_rules(rules, "src/build", True))
+        self.assertTrue(match_rules(rules, "docs/a.md", False))
+        self.assertIsNone(match_rules(rules, "docs/sub/a.md", False))
+        self.assertTrue(match_rules(rules, "src/cache", True))
+        self.assertIsNone(match_rules(rules, "src/cache", False))
+
+    def test_double_star_and_negation(self):
+        rules = _rules("**/generated/**", "*.txt", "!keep.txt", "# comment", "")
+        self.assertTrue(match_rules(rules, "a/generated/x.py", False))
+        self.assertTrue(match_rules(rules, "generated/x.py", False))
+        self.assertTrue(match_rules(rules, "notes.txt", False))
+        self.assertFalse(match_rules(rules, "dir/keep.txt", False))
+
+    def test_deeper_scopes_take_precedence(self):
+        matcher = IgnoreMatcher().child("", _rules("*.txt")).child("sub", _rules("!special.txt"))
+        self.assertTrue(matcher.is_ignored("sub/other.txt", False))
+        self.assertFalse(matcher.is_ignored("sub/special.txt", False))
+        self.assertTrue(matcher.is_ignored("special.txt", False))
+
+class TestCollectFilesWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        for rel_path in ("main.py", "notes.log", "node_modules/pkg/index.js", "src/app.py",
+                         "src/gen/out.py", "src/keep.log", ".git/config"):
+            path = os.path.join(self.root, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("x")
+        with open(os.path.join(self.root, ".gitignore"), "w") as f:
+            f.write("*.log\nnode_modules/\n")
+        with open(os.path.join(self.root, "src", ".llmfuseignore"), "w") as f:
+            f.write("gen/\n!keep.log\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _relative(self, paths):
+        return sorted(os.path.relpath(path, self.root).replace(os.sep, "/") for path in paths)
+
+    def test_ignore_files_are_honoured(self):
+        files = collect_files(self.root, None, None, git_only=False)
+        self.assertEqual(self._relative(files),
+                         [".gitignore", "main.py", "src/.llmfuseignore", "src/app.py", "src/keep.log"])
+
+    def test_ignore_files_can_be_disabled(self):
+        files = collect_files(self.root, None, None, git_only=False, use_ignore_files=False)
+        self.assertIn("node_modules/pkg/index.js", self._relative(files))
+        self.assertIn(".git/config", self._relative(files))
+
+    def test_excluded_directories_are_not_descended_into(self):
+        scanned = []
+        real_scandir = os.scandir
+
+        def recording_scandir(path):
+            scanned.append(os.path.relpath(path, self.root))
+            return real_scandir(path)
+
+        with mock.patch("llm_fuse.main.os.scandir", side_effect=recording_scandir):
+            files = collect_files(self.root, r"\.py$", "node_modules|/gen/", git_only=False, use_ignore_files=False)
+        self.assertEqual(self._relative(files), ["main.py", "src/app.py"])
+        self.assertNotIn(os.path.join("node_modules"), scanned)
+        self.assertNotIn(os.path.join("src", "gen"), scanned)
+
+if __name__ == "__main__":
+    unittest.main()
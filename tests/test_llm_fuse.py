@@ -1,16 +1,26 @@
+import contextlib
+import io
 import os
 import tempfile
 import unittest
 import math
 import shutil
+import json
+from unittest import mock
 
 # Import functions from your module. Adjust the import if your module path differs.
+from collections import Counter
+
+from llm_fuse.chunking import Chunker
 from llm_fuse.main import (
     approximate_token_count,
     is_text_file,
     collect_files,
     process_files,
+    iter_file_sections,
+    classify_bytes,
     build_tree_from_paths,
+    iter_tree_lines,
     render_tree,
     write_output_files
 )
@@ -42,6 +52,30 @@ class TestLLMFuse(unittest.TestCase):
         finally:
             os.remove(filename)
 
+    def test_classify_bytes(self):
+        self.assertIsNone(classify_bytes(b"plain ascii\n"))
+        self.assertIsNone(classify_bytes("caf\u00e9 na\u00efve\n".encode("latin-1")))
+        self.assertIsNone(classify_bytes("\u6c49\u5b57".encode("utf-8") * 100))
+        self.assertEqual(classify_bytes(b"\x89PNG\r\n\x1a\n" + b"a" * 100), "magic-number")
+        self.assertEqual(classify_bytes(b"a" * 5000 + b"\x00"), "nul-bytes")
+        self.assertEqual(classify_bytes(b"\x01\x02\x03text"), "control-chars")
+        self.assertEqual(classify_bytes(bytes(range(128, 256)) * 4), "non-text-encoding")
+
+    def test_iter_file_sections_counts_skipped_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            latin1_path = os.path.join(temp_dir, "legacy.c")
+            with open(latin1_path, "wb") as f:
+                f.write("/* caf\u00e9 */\r\n".encode("latin-1"))
+            binary_path = os.path.join(temp_dir, "data.bin")
+            with open(binary_path, "wb") as f:
+                f.write(b"\x00\xFF\x00\xFF")
+            # Known binary extensions are skipped without opening, so the file need not exist.
+            image_path = os.path.join(temp_dir, "missing.png")
+            skip_counts = Counter()
+            sections = list(iter_file_sections([latin1_path, binary_path, image_path], skip_counts=skip_counts))
+            self.assertEqual([section["content"] for section in sections], ["/* caf\u00e9 */\n"])
+            self.assertEqual(skip_counts, Counter({"nul-bytes": 1, "binary-extension": 1}))
+
     def test_collect_files_with_filters(self):
         # Create a temporary directory with multiple files.
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -56,6 +90,22 @@ class TestLLMFuse(unittest.TestCase):
             self.assertIn(file_txt, files)
             self.assertNotIn(file_log, files)
 
+    def test_collect_files_prunes_only_prefix_excludes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ("a.py", "b.py", "c.txt", os.path.join("src", "d.py"), os.path.join("build", "e.py")):
+                os.makedirs(os.path.dirname(os.path.join(temp_dir, name)), exist_ok=True)
+                with open(os.path.join(temp_dir, name), "w") as f:
+                    f.write("content")
+
+            def names(exclude_regex):
+                files = collect_files(temp_dir, include_regex=None, exclude_regex=exclude_regex, git_only=False)
+                return sorted(os.path.relpath(path, temp_dir).replace(os.sep, "/") for path in files)
+
+            # A lookahead or an end anchor can match a directory but not the files in it.
+            self.assertEqual(names(r"^(?!.*\.py$)"), ["a.py", "b.py", "build/e.py", "src/d.py"])
+            self.assertEqual(names(r"src/$"), ["a.py", "b.py", "build/e.py", "c.txt", "src/d.py"])
+            self.assertEqual(names(r"build/"), ["a.py", "b.py", "c.txt", "src/d.py"])
+
     def test_process_files_without_chunking(self):
         # Create a temporary file that doesn't require chunking.
         with tempfile.NamedTemporaryFile(mode="w", delete=False) as tf:
@@ -108,6 +158,33 @@ class TestLLMFuse(unittest.TestCase):
         self.assertTrue(any("dir2" in line for line in lines))
         self.assertTrue(any("file3.txt" in line for line in lines))
 
+    def test_iter_tree_lines_matches_render_tree(self):
+        paths = ["src/b.py", "src/a.py", "README.md", "src/lib/x.py", "docs/guide.md", "src/a.py",
+                 "Makefile", "src/lib/deep/y.py", "src/Lib2/z.py"]
+        paths = [path.replace("/", os.sep) for path in paths]
+        expected = render_tree(build_tree_from_paths(paths))
+        self.assertEqual(list(iter_tree_lines(paths)), expected)
+        self.assertEqual(list(iter_tree_lines(reversed(paths))), expected)
+        self.assertEqual(list(iter_tree_lines([])), [])
+
+    def test_iter_tree_lines_depth_and_collapse(self):
+        paths = [os.path.join("src", f"f{i}.py") for i in range(5)]
+        paths += [os.path.join("src", "lib", "deep", "x.py"), os.path.join("src", "lib", "y.py"), "README.md"]
+        self.assertEqual(list(iter_tree_lines(paths, max_depth=2, collapse=2)), [
+            "├── src",
+            "│   ├── lib",
+            "│   │   └── … 2 files",
+            "│   ├── f0.py",
+            "│   ├── f1.py",
+            "│   └── … 3 more files",
+            "└── README.md",
+        ])
+        self.assertEqual(list(iter_tree_lines(paths, max_depth=1)), [
+            "├── src",
+            "│   └── … 7 files",
+            "└── README.md",
+        ])
+
     def test_write_output_files(self):
         # Create a dummy files_data list.
         files_data = [
@@ -127,5 +204,143 @@ class TestLLMFuse(unittest.TestCase):
             self.assertIn("file1.txt", content)
             self.assertIn("file2.txt", content)
 
+    def test_write_output_files_streaming(self):
+        # Sections produced lazily by iter_file_sections are written without a precomputed total.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name, text in (("a.txt", "abcdefghij"), ("b.txt", "abcd")):
+                with open(os.path.join(temp_dir, name), "w") as f:
+                    f.write(text)
+            paths = [os.path.join(temp_dir, "a.txt"), os.path.join(temp_dir, "b.txt")]
+            output_path = os.path.join(temp_dir, "out", "output.txt")
+            os.makedirs(os.path.dirname(output_path))
+            sections = iter_file_sections(paths, max_tokens=2)
+            section_count, total_tokens = write_output_files(sections, None, output_path, temp_dir, temp_dir)
+            # a.txt is split into "abcdefgh" and "ij"; b.txt fits in one section.
+            self.assertEqual(section_count, 3)
+            self.assertEqual(total_tokens, 2 + 1 + 1)
+            with open(output_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            self.assertIn("Total files (or chunks) processed: 3", content)
+            self.assertIn("Total approximate tokens: 4", content)
+            self.assertTrue(content.index("File System Diagram:") < content.index("File: ./a.txt"))
+            with open(os.path.join(temp_dir, "out", "output_2.txt"), "r", encoding="utf-8") as f:
+                self.assertIn("File: ./a.txt (Chunk 2 of 2)\nApprox. tokens: 1\n", f.read())
+            self.assertEqual(sorted(os.listdir(os.path.dirname(output_path))), ["output.txt", "output_2.txt"])
+
+    def test_process_files_parallel_matches_serial(self):
+        # A worker pool must yield exactly the same sections, in the same order, as the serial path.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for i in range(20):
+                path = os.path.join(temp_dir, f"file{i}.txt")
+                with open(path, "w") as f:
+                    f.write("x" * (i * 3))
+                paths.append(path)
+            binary_path = os.path.join(temp_dir, "blob.bin")
+            with open(binary_path, "wb") as f:
+                f.write(b"\x00\xFF\x00\xFF")
+            paths.insert(5, binary_path)
+            serial = process_files(paths, max_tokens=4)
+            parallel = process_files(paths, max_tokens=4, jobs=4)
+            self.assertEqual(serial, parallel)
+
+    def test_write_output_files_packs_sections_into_bins(self):
+        # Each section costs its tokens plus 34 tokens of separator block.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files_data = [
+                {"path": os.path.join(temp_dir, "a.txt"), "content": "a" * 160, "tokens": 40},
+                {"path": os.path.join(temp_dir, "b.txt"), "content": "b" * 200, "tokens": 50},
+                {"path": os.path.join(temp_dir, "c.txt"), "content": "c" * 40, "tokens": 10},
+                {"path": os.path.join(temp_dir, "d.txt"), "content": "d" * 120, "tokens": 30},
+            ]
+            output_path = os.path.join(temp_dir, "output.txt")
+            write_output_files(files_data, None, output_path, temp_dir, temp_dir, pack_tokens=150)
+            with open(os.path.join(temp_dir, "output.manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            placement = {section["path"]: entry["file"]
+                         for entry in manifest["files"] for section in entry["sections"]}
+            # b.txt does not fit next to a.txt, but the smaller c.txt does (first fit).
+            self.assertEqual(placement, {"./a.txt": "output.txt", "./b.txt": "output_2.txt",
+                                         "./c.txt": "output.txt", "./d.txt": "output_2.txt"})
+            for entry in manifest["files"]:
+                self.assertLessEqual(entry["section_tokens"], 150)
+            with open(output_path, encoding="utf-8") as f:
+                content = f.read()
+            self.assertIn("Total files (or chunks) processed: 4", content)
+            self.assertLess(content.index("File: ./a.txt"), content.index("File: ./c.txt"))
+
+    def test_write_output_files_reports_the_missing_output_directory(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files_data = [{"path": os.path.join(temp_dir, "a.txt"), "content": "a", "tokens": 1}]
+            output_path = os.path.join(temp_dir, "missing", "output.txt")
+            for index in (False, True):
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout), self.assertRaises(SystemExit):
+                    write_output_files(files_data, None, output_path, temp_dir, index=index)
+                self.assertIn(f"No such file or directory: '{output_path}'", stdout.getvalue())
+
+    def test_large_files_are_mapped_and_copied_verbatim(self):
+        # Files above the mmap threshold are chunked at line ends on the raw bytes and their
+        # byte ranges are copied into the output unchanged.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text = "".join(f"line {i} caf\u00e9\n" for i in range(200))
+            big_path = os.path.join(temp_dir, "big.log")
+            with open(big_path, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            sections = list(iter_file_sections([big_path], max_tokens=100, mmap_threshold=1024))
+            self.assertGreater(len(sections), 1)
+            with open(big_path, "rb") as f:
+                data = f.read()
+            pieces = [data[s["content_range"][0]:s["content_range"][1]] for s in sections]
+            self.assertEqual(b"".join(pieces), data)
+            for piece, section in zip(pieces, sections):
+                self.assertNotIn("content", section)
+                self.assertTrue(piece.endswith(b"\n"))
+                self.assertLessEqual(section["tokens"], 100)
+                self.assertEqual(section["tokens"], approximate_token_count(piece.decode("utf-8")))
+            output_path = os.path.join(temp_dir, "output.txt")
+            write_output_files(iter_file_sections([big_path], mmap_threshold=1024), None, output_path,
+                               temp_dir, temp_dir)
+            with open(output_path, "rb") as f:
+                self.assertIn(data + b"\n\n", f.read())
+
+    def test_large_files_are_chunked_like_the_regular_path(self):
+        # Mapped files go through the same chunker, segment by segment: small segments force
+        # several restarts, and the layout still matches the one of the decoded file.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = {
+                "big.py": "".join(f"def f{i}(x):\n    return x + {i}  # café\n\n" for i in range(300)),
+                "big.c": "".join(f"int f{i}(int x) {{\n    if (x) {{\n        return {i};\n    }}\n"
+                                 f"    return 0;\n}}\n" for i in range(300)),
+                "big.log": "".join(f"line {i} café\n" for i in range(1000)),
+            }
+            for name, text in files.items():
+                with open(os.path.join(temp_dir, name), "w", encoding="utf-8", newline="") as f:
+                    f.write(text)
+            paths = [os.path.join(temp_dir, name) for name in sorted(files)]
+            with mock.patch("llm_fuse.chunking.MAPPED_SEGMENT_BYTES", 2048):
+                for chunker in (Chunker(), Chunker("lines", overlap=2), Chunker("fixed")):
+                    for max_tokens in (None, 20, 100):
+                        regular = list(iter_file_sections(paths, max_tokens=max_tokens, chunker=chunker))
+                        mapped = list(iter_file_sections(paths, max_tokens=max_tokens, chunker=chunker,
+                                                         mmap_threshold=1024))
+                        self.assertEqual(len(mapped), len(regular))
+                        for mapped_section, section in zip(mapped, regular):
+                            self.assertIn("content_range", mapped_section)
+                            with open(mapped_section["path"], "rb") as f:
+                                f.seek(mapped_section["content_range"][0])
+                                content = f.read(mapped_section["content_range"][1]
+                                                 - mapped_section["content_range"][0]).decode("utf-8")
+                            self.assertEqual((content, mapped_section["tokens"]),
+                                             (section["content"], section["tokens"]))
+
+    def test_large_files_with_carriage_returns_use_the_regular_path(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "dos.txt")
+            with open(path, "wb") as f:
+                f.write(b"line\r\n" * 500)
+            mapped = list(iter_file_sections([path], max_tokens=100, mmap_threshold=1024))
+            self.assertEqual(mapped, process_files([path], max_tokens=100)[0])
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+import base64
+import os
+import tempfile
+import unittest
+
+from llm_fuse.cache import FileCache
+from llm_fuse.main import iter_file_sections
+from llm_fuse.minify import DATA_KEEP_LINES, Minifier
+
+from helpers import write_file
+
+PYTHON_SOURCE = '''#!/usr/bin/env python3
+"""Module docstring."""
+import os  # trailing comment
+
+
+class Handler:
+    """Only a docstring."""
+
+def handle(request):
+    """
+    Multi-line docstring.
+    """
+    # A comment line.
+    if request:
+        return {"path": request,
+                "hash": "#not a comment"}
+    return None
+'''
+
+PYTHON_MINIFIED = '''#!/usr/bin/env python3
+import os
+class Handler:
+ ...
+def handle(request):
+ if request:
+  return {"path": request,
+   "hash": "#not a comment"}
+ return None
+'''
+
+class TestMinify(unittest.TestCase):
+
+    def setUp(self):
+        self.minifier = Minifier()
+
+    def test_python_comments_and_docstrings(self):
+        self.assertEqual(self.minifier.minify(PYTHON_SOURCE, "app.py"), PYTHON_MINIFIED)
+
+    def test_c_like_comments_and_indentation(self):
+        source = ('/* header */\nfunction f(a) {\n        // note\n        const url = "http://x";  /* inline */\n'
+                  '        return a;\n}\n')
+        self.assertEqual(self.minifier.minify(source, "f.js"),
+                         'function f(a) {\n const url = "http://x";\n return a;\n}\n')
+
+    def test_lockfile_preview(self):
+        lockfile = "".join(f'"package-{i}": "1.0.{i}"\n' for i in range(5000))
+        minified = self.minifier.minify(lockfile, "package-lock.json")
+        self.assertLess(len(minified), 3000)
+        self.assertTrue(minified.startswith('"package-0"'))
+        self.assertTrue(minified.endswith('"package-4999": "1.0.4999"\n'))
+
+    def test_base64_and_data_elision(self):
+        blob = base64.b64encode(bytes(range(256))).decode("ascii")
+        minified = self.minifier.minify(f"IMAGE = '{blob}'\n", "assets.py")
+        self.assertNotIn(blob, minified)
+        self.assertTrue(minified.startswith("IMAGE = '"))
+        table = "".join(f"    {i}, {i * 3}, 0x{i:02x},\n" for i in range(50))
+        minified = self.minifier.minify(f"TABLE = [\n{table}]\n", "table.py")
+        self.assertEqual(minified.count("0x"), DATA_KEEP_LINES)
+        self.assertTrue(minified.endswith("]\n"))
+
+    def test_sections_count_minified_text(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "src", "app.py")
+            write_file(path, PYTHON_SOURCE)
+            section, = iter_file_sections([path], minifier=self.minifier)
+            self.assertEqual(section.content, PYTHON_MINIFIED)
+            plain, = iter_file_sections([path])
+            self.assertLess(section.tokens, plain.tokens)
+
+    def test_large_files_are_minified(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "src", "app.py")
+            write_file(path, PYTHON_SOURCE)
+            section, = iter_file_sections([path], minifier=self.minifier, mmap_threshold=1)
+            self.assertEqual(section.content, PYTHON_MINIFIED)
+
+    def test_cache_reuses_minified_text(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, "src")
+            path = os.path.join(src, "app.py")
+            write_file(path, PYTHON_SOURCE)
+            cache_dir = os.path.join(temp_dir, "cache")
+            cache = FileCache(cache_dir, src)
+            first, = iter_file_sections([path], cache=cache, minifier=self.minifier)
+            cache.save()
+            texts_dir = os.path.join(cache_dir, "texts")
+            name, = os.listdir(texts_dir)
+            with open(os.path.join(texts_dir, name), "w") as f:
+                f.write("# stored text\n")
+            # An unchanged file reuses the stored text and its layout without being read.
+            cache = FileCache(cache_dir, src)
+            second, = iter_file_sections([path], cache=cache, minifier=self.minifier)
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(second.content, "# stored text\n")
+            self.assertEqual(second.tokens, first.tokens)
+            # The plain profile has its own layout and reads the file again.
+            plain, = iter_file_sections([path], cache=cache)
+            self.assertEqual(plain.content, PYTHON_SOURCE)
+            write_file(path, "print('changed')\n")
+            changed, = iter_file_sections([path], cache=cache, minifier=self.minifier)
+            self.assertEqual(changed.content, "print('changed')\n")
+            cache.save()
+            self.assertEqual(len(os.listdir(texts_dir)), 1)
+            self.assertNotEqual(os.listdir(texts_dir), [name])
+
+if __name__ == "__main__":
+    unittest.main()
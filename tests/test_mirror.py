@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from llm_fuse.mirror import checkout_worktree, mirror_path, remove_worktree, sparse_patterns, update_mirror
+
+def _git(cwd, *args):
+    return subprocess.check_output(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                                   cwd=cwd, text=True)
+
+def _missing_objects(mirror):
+    output = _git(mirror, "rev-list", "--objects", "--all", "--missing=print")
+    return sum(1 for line in output.splitlines() if line.startswith("?"))
+
+class TestSparsePatterns(unittest.TestCase):
+
+    def test_simple_regexes_become_globs(self):
+        self.assertEqual(sparse_patterns(r"\.py$", None), ["*.py"])
+        self.assertEqual(sparse_patterns(r".*\.(js|ts)$", r"\.min\.js$"), ["*.js", "*.ts", "!*.min.js"])
+        self.assertEqual(sparse_patterns(None, "node_modules"), ["/*", "!*node_modules*"])
+
+    def test_other_regexes_fall_back_to_a_full_checkout(self):
+        self.assertIsNone(sparse_patterns(r"^src/.*", None))
+        self.assertIsNone(sparse_patterns("a.b", "[0-9]+"))
+        # An include regex matching the checkout root keeps every file.
+        self.assertIsNone(sparse_patterns("repo", None, "/tmp/git_repo_1"))
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class TestMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "source")
+        self.mirror_root = os.path.join(self.temp_dir.name, "mirrors")
+        os.makedirs(os.path.join(self.source, "src"))
+        os.makedirs(os.path.join(self.source, "docs"))
+        for i in range(3):
+            with open(os.path.join(self.source, "src", f"m{i}.py"), "w") as f:
+                f.write(f"print({i})\n")
+            with open(os.path.join(self.source, "docs", f"d{i}.md"), "w") as f:
+                f.write(f"doc {i}\n")
+        _git(self.source, "init", "-q")
+        # Let the local "server" honour --filter, as hosted Git services do.
+        _git(self.source, "config", "uploadpack.allowFilter", "true")
+        _git(self.source, "add", "-A")
+        _git(self.source, "commit", "-q", "-m", "initial")
+        self.url = "file://" + self.source
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_sparse_checkout_fetches_only_matching_blobs(self):
+        mirror = update_mirror(self.url, self.mirror_root)
+        self.assertEqual(mirror, mirror_path(self.mirror_root, self.url))
+        self.assertEqual(_missing_objects(mirror), 6)
+        worktree = checkout_worktree(mirror, None, r"\.py$", None)
+        try:
+            files = sorted(os.path.relpath(os.path.join(root, name), worktree)
+                           for root, _, names in os.walk(worktree) for name in names if name != ".git")
+            self.assertEqual(files, [os.path.join("src", f"m{i}.py") for i in range(3)])
+            self.assertEqual(_missing_objects(mirror), 3)
+        finally:
+            remove_worktree(mirror, worktree)
+        self.assertFalse(os.path.exists(worktree))
+        self.assertNotIn(worktree, _git(mirror, "worktree", "list"))
+
+    def test_existing_mirror_is_updated_incrementally(self):
+        mirror = update_mirror(self.url, self.mirror_root)
+        with open(os.path.join(self.source, "src", "new.py"), "w") as f:
+            f.write("print('new')\n")
+        _git(self.source, "add", "-A")
+        _git(self.source, "commit", "-q", "-m", "second")
+        self.assertEqual(update_mirror(self.url, self.mirror_root), mirror)
+        worktree = checkout_worktree(mirror)
+        try:
+            self.assertTrue(os.path.exists(os.path.join(worktree, "src", "new.py")))
+            self.assertTrue(os.path.exists(os.path.join(worktree, "docs", "d0.md")))
+        finally:
+            remove_worktree(mirror, worktree)
+
+    def test_unknown_ref_raises(self):
+        mirror = update_mirror(self.url, self.mirror_root)
+        with self.assertRaises(RuntimeError):
+            checkout_worktree(mirror, "no-such-branch")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from llm_fuse.dedup import Deduplicator
+from llm_fuse.main import get_last_commit_times, iter_file_sections, select_within_budget, write_output_files
+from llm_fuse.relevance import BudgetSelector, QueryIndex, static_score, word_terms
+
+from helpers import write_file
+
+class TestRelevance(unittest.TestCase):
+
+    def test_word_terms_split_identifiers(self):
+        self.assertEqual(word_terms("parseConfigFile"), ["parseconfigfile", "parse", "config", "file"])
+        self.assertEqual(word_terms("load_HTTP_response"), ["load_http_response", "load", "http", "response"])
+        self.assertEqual(word_terms("token"), ["token"])
+
+    def test_query_index_keywords_and_regexes(self):
+        index = QueryIndex("config auth.*")
+        index.add(0, "src/app.py", "def parseConfig(): pass\nconfig = 1\n")
+        index.add(1, "src/authentication.py", "token = None\n")
+        index.add(2, "README.md", "Nothing relevant here.\n")
+        self.assertEqual(index.postings["config"], {0: 2})
+        self.assertEqual(index.postings["auth.*"], {1: 5})
+        scores = index.scores()
+        self.assertEqual(set(scores), {0, 1})
+        self.assertEqual(max(scores.values()), 1.0)
+
+    def test_static_score_prefers_shallow_and_well_known_files(self):
+        self.assertGreater(static_score("README.md"), static_score("docs/guide.md"))
+        self.assertGreater(static_score("src/main.py"), static_score("src/helpers.py"))
+        self.assertGreater(static_score("pyproject.toml"), static_score("a/b/c/d.toml"))
+
+    def test_selection_fits_budget_and_keeps_input_order(self):
+        selector = BudgetSelector("checkout")
+        selector.add("/r/a.py", "a.py", 100, "print('a')")
+        selector.add("/r/pkg/cart.py", os.path.join("pkg", "cart.py"), 300, "def checkout(): pass")
+        selector.add("/r/pkg/cart.py", os.path.join("pkg", "cart.py"), 300, "checkout()")
+        selector.add("/r/big.py", "big.py", 5000, "x = 1")
+        self.assertEqual(selector.costs, [100, 600, 5000])
+        self.assertEqual(selector.select(700), ["/r/pkg/cart.py"])
+        self.assertEqual(selector.select(800), ["/r/a.py", "/r/pkg/cart.py"])
+        self.assertEqual(selector.select(10), [])
+
+    def test_recent_files_rank_higher(self):
+        selector = BudgetSelector()
+        selector.add("/r/old.py", "old.py", 100)
+        selector.add("/r/new.py", "new.py", 100)
+        day = 24 * 60 * 60
+        self.assertEqual(selector.select(150, {"old.py": 0, "new.py": 90 * day}), ["/r/new.py"])
+        self.assertEqual(selector.select(150, {"old.py": 90 * day, "new.py": 0}), ["/r/old.py"])
+
+    def test_selected_output_stays_within_budget(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, "src")
+            for i in range(30):
+                write_file(os.path.join(src, "pkg", f"module{i}.py"), f"value_{i} = {i}\n" * (i * 5 + 1))
+            write_file(os.path.join(src, "pkg", "billing.py"), "def refund(invoice):\n    return invoice\n" * 20)
+            paths = sorted(os.path.join(src, "pkg", name) for name in os.listdir(os.path.join(src, "pkg")))
+            selected = select_within_budget(iter_file_sections(paths), src, src, 1500, query="refund")
+            self.assertIn(os.path.join(src, "pkg", "billing.py"), selected)
+            self.assertLess(len(selected), len(paths))
+            self.assertEqual(selected, [path for path in paths if path in selected])
+            output_path = os.path.join(temp_dir, "output.txt")
+            write_output_files(iter_file_sections(selected), None, output_path, src, src)
+            with open(output_path, encoding="utf-8") as f:
+                self.assertLessEqual(math.ceil(len(f.read()) / 4), 1500)
+
+    def test_duplicates_are_charged_once(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, "src")
+            module = "".join(f"def handler_{i}(request):\n    return respond(request, {i})\n\n" for i in range(20))
+            for name in ("a", "b", "c"):
+                write_file(os.path.join(src, "pkg", f"copy_{name}.py"), module)
+            for i in range(4):
+                write_file(os.path.join(src, "pkg", f"other{i}.py"), f"value_{i} = {i}\n" * 40)
+            paths = sorted(os.path.join(src, "pkg", name) for name in os.listdir(os.path.join(src, "pkg")))
+            copies = [path for path in paths if "copy_" in path]
+            # Without deduplication, only one copy fits; with it, the others cost a reference each.
+            selected = select_within_budget(iter_file_sections(paths), src, src, 1250)
+            self.assertEqual(len([path for path in selected if path in copies]), 1)
+            selected = select_within_budget(iter_file_sections(paths), src, src, 1250, dedup=Deduplicator(src))
+            self.assertEqual([path for path in selected if path in copies], copies)
+            self.assertGreater(len(selected), len(copies))
+            output_path = os.path.join(temp_dir, "output.txt")
+            write_output_files(iter_file_sections(selected), None, output_path, src, src, dedup=Deduplicator(src))
+            with open(output_path, encoding="utf-8") as f:
+                output = f.read()
+            self.assertEqual(output.count("[Identical to ./pkg/copy_a.py;"), 2)
+            self.assertLessEqual(math.ceil(len(output) / 4), 1250)
+
+    @unittest.skipIf(shutil.which("git") is None, "git is not installed")
+    def test_last_commit_times(self):
+        with tempfile.TemporaryDirectory() as repo:
+            def git(*args, **env):
+                subprocess.check_output(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                                        cwd=repo, env=dict(os.environ, **env))
+
+            write_file(os.path.join(repo, "old.py"), "old\n")
+            write_file(os.path.join(repo, "sub", "new.py"), "new\n")
+            git("init", "-q")
+            git("add", "-A")
+            git("commit", "-q", "-m", "first", GIT_AUTHOR_DATE="@1000000000 +0000",
+                GIT_COMMITTER_DATE="@1000000000 +0000")
+            write_file(os.path.join(repo, "sub", "new.py"), "newer\n")
+            git("commit", "-q", "-am", "second", GIT_AUTHOR_DATE="@1000100000 +0000",
+                GIT_COMMITTER_DATE="@1000100000 +0000")
+            self.assertEqual(get_last_commit_times(repo), {"old.py": 1000000000, "sub/new.py": 1000100000})
+            self.assertEqual(get_last_commit_times(os.path.join(repo, "sub")), {"new.py": 1000100000})
+            self.assertIsNone(get_last_commit_times(os.path.join(repo, "missing")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from llm_fuse.main import process_files, write_output_files
+from llm_fuse.sections import FileSection, as_section, sections_from_layout
+
+class TestFileSection(unittest.TestCase):
+
+    def test_chunks_are_views_into_one_record(self):
+        sections = list(sections_from_layout("a.txt", "abcdefghij", [(0, 4, 1), (4, 8, 1), (8, 10, 1)]))
+        self.assertEqual([section.content for section in sections], ["abcd", "efgh", "ij"])
+        self.assertTrue(all(section.file is sections[0].file for section in sections))
+        self.assertEqual(sections[2].total_chunks, 3)
+        self.assertFalse(hasattr(sections[0], "__dict__"))
+
+    def test_dictionary_adapter(self):
+        whole, = sections_from_layout("a.txt", "abcd", [(0, 4, 1)])
+        self.assertEqual(whole, {"path": "a.txt", "content": "abcd", "tokens": 1})
+        self.assertNotIn("chunk_index", whole)
+        self.assertEqual(whole.get("chunk_index", 1), 1)
+        with self.assertRaises(KeyError):
+            whole["content_range"]
+        second = list(sections_from_layout("a.txt", "abcdefgh", [(0, 4, 1), (4, 8, 1)]))[1]
+        self.assertEqual(dict(second), {"path": "a.txt", "content": "efgh", "tokens": 1,
+                                        "chunk_index": 2, "total_chunks": 2})
+        mapped, = sections_from_layout("big.log", None, [(0, 100, 25)])
+        self.assertEqual(mapped.to_dict(), {"path": "big.log", "content_range": (0, 100), "tokens": 25})
+        self.assertNotIn("content", mapped)
+
+    def test_round_trip_from_dict(self):
+        data = {"path": "b.txt", "content": "World", "tokens": 2, "chunk_index": 2, "total_chunks": 2}
+        section = as_section(data)
+        self.assertIsInstance(section, FileSection)
+        self.assertEqual(section, data)
+        self.assertIs(as_section(section), section)
+
+    def test_relative_path_computed_once_per_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "sub", "a.txt")
+            os.makedirs(os.path.dirname(path))
+            with open(path, "w") as f:
+                f.write("x" * 40)
+            sections, _ = process_files([path], max_tokens=2)
+            self.assertEqual(len(sections), 5)
+            output_path = os.path.join(temp_dir, "output.txt")
+            with mock.patch("llm_fuse.sections.os.path.relpath", wraps=os.path.relpath) as relpath:
+                write_output_files(sections, None, output_path, temp_dir, temp_dir)
+            self.assertEqual(relpath.call_count, 1)
+            with open(output_path, encoding="utf-8") as f:
+                self.assertIn("File: ./sub/a.txt\n", f.read())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+import unittest
+
+from llm_fuse.main import iter_file_sections, write_output_files
+from llm_fuse.stats import RunStats
+
+class TestRunStats(unittest.TestCase):
+
+    def test_timed_iterator_is_excluded_from_enclosing_stage(self):
+        stats = RunStats()
+
+        def slow_items():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        with stats.stage("write"):
+            self.assertEqual(list(stats.timed_iter("process", slow_items())), [0, 1, 2])
+        self.assertGreaterEqual(stats.stages["process"], 0.03)
+        self.assertLess(stats.stages["write"], 0.01)
+
+    def test_keeps_only_the_slowest_files(self):
+        stats = RunStats(slowest=2)
+        for i, seconds in enumerate([0.1, 0.5, 0.2, 0.4]):
+            stats.record_file(f"file{i}", seconds, 10)
+        self.assertEqual([path for _, path, _ in stats.slowest_files()], ["file1", "file3"])
+        self.assertEqual(stats.files_examined, 4)
+        self.assertEqual(stats.bytes_read, 40)
+
+    def test_pipeline_records_bytes_and_skips(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text_path = os.path.join(temp_dir, "a.txt")
+            with open(text_path, "w") as f:
+                f.write("hello world")
+            binary_path = os.path.join(temp_dir, "b.bin")
+            with open(binary_path, "wb") as f:
+                f.write(b"\x00\x01\x02")
+            stats = RunStats(root=temp_dir)
+            sections = iter_file_sections([text_path, binary_path], skip_counts=stats.skip_counts, stats=stats)
+            output_path = os.path.join(temp_dir, "output.txt")
+            write_output_files(sections, None, output_path, temp_dir, temp_dir, stats=stats)
+            report = stats.to_dict()
+            # Both files are read: the binary one to classify it.
+            self.assertEqual(report["bytes_read"], 11 + 3)
+            self.assertEqual(report["bytes_written"], os.path.getsize(output_path))
+            self.assertEqual(sum(report["skipped"].values()), 1)
+            self.assertIn("a.txt", [entry["path"] for entry in report["slowest_files"]])
+
+if __name__ == "__main__":
+    unittest.main()
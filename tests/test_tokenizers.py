@@ -0,0 +1,116 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from llm_fuse.main import main, process_files
+from llm_fuse.tokenizers import (
+    BPETokenizer,
+    ByteClassTokenizer,
+    HeuristicTokenizer,
+    Tokenizer,
+    calibrate_byte_class,
+    get_tokenizer,
+    register_tokenizer
+)
+
+class WordTokenizer(Tokenizer):
+    # One token per whitespace-separated word; used to check chunking against a real count.
+    name = "words"
+
+    def count(self, text, path=None):
+        return len(text.split())
+
+class TestTokenizers(unittest.TestCase):
+
+    def test_heuristic_matches_four_characters_per_token(self):
+        tokenizer = HeuristicTokenizer()
+        self.assertEqual(tokenizer.count("abcd"), 1)
+        self.assertEqual(tokenizer.count_batch(["abcdef", ""]), [2, 0])
+
+    def test_bpe_counts_merged_words(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, "merges.txt"), "w", encoding="utf-8") as f:
+                # "Ġ" is the byte-level encoding of a space.
+                f.write("#version: 0.2\nh e\nl l\nhe ll\nhell o\nĠ w\n")
+            with open(os.path.join(temp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+                json.dump({c: i for i, c in enumerate(["h", "e", "l", "o", "w", "r", "d", "Ġ",
+                                                       "he", "ll", "hell", "hello", "Ġw"])}, f)
+            tokenizer = get_tokenizer(f"bpe:{temp_dir}")
+            self.assertIsInstance(tokenizer, BPETokenizer)
+            # "hello" merges into one token; " world" becomes "Ġw" + "o" + "r" + "l" + "d".
+            self.assertEqual(tokenizer.count("hello"), 1)
+            self.assertEqual(tokenizer.count("hello world"), 6)
+            self.assertEqual(tokenizer.count_batch(["hello", "hello hello"]), [1, 3])
+
+    def test_byte_class_uses_extension_weights(self):
+        tokenizer = ByteClassTokenizer()
+        text = "# Title\n\n" + "word " * 200
+        self.assertNotEqual(tokenizer.count(text, "notes.md"), tokenizer.count(text, "data.json"))
+        # CJK text costs far more than len/4 would suggest.
+        self.assertGreater(tokenizer.count("汉字" * 100), HeuristicTokenizer().count("汉字" * 100))
+
+    def test_byte_class_line_costs_add_up(self):
+        tokenizer = ByteClassTokenizer()
+        lines = [f"x{i} = f({i}, 'a')\n" for i in range(50)]
+        costs = tokenizer.cost_batch(lines, ["a.py"] * len(lines))
+        self.assertAlmostEqual(sum(costs), tokenizer.estimate_bytes("".join(lines).encode(), "a.py"))
+        self.assertEqual(tokenizer.count("".join(lines), "a.py"), round(sum(costs)))
+        # Rounded per line, the counts would not add up to the whole.
+        self.assertNotEqual(sum(tokenizer.count_batch(lines, ["a.py"] * len(lines))), round(sum(costs)))
+
+    def test_calibrated_byte_class_matches_reference_totals(self):
+        samples = [("a.py", "def f(x):\n    return x + 1\n" * 20)]
+        calibration = calibrate_byte_class(samples, WordTokenizer())
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as tf:
+            json.dump(calibration, tf)
+        try:
+            tokenizer = get_tokenizer(f"byteclass:{tf.name}")
+            expected = WordTokenizer().count(samples[0][1])
+            self.assertAlmostEqual(tokenizer.count(samples[0][1], "a.py"), expected, delta=expected * 0.05)
+        finally:
+            os.remove(tf.name)
+
+    def test_get_tokenizer_rejects_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_tokenizer("nope")
+        with self.assertRaises(ValueError):
+            get_tokenizer("bpe")
+
+    def test_registered_tokenizer_drives_chunking(self):
+        register_tokenizer("words", lambda path: WordTokenizer())
+        tokenizer = get_tokenizer("words")
+        with tempfile.NamedTemporaryFile(mode="w", delete=False) as tf:
+            tf.write(" ".join(f"w{i}" for i in range(50)))
+            filename = tf.name
+        try:
+            files_data, total_tokens = process_files([filename], max_tokens=8, tokenizer=tokenizer)
+            self.assertGreater(len(files_data), 1)
+            for file_data in files_data:
+                self.assertLessEqual(file_data["tokens"], 8)
+                self.assertEqual(file_data["tokens"], tokenizer.count(file_data["content"]))
+            self.assertEqual("".join(fd["content"] for fd in files_data).split(), [f"w{i}" for i in range(50)])
+        finally:
+            os.remove(filename)
+
+    def test_calibrate_writes_weights_for_the_byte_class_tokenizer(self):
+        register_tokenizer("words", lambda path: WordTokenizer())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src = os.path.join(temp_dir, "src")
+            os.makedirs(src)
+            text = "def f(x):\n    return x + 1\n" * 20
+            with open(os.path.join(src, "a.py"), "w", encoding="utf-8") as f:
+                f.write(text)
+            calibration_path = os.path.join(temp_dir, "calibration.json")
+            with contextlib.redirect_stdout(io.StringIO()):
+                main([src, "--tokenizer", "words", "--calibrate", calibration_path, "--no-cache",
+                      "--output", os.path.join(temp_dir, "output.txt")])
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, "output.txt")))
+            tokenizer = get_tokenizer(f"byteclass:{calibration_path}")
+            expected = WordTokenizer().count(text)
+            self.assertAlmostEqual(tokenizer.count(text, "a.py"), expected, delta=expected * 0.05)
+
+if __name__ == "__main__":
+    unittest.main()
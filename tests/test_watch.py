@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+
+from llm_fuse.dedup import Deduplicator
+from llm_fuse.main import collect_files, iter_file_sections, write_output_files
+from llm_fuse.watch import WatchSession
+
+from helpers import write_file
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+class TestWatchSession(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.temp_dir.name, "src")
+        self.out = os.path.join(self.temp_dir.name, "out")
+        write_file(os.path.join(self.src, "a.py"), "print('a')\n")
+        write_file(os.path.join(self.src, "pkg", "b.py"), "".join(f"line_{i} = {i}\n" for i in range(40)))
+        write_file(os.path.join(self.src, "pkg", "c.txt"), "notes\n")
+        os.makedirs(self.out)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _session(self, output_path):
+        return WatchSession(
+            self.src, self.src, output_path,
+            lambda: collect_files(self.src, None, None, git_only=False),
+            lambda paths: iter_file_sections(paths, max_tokens=50), dedup=True
+        )
+
+    def _expected(self):
+        """
+        Run a normal aggregation of the source directory and return its output files' contents.
+        """
+        output_path = os.path.join(self.out, "expected.txt")
+        paths = collect_files(self.src, None, None, git_only=False)
+        write_output_files(iter_file_sections(paths, max_tokens=50), None, output_path, self.src,
+                           dedup=Deduplicator(self.src))
+        outputs = {}
+        for name in sorted(os.listdir(self.out)):
+            if name.startswith("expected"):
+                path = os.path.join(self.out, name)
+                outputs[name.replace("expected", "watched")] = _read(path)
+                os.remove(path)
+        return outputs
+
+    def _actual(self):
+        return {name: _read(os.path.join(self.out, name)) for name in sorted(os.listdir(self.out))}
+
+    def test_start_matches_a_normal_run(self):
+        session = self._session(os.path.join(self.out, "watched.txt"))
+        written = session.start()
+        self.assertGreater(len(written), 1)
+        self.assertEqual(self._actual(), self._expected())
+
+    def test_edit_rewrites_changed_sections_only(self):
+        session = self._session(os.path.join(self.out, "watched.txt"))
+        session.start()
+        write_file(os.path.join(self.src, "a.py"), "print('edited')\n")
+        changed, dirs = session.poll()
+        self.assertEqual(list(changed), [os.path.join(self.src, "a.py")])
+        self.assertFalse(session.needs_recollect(changed, dirs))
+        written = session.apply(changed, recollect=False)
+        self.assertEqual(written, [os.path.join(self.out, "watched.txt")])
+        self.assertEqual(self._actual(), self._expected())
+        self.assertEqual(session.poll(), ({}, {}))
+
+    def test_output_files_are_patched_in_place(self):
+        output_path = os.path.join(self.out, "watched.txt")
+        session = self._session(output_path)
+        session.start()
+        inode = os.stat(output_path).st_ino
+        for text in ("print('b')\n", "print('longer')\n", "x = 1\n"):
+            write_file(os.path.join(self.src, "a.py"), text)
+            changed, _ = session.poll()
+            session.apply(changed, recollect=False)
+            self.assertEqual(os.stat(output_path).st_ino, inode)
+            self.assertEqual(self._actual(), self._expected())
+        # A file changed behind the session's back is replaced instead.
+        with open(output_path, "a") as f:
+            f.write("stray\n")
+        write_file(os.path.join(self.src, "a.py"), "print('a')\n")
+        changed, _ = session.poll()
+        session.apply(changed, recollect=False)
+        self.assertEqual(self._actual(), self._expected())
+
+    def test_duplicates_are_collapsed(self):
+        session = self._session(os.path.join(self.out, "watched.txt"))
+        lines = "".join(f"line_{i} = {i}\n" for i in range(40))
+        write_file(os.path.join(self.src, "vendor", "b.py"), lines)
+        session.start()
+        self.assertIn("[Identical to ./vendor/b.py;", _read(os.path.join(self.out, "watched.txt")))
+        self.assertEqual(self._actual(), self._expected())
+        # Editing the original turns the copy back into a file of its own, and back again.
+        for text in ("other = 1\n" + lines, lines):
+            write_file(os.path.join(self.src, "vendor", "b.py"), text)
+            changed, _ = session.poll()
+            session.apply(changed, recollect=False)
+            self.assertEqual(self._actual(), self._expected())
+        os.remove(os.path.join(self.src, "vendor", "b.py"))
+        changed, _ = session.poll()
+        session.apply(changed, recollect=True)
+        self.assertNotIn("Identical to", _read(os.path.join(self.out, "watched.txt")))
+        self.assertEqual(self._actual(), self._expected())
+
+    def test_added_and_removed_files(self):
+        session = self._session(os.path.join(self.out, "watched.txt"))
+        session.start()
+        write_file(os.path.join(self.src, "pkg", "d.py"), "print('d')\n")
+        os.remove(os.path.join(self.src, "pkg", "c.txt"))
+        changed, dirs = session.poll()
+        self.assertTrue(session.needs_recollect(changed, dirs))
+        session.apply(changed, recollect=True)
+        self.assertIn("d.py", _read(os.path.join(self.out, "watched.txt")))
+        self.assertEqual(self._actual(), self._expected())
+
+    def test_emptied_chunk_file_is_removed(self):
+        session = self._session(os.path.join(self.out, "watched.txt"))
+        session.start()
+        self.assertTrue(os.path.exists(os.path.join(self.out, "watched_2.txt")))
+        write_file(os.path.join(self.src, "pkg", "b.py"), "short = 1\n")
+        changed, _ = session.poll()
+        session.apply(changed, recollect=False)
+        self.assertFalse(os.path.exists(os.path.join(self.out, "watched_2.txt")))
+        self.assertEqual(self._actual(), self._expected())
+
+    def test_output_inside_watched_directory_is_ignored(self):
+        session = self._session(os.path.join(self.src, "watched.txt"))
+        session.start()
+        self.assertNotIn(os.path.join(self.src, "watched.txt"), session.paths)
+        self.assertNotIn(os.path.join(self.src, "watched_2.txt"), session.paths)
+        self.assertEqual(session.poll(), ({}, {}))
+
+if __name__ == "__main__":
+    unittest.main()